@@ -0,0 +1,197 @@
+"""Benchmark for the parse -> compute -> export pipeline.
+
+Generates synthetic ArcGIS confusion matrix CSVs (see synthetic.py) for every
+combination of class count, total sample count, number formatting and file
+count, and times each pipeline stage over all files of a scenario:
+
+    read_csv         pd.read_csv of the raw table (what the Data sheet needs)
+    read_typed       read_confusion_matrix, the typed matrix-only reader
+    compute_metrics  compute_metrics on the parsed tables
+    export_to_excel  the full single-file export, one workbook per CSV
+    export_json      the same export written as JSON instead of XLSX
+    add_to_workbook  adding every file to one combined workbook
+    save_combined    saving that combined workbook
+
+Each scenario runs in a fresh interpreter so that its peak RSS is its own.
+Results (wall seconds, files per second, peak RSS after each stage) are
+printed and can be saved as JSON and compared against an earlier run.
+--xlsx-backend times the XLSX stages with XlsxWriter or openpyxl:
+
+    python benchmarks/pipeline.py --classes 2,20,200 --samples 1e3,1e6,1e9 --json after.json
+    python benchmarks/pipeline.py --json after.json --compare before.json --max-regression 1.5
+    python benchmarks/pipeline.py --xlsx-backend openpyxl --json openpyxl.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.instrument import peak_rss_mb
+from core.writers import XLSX_BACKEND_VARIABLE, xlsx_backend
+
+STAGES = ["read_csv", "read_typed", "compute_metrics", "export_to_excel", "export_json", "add_to_workbook",
+          "save_combined"]
+
+def run_scenario(scenario, stages=STAGES):
+    """Time the pipeline stages for one scenario in this process"""
+    import pandas as pd
+    from core.metrics import (warm_up, read_confusion_matrix, compute_metrics, export_to_excel,
+                              load_metrics, new_workbook, add_to_workbook, save_workbook_atomic)
+    from benchmarks.synthetic import generate_files
+
+    warm_up()
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="metricalc-bench-") as tmp:
+        paths = generate_files(os.path.join(tmp, "in"), scenario["files"], scenario["classes"],
+                               scenario["samples"], scenario["decimal_comma"])
+        out_dir = os.path.join(tmp, "out")
+        os.makedirs(out_dir)
+        n = len(paths)
+
+        def timed(name, func):
+            if name not in stages:
+                return None
+            start = time.perf_counter()
+            value = func()
+            seconds = time.perf_counter() - start
+            results[name] = {
+                "seconds": seconds,
+                "files_per_second": n / seconds if seconds > 0 else None,
+                "peak_rss_mb": peak_rss_mb(),
+            }
+            return value
+
+        frames = timed("read_csv", lambda: [pd.read_csv(path, sep=';') for path in paths])
+        if frames is None:
+            frames = [pd.read_csv(path, sep=';') for path in paths]
+        timed("read_typed", lambda: [read_confusion_matrix(path) for path in paths])
+        timed("compute_metrics", lambda: [compute_metrics(df) for df in frames])
+        timed("export_to_excel", lambda: [
+            export_to_excel(path, os.path.join(out_dir, f"{i}.xlsx")) for i, path in enumerate(paths)
+        ])
+        timed("export_json", lambda: [
+            export_to_excel(path, os.path.join(out_dir, f"{i}.json")) for i, path in enumerate(paths)
+        ])
+        if "add_to_workbook" in stages or "save_combined" in stages:
+            loaded = [load_metrics(path) for path in paths]
+            wb = new_workbook()
+            timed("add_to_workbook", lambda: [
+                add_to_workbook(wb, path, metrics, df) for path, (metrics, df) in zip(paths, loaded)
+            ])
+            timed("save_combined", lambda: save_workbook_atomic(wb, os.path.join(out_dir, "combined.xlsx")))
+    return {"scenario": scenario, "stages": results, "peak_rss_mb": peak_rss_mb()}
+
+def _scenario_key(scenario):
+    return (scenario["classes"], scenario["samples"], scenario["decimal_comma"], scenario["files"])
+
+def compare(results, baseline, max_regression=None):
+    """Print stage-time ratios against a baseline run; return the regressions above max_regression"""
+    previous = {_scenario_key(r["scenario"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results["results"]:
+        old = previous.get(_scenario_key(result["scenario"]))
+        if not old:
+            continue
+        for stage, timing in result["stages"].items():
+            old_timing = old["stages"].get(stage)
+            if not old_timing or not old_timing["seconds"]:
+                continue
+            ratio = timing["seconds"] / old_timing["seconds"]
+            label = _label(result["scenario"])
+            print(f"{label:<40} {stage:<16} {ratio:6.2f}x")
+            if max_regression is not None and ratio > max_regression:
+                regressions.append((label, stage, ratio))
+    return regressions
+
+def _label(scenario):
+    fmt = "comma" if scenario["decimal_comma"] else "dot"
+    return f"k={scenario['classes']} n={scenario['samples']:.0e} {fmt} files={scenario['files']}"
+
+def _floats(text):
+    return [float(v) for v in text.split(",") if v.strip()]
+
+def _ints(text):
+    return [int(float(v)) for v in text.split(",") if v.strip()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the MetriCalc parse/compute/export pipeline")
+    parser.add_argument("--classes", default="2,20,200", help="comma-separated class counts")
+    parser.add_argument("--samples", default="1e3,1e6,1e9", help="comma-separated total sample counts")
+    parser.add_argument("--files", default="1,20", help="comma-separated file counts")
+    parser.add_argument("--decimal", default="comma,dot", help="number formats: comma, dot or both")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated stages to run")
+    parser.add_argument("--json", default=None, help="write results to this JSON file")
+    parser.add_argument("--compare", default=None, help="baseline JSON file from an earlier run")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="with --compare, fail if any stage is this many times slower")
+    parser.add_argument("--xlsx-backend", choices=["auto", "xlsxwriter", "openpyxl"], default="auto",
+                        help="library for the XLSX stages (default: XlsxWriter when installed)")
+    parser.add_argument("--run-scenario", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    if args.run_scenario:
+        print(json.dumps(run_scenario(json.loads(args.run_scenario), stages)))
+        return 0
+
+    from core import __version__
+    scenarios = [
+        {"classes": k, "samples": n, "decimal_comma": fmt == "comma", "files": f}
+        for k, n, fmt, f in itertools.product(_ints(args.classes), _floats(args.samples),
+                                              [v.strip() for v in args.decimal.split(",")], _ints(args.files))
+    ]
+    results = []
+    for scenario in scenarios:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-scenario", json.dumps(scenario),
+             "--stages", ",".join(stages)],
+            cwd=ROOT, capture_output=True, text=True,
+            env=dict(os.environ, **{XLSX_BACKEND_VARIABLE: args.xlsx_backend})
+        )
+        if completed.returncode != 0:
+            print(f"{_label(scenario)}: failed\n{completed.stderr}", file=sys.stderr)
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        results.append(result)
+        timings = "  ".join(
+            f"{stage}={timing['seconds']:.3f}s ({timing['files_per_second']:.1f}/s)"
+            for stage, timing in result["stages"].items()
+        )
+        rss = result["peak_rss_mb"]
+        print(f"{_label(scenario):<40} {timings}  peak_rss={rss:.0f}MB" if rss is not None else
+              f"{_label(scenario):<40} {timings}")
+
+    output = {
+        "version": __version__,
+        "xlsx_backend": args.xlsx_backend if args.xlsx_backend != "auto" else xlsx_backend(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(output, json.load(f), args.max_regression)
+        if regressions:
+            for label, stage, ratio in regressions:
+                print(f"FAIL: {label} {stage} is {ratio:.2f}x slower", file=sys.stderr)
+            return 1
+    return 0 if len(results) == len(scenarios) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
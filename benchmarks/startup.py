@@ -0,0 +1,80 @@
+"""Startup-time benchmark for the GUI and the core modules.
+
+Launches main.py in a fresh interpreter with METRICALC_STARTUP_BENCHMARK set,
+which makes the app print the time from launch to the first event loop pass
+after the window is shown and then quit. Also times bare imports of the core
+modules. Exits non-zero if the median first-paint time exceeds --max-seconds.
+
+    python benchmarks/startup.py --runs 5 --max-seconds 2.0
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_TARGETS = ["core.metrics", "core.batch", "core.processing", "ui.main_window"]
+
+def time_first_paint(platform=None):
+    env = dict(os.environ, METRICALC_STARTUP_BENCHMARK="1")
+    if platform:
+        env["QT_QPA_PLATFORM"] = platform
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "main.py")],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+    )
+    wall = time.perf_counter() - start
+    reported = None
+    for line in result.stdout.splitlines():
+        if line.startswith("first_paint_seconds="):
+            reported = float(line.split("=", 1)[1])
+    if reported is None:
+        raise RuntimeError(f"main.py did not report startup time:\n{result.stderr}")
+    return wall, reported
+
+def time_import(module):
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure MetriCalc startup time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--platform", default=None, help="QT_QPA_PLATFORM for the app, e.g. offscreen")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="fail if the median launch-to-first-paint time is above this")
+    parser.add_argument("--json", default=None, help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    walls, paints = [], []
+    for _ in range(args.runs):
+        wall, paint = time_first_paint(args.platform)
+        walls.append(wall)
+        paints.append(paint)
+
+    imports = {module: statistics.median(time_import(module) for _ in range(args.runs)) for module in IMPORT_TARGETS}
+
+    results = {
+        "runs": args.runs,
+        "process_wall_seconds_median": statistics.median(walls),
+        "first_paint_seconds_median": statistics.median(paints),
+        "import_seconds_median": imports,
+    }
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.max_seconds is not None and results["first_paint_seconds_median"] > args.max_seconds:
+        print(f"FAIL: first paint {results['first_paint_seconds_median']:.3f}s > {args.max_seconds:.3f}s",
+              file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Synthetic ArcGIS-style confusion matrix CSVs for benchmarking.
+
+Writes the same layout as an ArcGIS Pro "Compute Confusion Matrix" export:
+semicolon-delimited, one ClassValue row per class, then Total, P_Accuracy and
+Kappa rows, with U_Accuracy and Kappa columns on the right.
+
+    python benchmarks/synthetic.py out_dir --files 100 --classes 20 --samples 1e6
+"""
+import argparse
+import os
+import numpy as np
+
+def synthetic_matrix(num_classes, total_samples, accuracy=0.85, seed=0):
+    """Random K x K count matrix with about `accuracy` of the samples on the diagonal"""
+    rng = np.random.default_rng(seed)
+    # Uneven class sizes, like real land-cover maps
+    class_share = rng.dirichlet(np.full(num_classes, 2.0))
+    probs = np.empty((num_classes, num_classes))
+    for i in range(num_classes):
+        if num_classes == 1:
+            row = np.ones(1)
+        else:
+            # The remaining share is spread randomly over the other classes
+            row = np.insert(rng.dirichlet(np.ones(num_classes - 1)) * (1 - accuracy), i, accuracy)
+        probs[i] = row * class_share[i]
+    counts = rng.multinomial(int(total_samples), probs.ravel() / probs.sum())
+    return counts.reshape(num_classes, num_classes).astype(np.int64)
+
+def _number(value, decimal_comma, integer=False):
+    if integer:
+        text = f"{int(value)}.0" if decimal_comma else str(int(value))
+    else:
+        text = f"{value:.6f}"
+    return text.replace('.', ',') if decimal_comma else text
+
+def write_arcgis_csv(path, cm, decimal_comma=True):
+    """Write cm as an ArcGIS confusion matrix CSV.
+
+    With decimal_comma every number uses a decimal comma, counts included
+    ("1200,0"), which is what localized exports produce; otherwise counts are
+    plain integers and fractions use a dot.
+    """
+    cm = np.asarray(cm, dtype=np.int64)
+    k = cm.shape[0]
+    rows_total = cm.sum(axis=1)
+    cols_total = cm.sum(axis=0)
+    total = int(cm.sum())
+    diag = np.diag(cm)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        user = np.where(rows_total > 0, diag / rows_total, 0.0)
+        producer = np.where(cols_total > 0, diag / cols_total, 0.0)
+        accuracy = diag.sum() / total if total else 0.0
+        expected = (rows_total * cols_total).sum() / total ** 2 if total else 0.0
+        kappa = (accuracy - expected) / (1 - expected) if expected < 1 else 0.0
+
+    num = lambda v: _number(v, decimal_comma)
+    count = lambda v: _number(v, decimal_comma, integer=True)
+    zero = count(0)
+    names = [f"C_{i + 1}" for i in range(k)]
+    lines = [";".join(["OBJECTID", "ClassValue"] + names + ["Total", "U_Accuracy", "Kappa"])]
+    for i in range(k):
+        lines.append(";".join([str(i + 1), names[i]] + [count(v) for v in cm[i]] +
+                              [count(rows_total[i]), num(user[i]), zero]))
+    lines.append(";".join([str(k + 1), "Total"] + [count(v) for v in cols_total] + [count(total), zero, zero]))
+    lines.append(";".join([str(k + 2), "P_Accuracy"] + [num(v) for v in producer] + [zero, num(accuracy), zero]))
+    lines.append(";".join([str(k + 3), "Kappa"] + [zero] * k + [zero, zero, num(kappa)]))
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("\n".join(lines) + "\n")
+
+def generate_files(directory, num_files, num_classes, total_samples, decimal_comma=True, seed=0):
+    """Write num_files synthetic CSVs into directory and return their paths"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(num_files):
+        path = os.path.join(directory, f"matrix_{i:05d}.csv")
+        write_arcgis_csv(path, synthetic_matrix(num_classes, total_samples, seed=seed + i), decimal_comma)
+        paths.append(path)
+    return paths
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic ArcGIS confusion matrix CSVs")
+    parser.add_argument("directory")
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--classes", type=int, default=5)
+    parser.add_argument("--samples", type=float, default=1e6, help="total sample count per matrix")
+    parser.add_argument("--dot-decimal", action="store_true", help="write plain numbers instead of decimal commas")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    paths = generate_files(args.directory, args.files, args.classes, args.samples,
+                           not args.dot_decimal, args.seed)
+    print(f"wrote {len(paths)} files to {args.directory}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import hashlib
+import re
+import numpy as np
+
+def _code_key(code):
+    number = code[2:]
+    return (0, int(number), code) if number.isdigit() else (1, 0, code)
+
+class MatrixSum:
+    """Running sum of confusion matrices aligned by their C_* class codes.
+
+    Matrices may cover different subsets of the classes (a tile without any
+    water has no C_* column for it); each one is added into the rows and
+    columns of its own codes, so only the summed K x K matrix is kept. Text
+    labels of label inputs serve as codes too (see labels.class_keys).
+    """
+    def __init__(self):
+        self.codes = {}
+        self.counts = np.zeros((0, 0), dtype=np.int64)
+        self.files = 0
+
+    def add(self, cm, codes):
+        if len(set(codes)) != len(codes):
+            raise ValueError("Duplicate class codes in the confusion matrix")
+        index = [self.codes.setdefault(code, len(self.codes)) for code in codes]
+        size = len(self.codes)
+        if size > self.counts.shape[0]:
+            counts = np.zeros((size, size), dtype=np.int64)
+            k = self.counts.shape[0]
+            counts[:k, :k] = self.counts
+            self.counts = counts
+        self.counts[np.ix_(index, index)] += np.asarray(cm, dtype=np.int64)
+        self.files += 1
+
+    def result(self):
+        """Return (cm, codes) with the classes in code order"""
+        codes = sorted(self.codes, key=_code_key)
+        order = [self.codes[code] for code in codes]
+        return self.counts[np.ix_(order, order)], codes
+
+def compile_group_pattern(pattern):
+    """Compile a grouping regex; raises ValueError with re's message when invalid"""
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        raise ValueError(str(e))
+
+def group_name(name, pattern):
+    """Group of a relative file name under a compiled pattern, or None if it does not match.
+
+    The group is the first capture group of the first match, or the whole
+    match when the pattern has no groups; e.g. r'^(.+)_tile\\d+' puts
+    'site_a_tile03.csv' into 'site_a'.
+    """
+    match = pattern.search(name)
+    if match is None:
+        return None
+    return match.group(1) if pattern.groups else match.group(0)
+
+def sheet_title(name, max_length=None):
+    """Replace the characters Excel does not allow in sheet names.
+
+    A title longer than max_length keeps the file stem of name and gets a
+    short hash of the whole name, so different long names stay different.
+    """
+    title = re.sub(r'[\[\]:*?/\\]', '_', name)
+    if max_length is None or len(title) <= max_length:
+        return title
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()[:6]
+    stem = sheet_title(re.split(r'[/\\]', name)[-1])
+    return f"{stem[:max_length - len(digest) - 1]}_{digest}"
@@ -0,0 +1,53 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Every output is written to a temporary file in the target's folder and moved
+# into place with os.replace, so a reader sees the old file or the whole new
+# one, and a failed or interrupted write leaves nothing behind.
+
+class AtomicFile:
+    """A temporary file next to path that commit() moves onto path and discard() drops.
+
+    The temporary file is created empty and readable by this user only, and
+    named .metricalc-*<suffix> (default: path's extension). Used as a context
+    manager it yields the temporary path and commits when the block succeeds.
+    """
+    def __init__(self, path, suffix=None):
+        self.path = path
+        if suffix is None:
+            suffix = os.path.splitext(str(path))[1]
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".metricalc-",
+                                             suffix=suffix)
+        os.close(fd)
+
+    def commit(self):
+        """Move the temporary file onto path; on failure it is removed"""
+        try:
+            os.replace(self.tmp_path, self.path)
+        except BaseException:
+            self.discard()
+            raise
+
+    def discard(self):
+        """Remove the temporary file, if it is still there"""
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self.tmp_path
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+@contextmanager
+def atomic_write(path, mode='w', encoding=None, newline=None, suffix=None):
+    """open() for writing through an AtomicFile; path is replaced when the block succeeds"""
+    with AtomicFile(path, suffix) as tmp_path:
+        with open(tmp_path, mode, encoding=encoding, newline=newline) as f:
+            yield f
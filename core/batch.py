@@ -0,0 +1,559 @@
+import multiprocessing
+import os
+import signal
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from .metrics import (load_metrics, load_export, load_class_matrix, metrics_from_matrix, metric_headers, save_workbook,
+                      add_to_workbook, new_workbook, save_workbook_atomic, discard_workbook, warm_up)
+from .aggregate import MatrixSum, compile_group_pattern, group_name
+from .labels import matrix_table
+from .writers import MULTI_SHEET_FORMATS, writer_format
+from .summary import SummaryWriter
+from .cache import ResultCache, cached_load_metrics
+from .manifest import Manifest
+from .instrument import FileProfile, stage
+from .cancel import Cancelled, SharedFlag, check_cancelled
+from .translations import TRANSLATIONS
+
+# Work units in this module are submitted to worker processes, so they must
+# stay importable without Qt and only return picklable values.
+
+def default_worker_count():
+    """Number of worker processes to use when none is configured"""
+    return max(1, os.cpu_count() or 1)
+
+def _load(input_path, language='cs', cache_dir=None, metric_options=None, include_data=True, profile=None,
+          sidecar=False, export_profile=None, nodata=None, cancelled=None):
+    """load_metrics, served from the result cache when one is configured"""
+    if cache_dir:
+        return cached_load_metrics(ResultCache(cache_dir), input_path, language, include_data, metric_options,
+                                   profile, sidecar, export_profile, nodata, cancelled)
+    return load_metrics(input_path, language, include_data, metric_options, profile, sidecar, export_profile,
+                        nodata, cancelled)
+
+def export_file(input_path, output_path, language='cs', cache_dir=None, cancelled=None, metric_options=None,
+                export_profile='full', sidecar=False, nodata=None):
+    """Parse, compute and write one file to its own workbook; returns (success, error, data, stats)"""
+    profile = FileProfile(os.path.basename(input_path))
+    try:
+        check_cancelled(cancelled)
+        metrics, df = _load(input_path, language, cache_dir, metric_options, profile=profile, sidecar=sidecar,
+                            export_profile=export_profile, nodata=nodata, cancelled=cancelled)
+        check_cancelled(cancelled)
+        save_workbook(output_path, input_path, metrics, df, language, metric_options=metric_options,
+                      profile=profile, cancelled=cancelled)
+        return True, None, None, profile.as_dict()
+    except Cancelled:
+        raise
+    except Exception as e:
+        return False, str(e), None, profile.as_dict()
+
+def compute_file(input_path, language='cs', cache_dir=None, cancelled=None, metric_options=None, include_data=True,
+                 sidecar=False, export_profile=None, nodata=None):
+    """Parse and compute one file for a combined output; returns (success, error, data, stats)"""
+    profile = FileProfile(os.path.basename(input_path))
+    try:
+        check_cancelled(cancelled)
+        data = _load(input_path, language, cache_dir, metric_options, include_data, profile, sidecar,
+                     export_profile, nodata, cancelled)
+        return True, None, data, profile.as_dict()
+    except Cancelled:
+        raise
+    except Exception as e:
+        return False, str(e), None, profile.as_dict()
+
+def matrix_file(input_path, cancelled=None, sidecar=False, nodata=None):
+    """Read one file's confusion matrix and class codes for aggregation.
+
+    Returns (success, error, (cm, codes), stats) like export_file; nothing is
+    computed, the caller sums the matrices per group.
+    """
+    profile = FileProfile(os.path.basename(input_path))
+    try:
+        check_cancelled(cancelled)
+        with profile.stage('read'):
+            data = load_class_matrix(input_path, sidecar, nodata, cancelled)
+        profile.read(input_path)
+        return True, None, data, profile.as_dict()
+    except Cancelled:
+        raise
+    except Exception as e:
+        return False, str(e), None, profile.as_dict()
+
+def _ignore_interrupts():
+    # Workers leave Ctrl+C to the parent, which cancels the batch cleanly
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _warm_worker():
+    _ignore_interrupts()
+    warm_up()
+
+def _process_pool(workers, initializer):
+    # Spawned rather than forked: the GUI, the service and file discovery run
+    # threads, and a forked worker inherits any lock one of them holds
+    return ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                               mp_context=multiprocessing.get_context('spawn'))
+
+class WorkerPool:
+    """A process pool that outlives a single batch.
+
+    iter_results otherwise starts a pool per batch, whose workers pay the
+    interpreter start and the pandas/openpyxl imports again every time. The
+    pool is created on first use with every worker started and warmed up,
+    and is recreated when a different worker count is asked for or a worker
+    died (e.g. killed for running out of memory), which breaks the whole
+    executor. Pass the pool to run_batch, which then resubmits the files a
+    dead worker took down with it, and shut it down when done.
+    """
+    def __init__(self, workers=None, initializer=_warm_worker):
+        self.workers = workers or default_worker_count()
+        self.initializer = initializer
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def executor(self, workers=None):
+        """The running ProcessPoolExecutor, started and warmed up if needed"""
+        with self._lock:
+            if workers and workers != self.workers:
+                self._shutdown()
+                self.workers = workers
+            if self._executor is not None and getattr(self._executor, '_broken', False):
+                self._shutdown(wait=False)
+            if self._executor is None:
+                self._executor = _process_pool(self.workers, self.initializer)
+                # Each submission to an idle pool starts one more worker
+                for _ in range(self.workers):
+                    self._executor.submit(os.getpid)
+            return self._executor
+
+    def _shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+    def shutdown(self, wait=True):
+        """Stop the workers; a later executor() call starts new ones"""
+        with self._lock:
+            self._shutdown(wait)
+
+def _in_process(tasks, workers):
+    return workers <= 1 or (hasattr(tasks, '__len__') and len(tasks) <= 1)
+
+def iter_results(func, tasks, workers=1, executor=None, cancelled=None, in_process=None):
+    """Yield func(*task) for every task, in task order.
+
+    With more than one worker the tasks are spread across a process pool;
+    results are still yielded in submission order so that the output stays
+    deterministic regardless of which worker finishes first. tasks may be a
+    generator that is still discovering files: the pool only pulls 2 tasks
+    per worker ahead of the results that have been consumed. executor, if
+    given, is a WorkerPool or a running ProcessPoolExecutor used instead of
+    starting a pool for this call; it is left running. When a worker dies,
+    the tasks it took down with it run again on a recreated pool and only a
+    task that kills a worker on its own fails; a plain executor cannot be
+    recreated, so there every unfinished task fails. Once cancelled()
+    returns True, tasks that have not started are dropped and only the
+    results of those already running are still yielded; a task that raised
+    Cancelled yields None. in_process, if given, overrides the choice
+    between this process and the pool, which a generator cannot size.
+    """
+    if in_process is None:
+        in_process = _in_process(tasks, workers)
+    if in_process:
+        for task in tasks:
+            try:
+                yield func(*task)
+            except Cancelled:
+                yield None
+        return
+
+    if hasattr(tasks, '__len__'):
+        workers = min(workers, len(tasks))
+    tasks = iter(tasks)
+    if isinstance(executor, WorkerPool):
+        yield from _pooled_results(executor.executor, func, tasks, workers, cancelled)
+    elif executor is not None:
+        yield from _pooled_results(lambda: executor, func, tasks, workers, cancelled)
+    else:
+        pool = WorkerPool(workers, _ignore_interrupts)
+        try:
+            yield from _pooled_results(pool.executor, func, tasks, workers, cancelled)
+        finally:
+            pool.shutdown()
+
+def _submit(executor, func, task):
+    try:
+        return executor.submit(func, *task)
+    except BrokenProcessPool as e:
+        # A worker died; the file fails like one whose worker died mid-way
+        future = Future()
+        future.set_exception(e)
+        return future
+
+def _drop_pending(futures):
+    # Workers pick tasks up in submission order, so the ones that have not
+    # started are at the end
+    while futures and futures[-1][1].cancel():
+        futures.pop()
+
+# How often a batch waiting on the pool checks whether it was cancelled
+CANCEL_POLL_SECONDS = 0.1
+
+def _result(future, cancelled=None):
+    # Keep polling while the file runs, so a cancel reaches the workers in
+    # the middle of it (see cancel.SharedFlag)
+    while cancelled is not None and not future.done() and not cancelled():
+        wait([future], timeout=CANCEL_POLL_SECONDS)
+    try:
+        return future.result()
+    except Cancelled:
+        return None
+    except BrokenProcessPool:
+        raise
+    except Exception as e:
+        return False, str(e), None, None
+
+def _broken(future):
+    return future.done() and not future.cancelled() and isinstance(future.exception(), BrokenProcessPool)
+
+def _pooled_results(executor, func, tasks, workers, cancelled=None):
+    # executor() returns the pool to submit to, recreated after a worker died
+    futures = deque((task, _submit(executor(), func, task)) for task in islice(tasks, 2 * workers))
+    try:
+        while futures:
+            if cancelled is not None and cancelled():
+                tasks = iter(())
+                _drop_pending(futures)
+                if not futures:
+                    break
+            task, future = futures.popleft()
+            try:
+                result = _result(future, cancelled)
+            except BrokenProcessPool as e:
+                # A dead worker fails every unfinished task of its pool. Run
+                # this one again on its own: if it kills a worker once more,
+                # it is the culprit and fails alone.
+                try:
+                    result = _result(_submit(executor(), func, task), cancelled)
+                except BrokenProcessPool:
+                    result = False, str(e), None, None
+                pool = executor()
+                futures = deque((queued, _submit(pool, func, queued) if _broken(queued_future) else queued_future)
+                                for queued, queued_future in futures)
+            # Top the pool up before handing the result over, so workers
+            # stay busy while the consumer writes it out
+            for task in islice(tasks, 1):
+                futures.append((task, _submit(executor(), func, task)))
+            yield result
+    finally:
+        # When the consumer stops early, drop the tasks that have not
+        # started; only the files already in flight are finished
+        for _, future in futures:
+            future.cancel()
+
+def _relative_name(csv_file):
+    # Absolute inputs keep their whole path, drive included, so that no two
+    # of them share an output or a manifest entry
+    if os.path.isabs(csv_file):
+        drive, path = os.path.splitdrive(csv_file)
+        return Path(drive.replace(':', ''), path.lstrip('\\/')).as_posix()
+    return Path(csv_file).as_posix()
+
+def _output_path(output_dir, csv_file, output_format='xlsx'):
+    return os.path.join(output_dir, f"{os.path.splitext(_relative_name(csv_file))[0]}.{output_format}")
+
+def run_batch(input_dir, output_dir, single_file, batch_mode, csv_files, language='cs', workers=1,
+              cache_dir=None, incremental=False, progress=None, cancelled=None, on_result=None,
+              metric_options=None, on_stats=None, sidecar=False, group_pattern=None, output_format='xlsx',
+              export_profile='full', executor=None, nodata=None):
+    """Process a batch of CSV files without any GUI dependency.
+
+    batch_mode 1 writes one output per file into output_dir, 2 collects every
+    file into single_file, 3 streams a summary table into single_file and 4
+    sums the matrices, per group_pattern group, into single_file. progress,
+    on_result and on_stats are optional callbacks; cancelled is polled
+    between files and, through a flag the workers share, inside each file,
+    and stops the batch cooperatively.
+
+    Returns (success_count, error_files, skipped_files).
+    """
+    success_count = 0
+    error_files = []
+    skipped_files = []
+    manifest = None
+    in_process = _in_process(csv_files, workers)
+    
+    # Combined outputs need a format that holds any number of sheets
+    if batch_mode in (2, 4) and writer_format(single_file) not in MULTI_SHEET_FORMATS:
+        return 0, [(TRANSLATIONS[language]['save_error'],
+                    TRANSLATIONS[language]['combined_format_error'].format(', '.join(MULTI_SHEET_FORMATS)))], []
+
+    # For single file mode, create one workbook
+    if batch_mode == 2:
+        wb = new_workbook(fmt=writer_format(single_file))
+        func = partial(compute_file, language=language, cache_dir=cache_dir, metric_options=metric_options,
+                       sidecar=sidecar, export_profile=export_profile, nodata=nodata)
+    elif batch_mode == 3:
+        # The summary table only holds metrics, so the raw data is never parsed
+        file_header = TRANSLATIONS[language]['summary_file_column']
+        try:
+            summary = SummaryWriter(single_file, [file_header] + metric_headers(language, **(metric_options or {})))
+        except Exception as e:
+            return 0, [(TRANSLATIONS[language]['save_error'], str(e))], []
+        func = partial(compute_file, language=language, cache_dir=cache_dir, metric_options=metric_options,
+                       include_data=False, sidecar=sidecar, nodata=nodata)
+    elif batch_mode == 4:
+        try:
+            pattern = compile_group_pattern(group_pattern) if group_pattern else None
+        except ValueError as e:
+            return 0, [(TRANSLATIONS[language]['invalid_group_pattern'], str(e))], []
+        # Group totals in order of their first file
+        groups = {}
+        func = partial(matrix_file, sidecar=sidecar, nodata=nodata)
+    else:  # Separate files
+        manifest = Manifest(output_dir)
+        # Outputs of another export profile or NoData value are stale too
+        manifest_options = dict(metric_options or {})
+        if export_profile != 'full':
+            manifest_options['export_profile'] = export_profile
+        if nodata is not None:
+            manifest_options['nodata'] = nodata
+        manifest_options = manifest_options or metric_options
+        func = partial(export_file, language=language, cache_dir=cache_dir, metric_options=metric_options,
+                       export_profile=export_profile, sidecar=sidecar, nodata=nodata)
+
+    flag = None
+    if cancelled is not None and not in_process:
+        # The callable cannot be sent to the workers, so they poll a shared
+        # flag that is set as soon as the batch notices the cancel
+        flag = SharedFlag()
+        batch_cancelled = cancelled
+
+        def cancelled():
+            if batch_cancelled():
+                flag.set()
+                return True
+            return False
+    func = partial(func, cancelled=flag or cancelled)
+    
+    # Files in flight, in the order their results will arrive
+    scheduled = deque()
+    state = {'done': 0, 'cancelled': False}
+
+    def tasks():
+        for csv_file in csv_files:
+            if cancelled is not None and cancelled():
+                state['cancelled'] = True
+                return
+            input_path = os.path.join(input_dir, csv_file)
+            position = state['done'] + len(skipped_files)
+            if batch_mode == 1:
+                output_path = _output_path(output_dir, csv_file, output_format)
+                # Incremental mode only exports files whose output is missing or stale
+                if incremental and manifest.is_current(input_path, output_path, language, manifest_options,
+                                                       _relative_name(csv_file)):
+                    skipped_files.append(csv_file)
+                    if progress:
+                        progress(position + 1, TRANSLATIONS[language]['skipping_unchanged'].format(len(skipped_files)))
+                    continue
+                try:
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                except OSError:
+                    pass  # reported as an export error for this file
+                task = (input_path, output_path)
+            else:
+                task = (input_path,)
+            # In-process the file starts right away; a pool reports it once it is next in line
+            if progress and in_process:
+                progress(position, TRANSLATIONS[language]['processing_file'].format(csv_file))
+            scheduled.append(csv_file)
+            yield task
+
+    # After a cancel the files already running in the pool are still
+    # collected, so what they wrote is counted and recorded
+    results = iter_results(func, tasks(), workers, executor, cancelled, in_process)
+    try:
+        while True:
+            if cancelled is not None and cancelled():
+                state['cancelled'] = True
+            if progress and not in_process and scheduled:
+                progress(state['done'] + len(skipped_files),
+                         TRANSLATIONS[language]['processing_file'].format(scheduled[0]))
+            # Results arrive in file order, so the combined outputs are stable
+            try:
+                result = next(results)
+            except StopIteration:
+                break
+            csv_file = scheduled.popleft()
+            if result is None:
+                # Stopped in the middle: nothing was written or counted
+                state['cancelled'] = True
+                continue
+            success, error, data, stats = result
+            input_path = os.path.join(input_dir, csv_file)
+            if success and batch_mode == 1:
+                manifest.record(input_path, language, manifest_options, _relative_name(csv_file))
+            elif success:
+                # Combined outputs are built here, in the parent process
+                profile = FileProfile.from_dict(stats) if stats else FileProfile(csv_file)
+                if batch_mode == 2:
+                    metrics, df = data
+                    # Named by the relative path, so equal names in different subfolders stay apart
+                    sheetname = os.path.splitext(_relative_name(csv_file))[0]
+                    success, error = add_to_workbook(wb, input_path, metrics, df, language, metric_options, profile,
+                                                     sheetname)
+                elif batch_mode == 4:
+                    cm, codes = data
+                    if pattern is None:
+                        group = TRANSLATIONS[language]['aggregate_total']
+                    else:
+                        group = group_name(_relative_name(csv_file), pattern)
+                    if group is None:
+                        success, error = False, TRANSLATIONS[language]['group_no_match']
+                    else:
+                        try:
+                            with stage(profile, 'build'):
+                                groups.setdefault(group, MatrixSum()).add(cm, codes)
+                        except Exception as e:
+                            success, error = False, str(e)
+                else:
+                    metrics, _ = data
+                    try:
+                        with stage(profile, 'build'):
+                            summary.add(os.path.splitext(_relative_name(csv_file))[0], metrics)
+                    except Exception as e:
+                        success, error = False, str(e)
+                stats = profile.as_dict()
+            if success:
+                success_count += 1
+            else:
+                error_files.append((csv_file, error))
+            state['done'] += 1
+            if on_stats and stats:
+                stats.update(file=csv_file, success=success)
+                on_stats(stats)
+            if on_result:
+                on_result(csv_file, success, error)
+    finally:
+        results.close()
+        if hasattr(csv_files, 'close'):
+            csv_files.close()
+        if flag is not None:
+            flag.close()
+        if cache_dir:
+            # Once per batch rather than on every write
+            ResultCache(cache_dir).evict()
+    # A cancel that came after the last file still stops the save
+    was_cancelled = state['cancelled'] or (cancelled is not None and cancelled())
+    
+    # Save single file
+    save_profile = FileProfile(os.path.basename(single_file or ""))
+    if batch_mode == 2:
+        if was_cancelled:
+            discard_workbook(wb)
+            success_count = 0
+        else:
+            try:
+                with save_profile.stage('save'):
+                    save_workbook_atomic(wb, single_file)
+            except Exception as e:
+                error_files.append((TRANSLATIONS[language]['save_error'], str(e)))
+    
+    elif batch_mode == 3:
+        if was_cancelled:
+            summary.discard()
+            success_count = 0
+        else:
+            try:
+                with save_profile.stage('save'):
+                    summary.close()
+            except Exception as e:
+                error_files.append((TRANSLATIONS[language]['save_error'], str(e)))
+    elif batch_mode == 4:
+        if was_cancelled:
+            success_count = 0
+        else:
+            wb = new_workbook(fmt=writer_format(single_file))
+            for group, total in groups.items():
+                try:
+                    with save_profile.stage('compute'):
+                        cm, codes = total.result()
+                        table = matrix_table(cm, codes)
+                        metrics = metrics_from_matrix(cm, language, class_names=list(table.columns[1:-1]),
+                                                      **(metric_options or {}))
+                except Exception as e:
+                    error_files.append((group, str(e)))
+                    continue
+                success, error = add_to_workbook(wb, group, metrics, table, language,
+                                                 metric_options, save_profile, group)
+                if not success:
+                    error_files.append((group, error))
+            try:
+                with save_profile.stage('save'):
+                    save_workbook_atomic(wb, single_file)
+            except Exception as e:
+                discard_workbook(wb)
+                error_files.append((TRANSLATIONS[language]['save_error'], str(e)))
+    if on_stats and save_profile.stages:
+        save_profile.wrote(single_file)
+        on_stats(save_profile.as_dict(success=True))
+    
+    if manifest is not None:
+        try:
+            manifest.save()
+        except Exception as e:
+            error_files.append((TRANSLATIONS[language]['save_error'], str(e)))
+    
+    return success_count, error_files, skipped_files
+
+SINGLE_STAGES = ('stage_reading', 'stage_computing', 'stage_writing')
+
+def run_single(input_path, output_path, language='cs', progress=None, cancelled=None, metric_options=None,
+               on_stats=None, export_profile='full', sidecar=False, nodata=None):
+    """Export one file in stages, reporting progress and honouring cancellation.
+
+    progress is called as progress(stage_index, text) for reading, computing
+    and writing (see SINGLE_STAGES) and once more with len(SINGLE_STAGES) when
+    done. cancelled is polled between and within the stages; the output is
+    written atomically, so a cancelled export leaves no file behind. on_stats
+    gets the file's profile record like in run_batch, and export_profile,
+    sidecar and nodata work as in run_batch.
+
+    Returns (success_count, error_files, skipped_files) like run_batch.
+    """
+    name = os.path.basename(input_path)
+    profile = FileProfile(name)
+
+    def begin(i):
+        check_cancelled(cancelled)
+        if progress:
+            progress(i, TRANSLATIONS[language][SINGLE_STAGES[i]].format(name))
+
+    try:
+        begin(0)
+        with profile.stage('read'):
+            cm, df, class_names = load_export(input_path, export_profile, sidecar, nodata, cancelled)
+        profile.read(input_path)
+        begin(1)
+        with profile.stage('compute'):
+            metrics = metrics_from_matrix(cm, language, class_names=class_names, **(metric_options or {}))
+        begin(2)
+        save_workbook(output_path, input_path, metrics, df, language, metric_options=metric_options, profile=profile,
+                      cancelled=cancelled)
+    except Cancelled:
+        return 0, [], []
+    except Exception as e:
+        if on_stats:
+            on_stats(profile.as_dict(success=False))
+        return 0, [(name, str(e))], []
+
+    if on_stats:
+        on_stats(profile.as_dict(success=True))
+    if progress:
+        progress(len(SINGLE_STAGES), TRANSLATIONS[language]['done'])
+    return 1, [], []
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+import numpy as np
+from . import __version__
+from .metrics import load_export, metrics_from_matrix
+from .labels import input_files, matrix_table
+from .instrument import stage
+from .atomic import atomic_write
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+def default_cache_dir():
+    """Per-user cache directory for MetriCalc results"""
+    if sys.platform == "win32":
+        base = os.environ.get('LOCALAPPDATA') or Path.home() / "AppData" / "Local"
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or Path.home() / ".cache"
+    return str(Path(base) / "MetriCalc" / "results")
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ResultCache:
+    """On-disk cache of computed metrics keyed by input content, language and version.
+
+    Each entry is one JSON file holding the metrics rows, the parsed matrix and,
+    when they were read, the raw table for the Data sheet or the class codes
+    of the compact matrix. Hits refresh the entry's
+    mtime, and evict() drops the least recently used entries once the
+    directory grows past max_bytes. Writes do not evict, since that means
+    scanning the whole directory; run_batch evicts once per batch. Entries are
+    written atomically, so several worker processes can share one cache
+    directory.
+    """
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir or default_cache_dir())
+        self.max_bytes = max_bytes
+
+    def key(self, input_path, language='cs', metric_options=None, nodata=None):
+        """Cache key for an input file; nodata only matters for label inputs"""
+        options = json.dumps(metric_options or {}, sort_keys=True)
+        if nodata is not None:
+            options += f":nodata={nodata!r}"
+        # A raster pair is keyed by both of its files
+        digest = ':'.join(file_digest(path) for path in input_files(input_path))
+        return hashlib.sha256(
+            f"{digest}:{language}:{__version__}:{options}".encode()
+        ).hexdigest()
+
+    def _entry_path(self, key):
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key):
+        """Return the cached entry dict for a key, or None"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, entry):
+        """Store an entry dict; old entries are only dropped by evict()"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Not named *.json while written, so eviction never sees a partial entry
+        with atomic_write(self._entry_path(key), encoding='utf-8', suffix=".tmp") as f:
+            json.dump(entry, f)
+
+    def _entries(self):
+        entries = []
+        if not self.cache_dir.exists():
+            return entries
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.json'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def size(self):
+        """Total size of all entries in bytes"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits max_bytes"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        """Remove every cached entry"""
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def cached_load_metrics(cache, input_path, language='cs', include_data=True, metric_options=None, profile=None,
+                        sidecar=False, export_profile=None, nodata=None, cancelled=None):
+    """load_metrics through a ResultCache.
+
+    Unchanged inputs are served from the cache without parsing or computing.
+    An entry stored without the raw table only counts as a hit when the Data
+    sheet is not requested, and one without class codes only when the compact
+    matrix is not (see metrics.EXPORT_PROFILES). profile, if given, records
+    the cache lookup (which hashes the input) as the 'cache' stage, plus read
+    and compute on a miss, and cancelled is passed on to the read.
+    """
+    export_profile = export_profile or ('full' if include_data else 'metrics')
+    with stage(profile, 'cache'):
+        key = cache.key(input_path, language, metric_options, nodata)
+        entry = cache.get(key)
+    if profile is not None:
+        profile.read(input_path)
+    if entry is not None:
+        if export_profile == 'metrics':
+            return entry['metrics'], None
+        if export_profile == 'full' and entry.get('data') is not None:
+            import pandas as pd
+            with stage(profile, 'cache'):
+                df = pd.DataFrame(entry['data']['rows'], columns=entry['data']['columns'])
+            return entry['metrics'], df
+        if export_profile == 'matrix' and entry.get('codes') is not None:
+            with stage(profile, 'cache'):
+                df = matrix_table(np.asarray(entry['matrix'], dtype=np.int64), entry['codes'])
+            return entry['metrics'], df
+
+    with stage(profile, 'read'):
+        cm, df, class_names = load_export(input_path, export_profile, sidecar, nodata, cancelled)
+    if profile is not None:
+        profile.read(input_path)
+    with stage(profile, 'compute'):
+        metrics = metrics_from_matrix(cm, language, class_names=class_names, **(metric_options or {}))
+    with stage(profile, 'cache'):
+        data = None
+        codes = None
+        if export_profile == 'full':
+            data = {'columns': [str(col) for col in df.columns],
+                    'rows': df.astype(object).where(df.notna(), None).values.tolist()}
+        elif export_profile == 'matrix':
+            # The compact table's C_* columns are the class codes
+            codes = [str(col) for col in df.columns[1:-1]]
+        cache.put(key, {'metrics': metrics, 'matrix': np.asarray(cm).tolist(), 'data': data, 'codes': codes})
+    return metrics, df
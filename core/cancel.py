@@ -0,0 +1,43 @@
+import multiprocessing
+
+class Cancelled(Exception):
+    """Raised inside a work unit when the batch has been cancelled"""
+
+def check_cancelled(cancelled):
+    """Raise Cancelled if cancelled is given and returns True"""
+    if cancelled is not None and cancelled():
+        raise Cancelled()
+
+class SharedFlag:
+    """A cancel flag that work units in worker processes can poll.
+
+    The event lives in a manager process, so the flag can be sent along with
+    a task and workers see set() on their next check, in the middle of a
+    file. Calling the flag returns whether it is set; once its manager is
+    shut down it reads as set, since the batch it belonged to is over.
+    """
+    def __init__(self):
+        self._manager = multiprocessing.get_context('spawn').Manager()
+        self._event = self._manager.Event()
+
+    def __getstate__(self):
+        # Workers only get the event proxy, not the manager
+        return {'_manager': None, '_event': self._event}
+
+    def __call__(self):
+        try:
+            return self._event.is_set()
+        except (OSError, EOFError):
+            return True
+
+    def set(self):
+        try:
+            self._event.set()
+        except (OSError, EOFError):
+            pass
+
+    def close(self):
+        """Stop the manager process"""
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
@@ -0,0 +1,283 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import signal
+import sys
+import threading
+from pathlib import Path
+from . import __version__
+from .batch import run_batch, default_worker_count
+from .progress import ProgressThrottle
+from .cache import default_cache_dir
+from .instrument import StatsLog, format_summary
+from .aggregate import compile_group_pattern
+from .writers import WRITER_FORMATS
+from .discovery import iter_csv_files, matches_patterns, parse_patterns, DEFAULT_INCLUDE
+from .metrics import METRIC_ORDER, AVERAGES, DEFAULT_METRICS, DEFAULT_AVERAGES, EXPORT_PROFILES
+from .labels import parse_nodata
+from .translations import TRANSLATIONS
+
+def discover_inputs(inputs, include=None, exclude=None, recursive=False, skip=()):
+    """Expand folders and glob patterns into a sorted list of CSV paths"""
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            files.extend(os.path.join(item, f) for f in iter_csv_files(item, include, exclude, recursive, skip))
+        elif glob.has_magic(item):
+            files.extend(
+                f for f in glob.glob(item, recursive=True)
+                if matches_patterns(os.path.basename(f), include or DEFAULT_INCLUDE)
+                and not (exclude and matches_patterns(os.path.basename(f), exclude))
+                and not _inside(f, skip)
+            )
+        else:
+            files.append(item)
+    # Drop duplicates but keep a stable order
+    return sorted(dict.fromkeys(os.path.abspath(f) for f in files))
+
+def _inside(path, folders):
+    path = os.path.abspath(path)
+    for folder in filter(None, folders):
+        folder = os.path.abspath(folder)
+        if path == folder or path.startswith(os.path.join(folder, '')):
+            return True
+    return False
+
+def resolve_inputs(inputs, include=None, exclude=None, recursive=False, skip=()):
+    """Return (input_dir, csv_files) for the inputs of a batch.
+
+    A single input folder keeps its structure: the files are relative to it,
+    so separate outputs mirror its subfolders. Anything else is expanded by
+    discover_inputs and made relative to the files' common folder, so equal
+    names from different folders stay apart. skip lists outputs to leave
+    out, like in iter_csv_files.
+    """
+    if len(inputs) == 1 and os.path.isdir(inputs[0]):
+        return inputs[0], list(iter_csv_files(inputs[0], include, exclude, recursive, skip))
+    files = discover_inputs(inputs, include, exclude, recursive, skip)
+    if not files:
+        return "", files
+    try:
+        root = os.path.commonpath([os.path.dirname(f) for f in files])
+    except ValueError:
+        # Different drives have no common folder; the paths stay absolute
+        return "", files
+    return root, [Path(os.path.relpath(f, root)).as_posix() for f in files]
+
+def build_metric_options(metrics=None, averages=None, bootstrap=0, confidence=0.95, seed=None):
+    """metric_options for run_batch from lists of metric and average names.
+
+    Returns an empty dict for the default output; raises ValueError naming
+    unknown metrics or averages.
+    """
+    metrics = list(DEFAULT_METRICS if metrics is None else metrics)
+    averages = list(DEFAULT_AVERAGES if averages is None else averages)
+    unknown = [name for name in metrics if name not in METRIC_ORDER] + \
+              [name for name in averages if name not in AVERAGES]
+    if unknown:
+        raise ValueError(f"unknown metric or average: {', '.join(unknown)}")
+    metric_options = {}
+    if metrics != DEFAULT_METRICS or averages != DEFAULT_AVERAGES:
+        metric_options.update(metrics=metrics, averages=averages)
+    if bootstrap:
+        metric_options.update(bootstrap=bootstrap, confidence=confidence, seed=seed)
+    return metric_options
+
+def build_summary(csv_files, success_count, error_files, skipped_files, completed_files, cancelled=False):
+    """Per-file status records for a finished batch.
+
+    Files that were neither completed, skipped nor failed are reported as
+    cancelled.
+    """
+    errors = dict(error_files)
+    skipped = set(skipped_files)
+    completed = set(completed_files)
+    records = []
+    for csv_file in csv_files:
+        if csv_file in errors:
+            records.append({'file': csv_file, 'status': 'error', 'error': errors.pop(csv_file)})
+        elif csv_file in skipped:
+            records.append({'file': csv_file, 'status': 'skipped', 'error': ''})
+        elif csv_file in completed:
+            records.append({'file': csv_file, 'status': 'ok', 'error': ''})
+        else:
+            records.append({'file': csv_file, 'status': 'cancelled', 'error': ''})
+    # Errors that do not belong to an input, e.g. saving the combined workbook
+    for name, error in errors.items():
+        records.append({'file': name, 'status': 'error', 'error': error})
+    return {
+        'version': __version__,
+        'processed': success_count,
+        'skipped': len(skipped_files),
+        'failed': len(error_files),
+        'cancelled': cancelled,
+        'files': records,
+    }
+
+def write_summary(summary, path, fmt=None):
+    """Write a batch summary as JSON or CSV; '-' writes to stdout"""
+    if fmt is None:
+        fmt = 'csv' if path.lower().endswith('.csv') else 'json'
+    out = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8', newline='')
+    try:
+        if fmt == 'json':
+            json.dump(summary, out, ensure_ascii=False, indent=2)
+            out.write("\n")
+        else:
+            writer = csv.DictWriter(out, fieldnames=['file', 'status', 'error'], delimiter=';')
+            writer.writeheader()
+            writer.writerows(summary['files'])
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="metricalc",
+        description="Export confusion matrix metrics from ArcGIS CSV files without the GUI."
+    )
+    parser.add_argument('inputs', nargs='+',
+                        help="CSV files, folders or glob patterns; label tables with reference/predicted "
+                             "columns and <name>_ref.npy raster pairs are counted into a matrix first")
+    parser.add_argument('-r', '--recursive', action='store_true', help="also scan subfolders of input folders")
+    parser.add_argument('--include', default=None,
+                        help="comma-separated file patterns to process (default: *.csv)")
+    parser.add_argument('--exclude', default=None,
+                        help="comma-separated file or folder patterns to skip")
+    parser.add_argument('-o', '--output', required=True,
+                        help="output folder (separate mode), .xlsx file (single and aggregate modes) or "
+                             ".csv/.parquet file (summary mode)")
+    parser.add_argument('-m', '--mode', choices=['separate', 'single', 'summary', 'aggregate'], default='separate',
+                        help="one workbook per CSV, one workbook with all results, one tidy table with a row per "
+                             "file and class, or the metrics of all matrices summed by class code")
+    parser.add_argument('-f', '--format', choices=WRITER_FORMATS, default='xlsx',
+                        help="separate mode: output format per file (other modes follow the -o extension; "
+                             "XLSX uses XlsxWriter when installed, else openpyxl)")
+    parser.add_argument('-p', '--profile', choices=EXPORT_PROFILES, default='full',
+                        help="separate and single modes: what goes next to the metrics, the raw input table "
+                             "(full), nothing (metrics) or just the confusion matrix (matrix); the lighter "
+                             "profiles never read the raw table")
+    parser.add_argument('--group-pattern', default=None, metavar='REGEX',
+                        help="aggregate mode: sum matrices per group, named by the regex's first capture group "
+                             "(or whole match) in the relative file name, e.g. '^(.+)_tile[0-9]+'")
+    parser.add_argument('--nodata', type=parse_nodata, default=None, metavar='VALUE',
+                        help="label that is not counted in label tables and raster pairs, e.g. 0")
+    parser.add_argument('-l', '--language', choices=sorted(TRANSLATIONS), default='cs')
+    parser.add_argument('-w', '--workers', type=int, default=default_worker_count(),
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument('--metrics', default=','.join(DEFAULT_METRICS),
+                        help=f"comma-separated metrics to report, any of: {','.join(METRIC_ORDER)}")
+    parser.add_argument('--averages', default=','.join(DEFAULT_AVERAGES),
+                        help=f"comma-separated average rows to report, any of: {','.join(AVERAGES)}")
+    parser.add_argument('--bootstrap', type=int, default=0, metavar='N',
+                        help="add bootstrap confidence intervals from N replicates (default: off)")
+    parser.add_argument('--confidence', type=float, default=0.95, help="confidence level for --bootstrap")
+    parser.add_argument('--seed', type=int, default=None, help="random seed for --bootstrap")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only export new or modified files (separate mode)")
+    parser.add_argument('--no-cache', action='store_true', help="do not use the result cache")
+    parser.add_argument('--cache-dir', default=None, help="result cache directory")
+    parser.add_argument('--matrix-sidecar', action='store_true',
+                        help="keep memory-mapped binary matrices next to the CSVs (<name>.csv.mcm) and "
+                             "reuse them while the CSV is unchanged (summary and aggregate modes and the "
+                             "metrics and matrix profiles)")
+    parser.add_argument('--summary', default=None, help="write a run summary to this file, '-' for stdout")
+    parser.add_argument('--summary-format', choices=['json', 'csv'], default=None,
+                        help="summary format (default: from the file extension, else json)")
+    parser.add_argument('--timing-log', default=None,
+                        help="append per-file stage timings, bytes and peak memory to this JSON-lines file")
+    parser.add_argument('--timing-summary', action='store_true',
+                        help="print the slowest files and the time per stage at the end")
+    parser.add_argument('-q', '--quiet', action='store_true', help="do not print progress")
+    parser.add_argument('--version', action='version', version=f"%(prog)s {__version__}")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    include = parse_patterns(args.include) if args.include else None
+    exclude = parse_patterns(args.exclude) if args.exclude else None
+    # Outputs inside the input tree are not read back in as inputs
+    input_dir, csv_files = resolve_inputs(args.inputs, include, exclude, args.recursive, [args.output])
+    if not csv_files:
+        parser.error(TRANSLATIONS[args.language]['no_csv_files_in_folder'])
+
+    batch_mode = {'separate': 1, 'single': 2, 'summary': 3, 'aggregate': 4}[args.mode]
+    if args.group_pattern is not None:
+        try:
+            compile_group_pattern(args.group_pattern)
+        except ValueError as e:
+            parser.error(f"--group-pattern: {e}")
+    if batch_mode == 1:
+        os.makedirs(args.output, exist_ok=True)
+    cache_dir = None if args.no_cache else (args.cache_dir or default_cache_dir())
+    metrics = [name.strip() for name in args.metrics.split(',') if name.strip()]
+    averages = [name.strip() for name in args.averages.split(',') if name.strip()]
+    try:
+        metric_options = build_metric_options(metrics, averages, args.bootstrap, args.confidence, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Ctrl+C cancels cooperatively: running files stop at their next check, nothing is left half-written
+    cancel_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: cancel_event.set())
+
+    completed_files = []
+    records = []
+    stats_log = None
+    if args.timing_log:
+        try:
+            stats_log = StatsLog(args.timing_log)
+        except OSError as e:
+            parser.error(str(e))
+
+    def on_stats(record):
+        records.append(record)
+        if stats_log is not None:
+            stats_log.write(record)
+
+    handled = []
+
+    def on_result(csv_file, success, error):
+        handled.append(csv_file)
+        if success:
+            completed_files.append(csv_file)
+
+    def progress(i, text):
+        print(f"[{i}/{len(csv_files)}] {text.replace(chr(10), ' - ')}", file=sys.stderr)
+
+    throttle = ProgressThrottle(progress, total=len(csv_files), language=args.language)
+
+    success_count, error_files, skipped_files = run_batch(
+        input_dir, args.output if batch_mode == 1 else None, args.output if batch_mode != 1 else None,
+        batch_mode, csv_files, args.language, workers=max(1, args.workers), cache_dir=cache_dir,
+        incremental=args.incremental, progress=None if args.quiet else throttle, cancelled=cancel_event.is_set,
+        on_result=on_result, metric_options=metric_options, on_stats=on_stats, sidecar=args.matrix_sidecar,
+        group_pattern=args.group_pattern, output_format=args.format, export_profile=args.profile,
+        nodata=args.nodata
+    )
+    if stats_log is not None:
+        stats_log.close()
+    if not args.quiet:
+        throttle.flush(len(handled) + len(skipped_files), TRANSLATIONS[args.language]['done'])
+
+    cancelled = cancel_event.is_set()
+    if cancelled and batch_mode != 1:
+        # A cancelled combined workbook or summary table is not saved
+        completed_files = []
+    summary = build_summary(csv_files, success_count, error_files, skipped_files, completed_files, cancelled)
+    if args.summary:
+        write_summary(summary, args.summary, args.summary_format)
+    if not args.quiet:
+        for name, error in error_files:
+            print(f"{name}: {error}", file=sys.stderr)
+        print(f"processed={summary['processed']} skipped={summary['skipped']} failed={summary['failed']}",
+              file=sys.stderr)
+    if args.timing_summary and records:
+        print(format_summary(records, language=args.language), file=sys.stderr)
+    if cancelled:
+        return 130
+    return 1 if error_files else 0
@@ -0,0 +1,105 @@
+import fnmatch
+import os
+import queue
+import threading
+
+DEFAULT_INCLUDE = ('*.csv',)
+
+def matches_patterns(rel_path, patterns):
+    """True if a '/'-separated path matches any of the glob patterns.
+
+    Patterns are matched case-insensitively against the file name and the
+    whole relative path, e.g. '*.csv' or '2024-*/plots/*'.
+    """
+    rel_path = rel_path.lower()
+    name = rel_path.rsplit('/', 1)[-1]
+    return any(fnmatch.fnmatchcase(name, p) or fnmatch.fnmatchcase(rel_path, p)
+               for p in (pattern.lower() for pattern in patterns))
+
+def parse_patterns(text):
+    """Split a comma or semicolon separated pattern list into a list"""
+    return [p.strip() for p in text.replace(';', ',').split(',') if p.strip()]
+
+def _path_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+def iter_csv_files(root, include=None, exclude=None, recursive=False, skip=()):
+    """Yield input files under root, relative to it, while the tree is scanned.
+
+    Uses os.scandir, so nothing is listed up front; each folder is visited in
+    name order and files come before subfolders. include patterns (default
+    '*.csv') select files, exclude patterns drop files and prune whole
+    folders. Paths are yielded with '/' separators. skip lists folders and
+    files, e.g. the outputs of the batch, that are left out wherever they
+    are in the tree.
+    """
+    include = list(include or DEFAULT_INCLUDE)
+    exclude = list(exclude or [])
+    skip = {_path_key(path) for path in skip if path}
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            with os.scandir(os.path.join(root, rel_dir)) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            if exclude and matches_patterns(rel_path, exclude):
+                continue
+            if skip and _path_key(entry.path) in skip:
+                continue
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                if recursive:
+                    subdirs.append(rel_path)
+            elif matches_patterns(rel_path, include):
+                yield rel_path
+        stack.extend(reversed(subdirs))
+
+def discover_ahead(files, on_found=None, report_every=64):
+    """Drain an iterator of files on a background thread, yielding them as they arrive.
+
+    Lets processing start on the first file while the rest of the tree is
+    still being scanned. on_found, if given, is called from the scanning
+    thread with the running number of files found (every report_every files)
+    and with the final total. Closing the generator stops the scan.
+    """
+    found = queue.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def scan():
+        count = 0
+        try:
+            for f in files:
+                if stop.is_set():
+                    return
+                found.put(f)
+                count += 1
+                if on_found and count % report_every == 0:
+                    on_found(count)
+            if on_found:
+                on_found(count)
+        except Exception as e:
+            found.put(e)
+        finally:
+            found.put(done)
+
+    thread = threading.Thread(target=scan, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = found.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
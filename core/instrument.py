@@ -0,0 +1,180 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from .translations import TRANSLATIONS
+
+# Stage names, in pipeline order
+STAGES = ('cache', 'read', 'compute', 'build', 'save')
+
+def _windows_peak_rss():
+    # Peak working set from GetProcessMemoryInfo, in bytes
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + \
+                   [(name, ctypes.c_size_t) for name in ('PeakWorkingSetSize', 'WorkingSetSize',
+                                                         'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                                                         'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage',
+                                                         'PagefileUsage', 'PeakPagefileUsage')]
+
+    kernel32 = ctypes.WinDLL('kernel32')
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    get_info = ctypes.WinDLL('psapi').GetProcessMemoryInfo
+    get_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    if not get_info(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters.PeakWorkingSetSize
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where unsupported
+
+    The peak covers the process lifetime unless reset_peak_rss() lowered it.
+    """
+    if sys.platform == 'win32':
+        try:
+            peak = _windows_peak_rss()
+        except (OSError, AttributeError):
+            return None
+        return peak / (1024 * 1024) if peak is not None else None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def reset_peak_rss():
+    """Reset the peak resident set size to the current one; False where unsupported (Linux only)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+class FileProfile:
+    """Timings, bytes read and written, and the memory high-water mark for one file.
+
+    Work units fill it in through stage() and send it back with as_dict(), so
+    it stays picklable for worker processes; from_dict() lets the parent add
+    the stages that run there (e.g. building combined-workbook sheets). The
+    first stage in each process resets the process peak, so peak_rss_mb is
+    the peak while this file was processed. Where the peak cannot be reset
+    (anywhere but Linux) it is the process's lifetime peak instead, and
+    peak_rss_reset is False.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.stages = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.peak_rss_mb = None
+        self.peak_rss_reset = None
+        self._pid = None
+
+    @classmethod
+    def from_dict(cls, record):
+        profile = cls(record['file'])
+        profile.stages = dict(record['stages'])
+        profile.bytes_read = record['bytes_read']
+        profile.bytes_written = record['bytes_written']
+        profile.peak_rss_mb = record['peak_rss_mb']
+        profile.peak_rss_reset = record.get('peak_rss_reset')
+        return profile
+
+    @contextmanager
+    def stage(self, name):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            # A stage of the same file in another process, e.g. building its
+            # sheets in the parent, keeps the flag only if both were reset
+            reset = reset_peak_rss()
+            self.peak_rss_reset = reset if self.peak_rss_reset is None else self.peak_rss_reset and reset
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+            rss = peak_rss_mb()
+            if rss is not None and (self.peak_rss_mb is None or rss > self.peak_rss_mb):
+                self.peak_rss_mb = rss
+
+    def read(self, path):
+        self.bytes_read += _size(path)
+
+    def wrote(self, path):
+        self.bytes_written += _size(path)
+
+    def as_dict(self, **extra):
+        record = {
+            'file': self.name,
+            'seconds': sum(self.stages.values()),
+            'stages': dict(self.stages),
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'peak_rss_mb': self.peak_rss_mb,
+            'peak_rss_reset': self.peak_rss_reset,
+        }
+        record.update(extra)
+        return record
+
+def stage(profile, name):
+    """profile.stage(name), or a no-op when profile is None"""
+    return profile.stage(name) if profile is not None else nullcontext()
+
+class StatsLog:
+    """Append per-file stats records to a JSON-lines file"""
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, record):
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def format_summary(records, top=10, language='cs'):
+    """Text table of the slowest files and the time spent in each stage"""
+    if not records:
+        return ""
+    slowest = sorted(records, key=lambda r: r['seconds'], reverse=True)[:top]
+    stages = [name for name in STAGES if any(name in r['stages'] for r in records)]
+    width = max(len(r['file']) for r in slowest)
+    width = min(max(width, 4), 48)
+
+    lines = [TRANSLATIONS[language]['stats_slowest'].format(len(slowest), len(records))]
+    lines.append(f"{'file':<{width}}  {'total s':>8}  " + "  ".join(f"{s:>8}" for s in stages) +
+                 f"  {'read MB':>8}  {'written MB':>10}  {'peak MB':>8}")
+    for r in slowest:
+        name = r['file'] if len(r['file']) <= width else "..." + r['file'][-(width - 3):]
+        rss = f"{r['peak_rss_mb']:8.0f}" if r['peak_rss_mb'] is not None else f"{'-':>8}"
+        if r['peak_rss_mb'] is not None and r.get('peak_rss_reset') is False:
+            rss += "*"
+        lines.append(f"{name:<{width}}  {r['seconds']:8.3f}  " +
+                     "  ".join(f"{r['stages'].get(s, 0.0):8.3f}" for s in stages) +
+                     f"  {r['bytes_read'] / 1e6:8.3f}  {r['bytes_written'] / 1e6:10.3f}  {rss}")
+
+    if any(r['peak_rss_mb'] is not None and r.get('peak_rss_reset') is False for r in slowest):
+        lines.append(TRANSLATIONS[language]['stats_peak_not_reset'])
+
+    totals = {s: sum(r['stages'].get(s, 0.0) for r in records) for s in stages}
+    overall = sum(totals.values()) or 1.0
+    lines.append("")
+    lines.append(TRANSLATIONS[language]['stats_by_stage'])
+    for s in sorted(stages, key=totals.get, reverse=True):
+        lines.append(f"{s:<8}  {totals[s]:8.3f} s  {100 * totals[s] / overall:5.1f} %")
+    return "\n".join(lines)
@@ -0,0 +1,270 @@
+import numpy as np
+from .cancel import check_cancelled
+
+# Label-pair inputs: instead of a pre-aggregated ArcGIS matrix, a table of
+# reference/predicted labels per sample (e.g. accuracy assessment points) or
+# two aligned class rasters saved with np.save as <name>_ref.npy and
+# <name>_pred.npy. Both are counted into a K x K matrix chunk by chunk, so
+# memory depends on the chunk size and the number of classes only.
+
+REFERENCE_SUFFIX = '_ref.npy'
+PREDICTED_SUFFIX = '_pred.npy'
+
+# Column names recognized in label tables, compared case-insensitively;
+# ArcGIS accuracy assessment points use GrndTruth and Classified
+REFERENCE_COLUMNS = ('grndtruth', 'grnd_truth', 'ground_truth', 'groundtruth', 'reference', 'ref', 'truth',
+                     'y_true', 'actual')
+PREDICTED_COLUMNS = ('classified', 'predicted', 'prediction', 'pred', 'y_pred')
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+# Integer codes up to this value are counted straight into a dense matrix;
+# larger or non-integer labels go through a label index
+MAX_DENSE_CODE = 1024
+
+class LabelCounter:
+    """Confusion counts accumulated from chunks of (reference, predicted) labels.
+
+    Rows are reference classes and columns predicted classes, like the
+    matrices read from ArcGIS CSVs. Small non-negative integer codes are
+    counted with one np.bincount per chunk; other labels are mapped to
+    indices first. Missing values (NaN, None, negative codes) and nodata are
+    skipped.
+    """
+    def __init__(self, nodata=None):
+        self.nodata = nodata
+        self.counts = np.zeros((0, 0), dtype=np.int64)
+        # label -> row/column index; None while counting dense integer codes,
+        # where the index is the code itself
+        self._index = None
+
+    def _grow(self, size):
+        if size > self.counts.shape[0]:
+            counts = np.zeros((size, size), dtype=np.int64)
+            k = self.counts.shape[0]
+            counts[:k, :k] = self.counts
+            self.counts = counts
+
+    def _valid(self, reference, predicted):
+        keep = np.ones(len(reference), dtype=bool)
+        for values in (reference, predicted):
+            if values.dtype.kind == 'f':
+                keep &= np.isfinite(values)
+            elif values.dtype.kind == 'O':
+                keep &= ~np.array([v is None or v != v for v in values], dtype=bool)
+            if values.dtype.kind in 'iuf':
+                keep &= values >= 0
+            if self.nodata is not None:
+                keep &= values != self.nodata
+        if keep.all():
+            return reference, predicted
+        return reference[keep], predicted[keep]
+
+    def add(self, reference, predicted):
+        """Count one chunk of labels"""
+        reference = np.asarray(reference).reshape(-1)
+        predicted = np.asarray(predicted).reshape(-1)
+        if len(reference) != len(predicted):
+            raise ValueError("Reference and predicted labels differ in length")
+        reference, predicted = self._valid(reference, predicted)
+        if not len(reference):
+            return
+        # Whole-number floats (e.g. an integer column with gaps) are codes too
+        if reference.dtype.kind == 'f' and predicted.dtype.kind == 'f':
+            if np.array_equal(reference, np.floor(reference)) and np.array_equal(predicted, np.floor(predicted)):
+                reference, predicted = reference.astype(np.int64), predicted.astype(np.int64)
+        integer = reference.dtype.kind in 'iu' and predicted.dtype.kind in 'iu'
+        if self._index is None and integer:
+            size = int(max(reference.max(), predicted.max())) + 1
+            if size <= MAX_DENSE_CODE:
+                self._grow(size)
+                size = self.counts.shape[0]
+                flat = reference.astype(np.int64) * size + predicted
+                self.counts += np.bincount(flat, minlength=size * size).reshape(size, size)
+                return
+        if self._index is None:
+            # Switch to a label index; the dense codes so far keep their rows
+            self._index = {code: code for code in range(self.counts.shape[0])}
+        self._add_indexed(reference, predicted)
+
+    def _add_indexed(self, reference, predicted):
+        n = len(reference)
+        values = np.concatenate([reference.astype(object), predicted.astype(object)])
+        try:
+            labels, inverse = np.unique(values, return_inverse=True)
+        except TypeError:
+            # Mixed label types cannot be sorted; index them one by one
+            labels = list(dict.fromkeys(values.tolist()))
+            position = {label: i for i, label in enumerate(labels)}
+            inverse = np.array([position[v] for v in values.tolist()], dtype=np.int64)
+        indices = np.array([self._index.setdefault(_plain(label), len(self._index)) for label in labels],
+                           dtype=np.int64)
+        self._grow(len(self._index))
+        size = self.counts.shape[0]
+        inverse = indices[inverse.reshape(-1)]
+        flat = inverse[:n] * size + inverse[n:]
+        self.counts += np.bincount(flat, minlength=size * size).reshape(size, size)
+
+    def result(self):
+        """Return (cm, labels) over the classes that occur, in label order"""
+        if self._index is None:
+            labels = list(range(self.counts.shape[0]))
+        else:
+            labels = [None] * len(self._index)
+            for label, i in self._index.items():
+                labels[i] = label
+        present = [i for i in range(len(labels))
+                   if self.counts[i].any() or self.counts[:, i].any()]
+        try:
+            present.sort(key=lambda i: labels[i])
+        except TypeError:
+            pass
+        cm = self.counts[np.ix_(present, present)]
+        return cm, [labels[i] for i in present]
+
+def _plain(label):
+    # numpy scalars and their Python equivalents must share one index entry
+    return label.item() if isinstance(label, np.generic) else label
+
+def confusion_from_pairs(chunks, nodata=None, cancelled=None):
+    """Count an iterable of (reference, predicted) chunks into (cm, labels).
+
+    cancelled, if given, is polled before every chunk (see cancel.Cancelled).
+    """
+    counter = LabelCounter(nodata)
+    for reference, predicted in chunks:
+        check_cancelled(cancelled)
+        counter.add(reference, predicted)
+    cm, labels = counter.result()
+    if cm.size == 0:
+        raise ValueError("No valid label pairs found")
+    return cm, labels
+
+def predicted_raster_path(reference_path):
+    """Path of the predicted raster belonging to a <name>_ref.npy reference raster"""
+    if not reference_path.lower().endswith(REFERENCE_SUFFIX):
+        raise ValueError(f"Raster inputs must be named *{REFERENCE_SUFFIX} with a matching *{PREDICTED_SUFFIX}")
+    return reference_path[:-len(REFERENCE_SUFFIX)] + PREDICTED_SUFFIX
+
+def input_files(input_path):
+    """Every file an input is read from: the raster pair, or the file itself"""
+    if str(input_path).lower().endswith(REFERENCE_SUFFIX):
+        return [input_path, predicted_raster_path(str(input_path))]
+    return [input_path]
+
+def iter_raster_chunks(reference_path, predicted_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield aligned label chunks from two memory-mapped .npy rasters"""
+    reference = np.load(reference_path, mmap_mode='r')
+    predicted = np.load(predicted_path, mmap_mode='r')
+    if reference.shape != predicted.shape:
+        raise ValueError(f"Raster shapes differ: {reference.shape} and {predicted.shape}")
+    # Flatten both in the same element order without copying
+    if reference.flags.f_contiguous and predicted.flags.f_contiguous and reference.ndim > 1:
+        reference, predicted = reference.T, predicted.T
+    reference = reference.reshape(-1)
+    predicted = predicted.reshape(-1)
+    for start in range(0, len(reference), chunk_size):
+        yield np.asarray(reference[start:start + chunk_size]), np.asarray(predicted[start:start + chunk_size])
+
+def _split_header(line):
+    sep = ';' if line.count(';') >= line.count(',') else ','
+    return sep, [name.strip().strip('"') for name in line.split(sep)]
+
+def _find_column(columns, candidates):
+    lowered = {name.lower(): name for name in columns}
+    return next((lowered[c] for c in candidates if c in lowered), None)
+
+def label_columns(input_path):
+    """(separator, reference column, predicted column) of a label table, or None.
+
+    Tables with C_* columns are confusion matrices, not label tables.
+    """
+    try:
+        with open(input_path, 'r', encoding='utf-8-sig', errors='replace') as f:
+            line = f.readline().rstrip('\r\n')
+    except OSError:
+        return None
+    sep, columns = _split_header(line)
+    if any(name.startswith('C_') for name in columns):
+        return None
+    reference = _find_column(columns, REFERENCE_COLUMNS)
+    predicted = _find_column(columns, PREDICTED_COLUMNS)
+    if reference is None or predicted is None:
+        return None
+    return sep, reference, predicted
+
+def iter_table_chunks(input_path, sep, reference_column, predicted_column, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield label chunks from a CSV table, reading only its two label columns"""
+    import pandas as pd
+
+    for chunk in pd.read_csv(input_path, sep=sep, usecols=[reference_column, predicted_column],
+                             chunksize=chunk_size):
+        yield chunk[reference_column].to_numpy(), chunk[predicted_column].to_numpy()
+
+def is_label_input(input_path):
+    """True for a reference raster or a CSV of reference/predicted labels"""
+    return str(input_path).lower().endswith('.npy') or label_columns(input_path) is not None
+
+def parse_nodata(text):
+    """NoData label from user input: an integer, a number or the text itself; None when empty"""
+    text = str(text).strip() if text is not None else ""
+    if not text:
+        return None
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+def _class_name(label, i):
+    if isinstance(label, (int, np.integer)):
+        return f"C_{label}"
+    text = str(label)
+    code = text[2:].split()
+    if text.startswith('C_') and code and code[0].isdigit():
+        return text
+    return f"C_{i + 1} - {text}"
+
+def matrix_table(cm, labels):
+    """ArcGIS-style table of a counted matrix, as shown on the Data sheet.
+
+    One ClassValue row per reference class with a C_* column per predicted
+    class and a Total column, then a Total row; compute_metrics reads it back
+    to the same matrix.
+    """
+    import pandas as pd
+
+    names = [_class_name(label, i) for i, label in enumerate(labels)]
+    rows = [[name] + [int(v) for v in row] + [int(row.sum())] for name, row in zip(names, cm)]
+    rows.append(['Total'] + [int(v) for v in cm.sum(axis=0)] + [int(cm.sum())])
+    return pd.DataFrame(rows, columns=['ClassValue'] + names + ['Total'])
+
+def class_keys(labels):
+    """Keys that identify classes across files: C_<code> for integer codes, else the label itself.
+
+    Unlike the matrix_table names, they do not depend on which other classes
+    a file happens to contain, so matrices can be aligned by them.
+    """
+    return [f"C_{label}" if isinstance(label, (int, np.integer)) else str(label) for label in labels]
+
+def count_labels(input_path, chunk_size=DEFAULT_CHUNK_SIZE, nodata=None, cancelled=None):
+    """Count a label input into (cm, labels); see load_label_matrix"""
+    input_path = str(input_path)
+    if input_path.lower().endswith('.npy'):
+        chunks = iter_raster_chunks(input_path, predicted_raster_path(input_path), chunk_size)
+    else:
+        columns = label_columns(input_path)
+        if columns is None:
+            raise ValueError("No reference and predicted label columns found in the CSV file")
+        chunks = iter_table_chunks(input_path, *columns, chunk_size=chunk_size)
+    return confusion_from_pairs(chunks, nodata, cancelled)
+
+def load_label_matrix(input_path, chunk_size=DEFAULT_CHUNK_SIZE, nodata=None, cancelled=None):
+    """Count a label input into a confusion matrix, returning (cm, df).
+
+    df is the matrix_table of the result. Raster pairs are memory-mapped and
+    tables read chunk_size rows at a time, so the labels are never all in
+    memory at once. cancelled is polled between the chunks.
+    """
+    cm, labels = count_labels(input_path, chunk_size, nodata, cancelled)
+    return cm, matrix_table(cm, labels)
@@ -0,0 +1,62 @@
+import json
+import os
+from pathlib import Path
+from . import __version__
+from .labels import input_files
+from .atomic import atomic_write
+
+MANIFEST_NAME = ".metricalc_manifest.json"
+
+def _fingerprint(path):
+    # Size and mtime of every file the input is read from (both rasters of a pair)
+    fingerprint = []
+    for file_path in input_files(path):
+        stat = os.stat(file_path)
+        fingerprint += [stat.st_size, stat.st_mtime_ns]
+    return fingerprint
+
+class Manifest:
+    """Record of which inputs an output folder was last generated from.
+
+    Stored as a JSON file in the output folder. An input counts as unchanged
+    when its size and mtime match the recorded ones, it was exported with the
+    same language, metric options and version, and its output file still exists.
+    """
+    def __init__(self, output_dir):
+        self.path = Path(output_dir) / MANIFEST_NAME
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def _record(self, input_path, language, metric_options=None):
+        return {
+            'fingerprint': _fingerprint(input_path),
+            'language': language,
+            'options': metric_options or {},
+            'version': __version__,
+        }
+
+    def is_current(self, input_path, output_path, language='cs', metric_options=None, name=None):
+        """True if output_path is up to date for input_path.
+
+        Entries are keyed by name, the input path relative to the scanned
+        folder (default: the file name).
+        """
+        entry = self.entries.get(name or os.path.basename(input_path))
+        if not entry or not os.path.exists(output_path):
+            return False
+        try:
+            return entry == self._record(input_path, language, metric_options)
+        except OSError:
+            return False
+
+    def record(self, input_path, language='cs', metric_options=None, name=None):
+        """Mark input_path as exported"""
+        self.entries[name or os.path.basename(input_path)] = self._record(input_path, language, metric_options)
+
+    def save(self):
+        """Write the manifest atomically"""
+        with atomic_write(self.path, encoding='utf-8', suffix=".tmp") as f:
+            json.dump(self.entries, f)
@@ -1,16 +1,189 @@
-import pandas as pd
+import csv
+import os
+import re
+import numpy as np
 from pathlib import Path
-from openpyxl import Workbook
-from sklearn.metrics import precision_score, recall_score, f1_score, accuracy_score, cohen_kappa_score
 from .translations import TRANSLATIONS, get_class_names
+from .instrument import stage
+from .labels import is_label_input, load_label_matrix, count_labels, class_keys, matrix_table
+from .writers import SheetBook, new_book, writer_format
+from .aggregate import sheet_title
+from .cancel import Cancelled
+from .atomic import AtomicFile
 
-def compute_metrics(df, language='cs'):
-    """Compute metrics from confusion matrix data"""
-    df = df.copy()
-    df.columns = df.columns.astype(str)
+# pandas and openpyxl are imported inside the functions that need them, so
+# importing this module (and with it the GUI) stays fast. warm_up() loads
+# them ahead of the first job.
+
+def warm_up():
+    """Import the heavy parsing and export dependencies"""
+    import pandas  # noqa: F401
+    import openpyxl  # noqa: F401
+    try:
+        import xlsxwriter  # noqa: F401
+    except ImportError:
+        pass
+
+def _safe_divide(numerator, denominator):
+    """Element-wise division returning 0 where the denominator is 0"""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    out = np.zeros(np.broadcast(numerator, denominator).shape, dtype=np.float64)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+class _Totals:
+    """Diagonal, row sums and column sums of one or a stack of confusion matrices.
+
+    Every metric below is a function of these totals only, vectorized over any
+    leading stack dimensions (shape (..., K) per class, (...) overall).
+    """
+    def __init__(self, cms):
+        cms = np.asarray(cms, dtype=np.float64)
+        self.tp = np.diagonal(cms, axis1=-2, axis2=-1)
+        self.row_sums = cms.sum(axis=-1)
+        self.col_sums = cms.sum(axis=-2)
+        self.total = self.row_sums.sum(axis=-1)
+        # Classes that occur in the reference or the prediction, the same label
+        # set sklearn infers from the label lists
+        self.present = (self.row_sums + self.col_sums) > 0
+
+def _accuracy(t):
+    return t.tp.sum(axis=-1) / t.total
+
+def _kappa(t):
+    expected = (t.row_sums * t.col_sums).sum(axis=-1) / (t.total * t.total)
+    return np.where(expected != 1, (_accuracy(t) - expected) / (1 - expected), np.nan)
+
+def _mcc(t):
+    s = t.total
+    numerator = t.tp.sum(axis=-1) * s - (t.row_sums * t.col_sums).sum(axis=-1)
+    denominator = np.sqrt((s * s - (t.col_sums ** 2).sum(axis=-1)) * (s * s - (t.row_sums ** 2).sum(axis=-1)))
+    return _safe_divide(numerator, denominator)
+
+def _balanced_accuracy(t):
+    # Mean recall over the classes present in the reference
+    has_support = t.row_sums > 0
+    return (_safe_divide(t.tp, t.row_sums) * has_support).sum(axis=-1) / has_support.sum(axis=-1)
+
+def _quantity_disagreement(t):
+    # Pontius & Millones (2011), as a proportion of all samples
+    return 0.5 * np.abs(t.row_sums - t.col_sums).sum(axis=-1) / t.total
+
+def _allocation_disagreement(t):
+    return np.minimum(t.row_sums - t.tp, t.col_sums - t.tp).sum(axis=-1) / t.total
+
+# Per-class metrics: (per-class function, micro average function)
+PER_CLASS_METRICS = {
+    'precision': (lambda t: _safe_divide(t.tp, t.col_sums), _accuracy),
+    'recall': (lambda t: _safe_divide(t.tp, t.row_sums), _accuracy),
+    'f1': (lambda t: _safe_divide(2 * t.tp, t.row_sums + t.col_sums), _accuracy),
+    'iou': (lambda t: _safe_divide(t.tp, t.row_sums + t.col_sums - t.tp),
+            lambda t: t.tp.sum(axis=-1) / (t.row_sums + t.col_sums - t.tp).sum(axis=-1)),
+    'commission_error': (lambda t: _safe_divide(t.col_sums - t.tp, t.col_sums), lambda t: 1 - _accuracy(t)),
+    'omission_error': (lambda t: _safe_divide(t.row_sums - t.tp, t.row_sums), lambda t: 1 - _accuracy(t)),
+}
+
+# Metrics with one value per matrix, repeated on every row of the output
+OVERALL_METRICS = {
+    'accuracy': _accuracy,
+    'kappa': _kappa,
+    'mcc': _mcc,
+    'balanced_accuracy': _balanced_accuracy,
+    'quantity_disagreement': _quantity_disagreement,
+    'allocation_disagreement': _allocation_disagreement,
+}
+
+# Column order of the output; the default selection reproduces the classic sheet
+METRIC_ORDER = list(PER_CLASS_METRICS) + list(OVERALL_METRICS)
+DEFAULT_METRICS = ['precision', 'recall', 'f1', 'accuracy', 'kappa']
+AVERAGES = ['macro', 'weighted', 'micro']
+DEFAULT_AVERAGES = ['macro']
+
+def _selection(metrics=None, averages=None):
+    """Validate a metric/average selection and return it in output order"""
+    metrics = DEFAULT_METRICS if metrics is None else metrics
+    averages = DEFAULT_AVERAGES if averages is None else averages
+    unknown = [m for m in metrics if m not in METRIC_ORDER] + [a for a in averages if a not in AVERAGES]
+    if unknown:
+        raise ValueError(f"Unknown metrics or averages: {', '.join(unknown)}")
+    return [m for m in METRIC_ORDER if m in metrics], [a for a in AVERAGES if a in averages]
+
+def matrix_metrics(cms, metrics=None, averages=None):
+    """Compute the selected metrics for one confusion matrix or a stack of them.
+
+    Only the selected metrics are evaluated, all from the same diagonal, row
+    and column totals. Returns (per_class, overall, averaged): per_class maps
+    per-class metric names to arrays of shape (..., K), overall maps overall
+    metric names to arrays of shape (...), and averaged maps each selected
+    average ('macro', 'weighted', 'micro') to {metric name: array (...)} for
+    the per-class metrics. Values are unrounded; empty matrices give NaN.
+    """
+    metrics, averages = _selection(metrics, averages)
+    t = _Totals(cms)
+    per_class, overall, averaged = {}, {}, {average: {} for average in averages}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for name in metrics:
+            if name in OVERALL_METRICS:
+                overall[name] = OVERALL_METRICS[name](t)
+                continue
+            per_class_fn, micro_fn = PER_CLASS_METRICS[name]
+            values = per_class_fn(t)
+            per_class[name] = values
+            if 'macro' in averaged:
+                averaged['macro'][name] = (values * t.present).sum(axis=-1) / t.present.sum(axis=-1)
+            if 'weighted' in averaged:
+                averaged['weighted'][name] = (values * t.row_sums).sum(axis=-1) / t.total
+            if 'micro' in averaged:
+                averaged['micro'][name] = micro_fn(t)
+    return per_class, overall, averaged
+
+def stacked_confusion_matrix_metrics(cms):
+    """Compute metrics for a stack of N equally shaped K x K confusion matrices at once.
+
+    Vectorized over the stack: every metric comes from the row sums, column
+    sums and diagonal of all N matrices in a few array operations. Matrices
+    without any samples yield NaN accuracy, kappa and averages.
+
+    Returns (precision, recall, f1, accuracy, kappa, avg_precision, avg_recall, avg_f1)
+    as unrounded arrays of shape (N, K) for the per-class metrics and (N,) for
+    the rest.
+    """
+    cms = np.asarray(cms, dtype=np.float64)
+    if cms.ndim != 3 or cms.shape[1] != cms.shape[2]:
+        raise ValueError("Confusion matrices must be an N x K x K array")
 
+    per_class, overall, averaged = matrix_metrics(cms, DEFAULT_METRICS, ['macro'])
+    macro = averaged['macro']
+    return (per_class['precision'], per_class['recall'], per_class['f1'],
+            overall['accuracy'], overall['kappa'],
+            macro['precision'], macro['recall'], macro['f1'])
+
+def confusion_matrix_metrics(cm):
+    """Compute metrics in closed form from a K x K confusion matrix.
+
+    Rows are reference (true) classes, columns are predicted classes. Only the
+    row sums, column sums and diagonal are used, so the cost depends on the
+    number of classes and not on the number of samples. Results match
+    sklearn's precision/recall/f1 (zero_division=0), accuracy and Cohen's kappa
+    computed on the equivalent per-sample label lists.
+
+    Returns (precision, recall, f1, accuracy, kappa, avg_precision, avg_recall, avg_f1)
+    with per-class arrays and rounded scalars.
+    """
+    cm = np.asarray(cm, dtype=np.float64)
+    if cm.ndim != 2 or cm.shape[0] != cm.shape[1]:
+        raise ValueError("Confusion matrix must be square")
+    if cm.sum() <= 0:
+        raise ValueError("No valid predictions found in the data")
+
+    precision, recall, f1, *scalars = (m[0] for m in stacked_confusion_matrix_metrics(cm[np.newaxis]))
+    return (precision, recall, f1) + tuple(round(float(value), 3) for value in scalars)
+
+def _class_columns(columns):
+    """Return the sorted C_* columns and the class codes their rows start with"""
     # Find C_* columns (handle cases like "C_1 - nezasazena uroda")
-    c_columns = [col for col in df.columns if col.startswith('C_') and '_' in col]
+    c_columns = [col for col in columns if col.startswith('C_') and '_' in col]
     if not c_columns:
         raise ValueError("No C_* columns found in the CSV file")
     
@@ -27,126 +200,417 @@ def compute_metrics(df, language='cs'):
     
     if not class_values:
         raise ValueError("No valid class values found in ClassValue column")
-    
+
+    return c_columns, class_values
+
+def _matrix_rows(df, class_values):
+    """Select the confusion matrix rows of a table by their ClassValue"""
     df_cm = df[df['ClassValue'].astype(str).str.startswith(tuple(class_values))]
     
     if df_cm.empty:
         raise ValueError("No rows found with matching ClassValue entries")
+    return df_cm
 
-    # Handle decimal commas and convert to numeric
-    for col in c_columns:
-        df_cm[col] = df_cm[col].astype(str).str.replace(',', '.').astype(float).astype(int)
-
-    # Create confusion matrix from the C_* columns
-    cm = df_cm[c_columns].to_numpy()
-    
+def _check_matrix(cm):
+    """Reject empty matrices"""
     if cm.size == 0 or cm.shape[0] == 0:
         raise ValueError("Confusion matrix is empty")
+    return cm
 
-    # Create y_true and y_pred arrays
-    y_true = []
-    y_pred = []
-    
-    for i, row in enumerate(cm):
-        # Add true labels (class i repeated by the sum of that row)
-        row_sum = int(row.sum())
-        y_true.extend([i] * row_sum)
-        
-        # Add predicted labels
-        for j, count in enumerate(row):
-            y_pred.extend([j] * int(count))
-    
-    if not y_true or not y_pred:
+def _counts(values):
+    """Convert a float matrix to int64 counts, rejecting empty or non-numeric cells"""
+    if np.isnan(values).any():
+        raise ValueError("The confusion matrix has empty or non-numeric cells")
+    return values.astype(np.int64)
+
+def extract_confusion_matrix(df):
+    """Extract the integer confusion matrix from a raw CSV table.
+
+    Returns (cm, c_columns) where cm is a K x K int64 array.
+    """
+    import pandas as pd
+
+    df = df.copy()
+    df.columns = df.columns.astype(str)
+    c_columns, class_values = _class_columns(list(df.columns))
+    df_cm = _matrix_rows(df, class_values)
+
+    # Handle decimal commas; columns pandas already parsed as numbers skip
+    # the string round trip
+    values = {}
+    for col in c_columns:
+        column = df_cm[col]
+        if not pd.api.types.is_numeric_dtype(column):
+            column = column.astype(str).str.replace(',', '.').astype(float)
+        values[col] = column.to_numpy(dtype=np.float64)
+
+    cm = _counts(np.column_stack([values[col] for col in c_columns]))
+    return _check_matrix(cm), c_columns
+
+def _sniff_export(input_path):
+    """Column header and decimal separator of an ArcGIS export, from its first two lines"""
+    with open(input_path, 'r', encoding='utf-8-sig', errors='replace', newline='') as f:
+        header = f.readline()
+        line = f.readline()
+    columns = next(csv.reader([header.rstrip('\r\n')], delimiter=';'), [])
+    # Integer-only first rows say nothing; decimal commas are the ArcGIS default
+    decimal = '.' if re.search(r'\d\.\d', line) and not re.search(r'\d,\d', line) else ','
+    return [col.strip() for col in columns], decimal
+
+def _read_typed(input_path):
+    """Typed read of the matrix columns; returns (cm, c_columns, labels, columns)"""
+    import pandas as pd
+
+    columns, decimal = _sniff_export(input_path)
+    c_columns, class_values = _class_columns(columns)
+    df = pd.read_csv(input_path, sep=';', decimal=decimal, engine='c', usecols=['ClassValue'] + c_columns)
+    df_cm = _matrix_rows(df, class_values)
+    block = df_cm[c_columns]
+    if all(pd.api.types.is_numeric_dtype(dtype) for dtype in block.dtypes):
+        values = block.to_numpy(dtype=np.float64)
+    else:
+        # A separator the first rows did not show, e.g. in a later P_Accuracy row
+        values = np.column_stack([
+            pd.to_numeric(block[col].astype(str).str.replace(',', '.', regex=False), errors='coerce').to_numpy(dtype=np.float64)
+            for col in c_columns
+        ])
+    cm = _counts(values)
+    return _check_matrix(cm), c_columns, df_cm['ClassValue'].tolist(), columns
+
+def read_confusion_matrix(input_path):
+    """Read only the confusion matrix from an ArcGIS confusion matrix CSV.
+
+    The semicolon-delimited export is parsed in one pass with the decimal
+    separator taken from its first data row, and only the ClassValue and C_*
+    columns are loaded, straight into a compact int64 matrix. Returns (cm,
+    c_columns).
+    """
+    cm, c_columns, _, _ = _read_typed(input_path)
+    return cm, c_columns
+
+def read_matrix_sidecar(input_path):
+    """read_confusion_matrix through a binary sidecar (see sidecar.py).
+
+    The first read parses the CSV and writes <name>.csv.mcm next to it; later
+    reads memory-map the stored matrix until the CSV's size or mtime changes.
+    A folder that cannot be written to just means parsing every time. Returns
+    (cm, c_columns).
+    """
+    from .sidecar import open_sidecar, write_sidecar
+
+    cached = open_sidecar(input_path)
+    if cached is not None:
+        cm, header = cached
+        return cm, header['c_columns']
+    cm, c_columns, labels, columns = _read_typed(input_path)
+    try:
+        write_sidecar(input_path, cm, c_columns, labels, columns)
+    except OSError:
+        pass
+    return cm, c_columns
+
+def bootstrap_intervals(cm, replicates=1000, confidence=0.95, seed=None, chunk_elements=4_000_000):
+    """Bootstrap confidence intervals resampled directly from a confusion matrix.
+
+    Each replicate is one multinomial draw of the total count over the K x K
+    cell probabilities, so no per-sample labels are ever built. Replicates
+    are scored in chunks of at most chunk_elements matrix cells through
+    matrix_metrics.
+
+    Returns a dict of (low, high) percentile intervals for 'f1' (per class),
+    'macro_f1', 'weighted_f1', 'accuracy' and 'kappa'.
+    """
+    cm = np.asarray(cm, dtype=np.int64)
+    k = cm.shape[0]
+    total = int(cm.sum())
+    if total <= 0:
         raise ValueError("No valid predictions found in the data")
+    rng = np.random.default_rng(seed)
+    probabilities = cm.ravel() / total
+    chunk = max(1, chunk_elements // (k * k))
+
+    draws = {'f1': [], 'macro_f1': [], 'weighted_f1': [], 'accuracy': [], 'kappa': []}
+    for start in range(0, replicates, chunk):
+        size = min(chunk, replicates - start)
+        samples = rng.multinomial(total, probabilities, size=size).reshape(size, k, k)
+        per_class, overall, averaged = matrix_metrics(samples, ['f1', 'accuracy', 'kappa'], ['macro', 'weighted'])
+        draws['f1'].append(per_class['f1'])
+        draws['macro_f1'].append(averaged['macro']['f1'])
+        draws['weighted_f1'].append(averaged['weighted']['f1'])
+        draws['accuracy'].append(overall['accuracy'])
+        draws['kappa'].append(overall['kappa'])
 
-    # Calculate metrics
-    precision = precision_score(y_true, y_pred, average=None, zero_division=0)
-    recall = recall_score(y_true, y_pred, average=None, zero_division=0)
-    f1 = f1_score(y_true, y_pred, average=None, zero_division=0)
-    accuracy = round(accuracy_score(y_true, y_pred), 3)
-    kappa = round(cohen_kappa_score(y_true, y_pred), 3)
+    tail = (1 - confidence) / 2 * 100
+    percentiles = [tail, 100 - tail]
+    intervals = {}
+    for name, values in draws.items():
+        low, high = np.nanpercentile(np.concatenate(values), percentiles, axis=0)
+        intervals[name] = (low, high)
+    return intervals
 
-    avg_precision = round(precision_score(y_true, y_pred, average='macro', zero_division=0), 3)
-    avg_recall = round(recall_score(y_true, y_pred, average='macro', zero_division=0), 3)
-    avg_f1 = round(f1_score(y_true, y_pred, average='macro', zero_division=0), 3)
+def metric_headers(language='cs', metrics=None, averages=None, bootstrap=0, confidence=0.95, seed=None):
+    """Column headers for the rows produced by metrics_from_matrix with the same options"""
+    metrics, _ = _selection(metrics, averages)
+    names = TRANSLATIONS[language]['metric_headers']
+    headers = [TRANSLATIONS[language]['headers'][0]] + [names[m] for m in metrics]
+    if bootstrap:
+        percent = f"{confidence * 100:g}"
+        headers.extend(header.format(percent) for header in TRANSLATIONS[language]['ci_headers'])
+    return headers
+
+def metrics_from_matrix(cm, language='cs', metrics=None, averages=None, bootstrap=0, confidence=0.95, seed=None,
+                        class_names=None):
+    """Build the metrics rows (one per class plus one per average) for a confusion matrix.
+
+    metrics selects the columns (see METRIC_ORDER, default DEFAULT_METRICS) and
+    averages the summary rows ('macro', 'weighted', 'micro'); metrics that are
+    not selected are not computed. Overall metrics such as accuracy and kappa
+    repeat on every row. With bootstrap set to a replicate count, every row
+    gets confidence interval columns for F1, overall accuracy and kappa (see
+    bootstrap_intervals). class_names labels the class rows (default C_1 to
+    C_K by position).
+    """
+    metrics, averages = _selection(metrics, averages)
+    cm = np.asarray(cm)
+    if cm.ndim != 2 or cm.shape[0] != cm.shape[1]:
+        raise ValueError("Confusion matrix must be square")
+    if cm.sum() <= 0:
+        raise ValueError("No valid predictions found in the data")
+    num_classes = cm.shape[1]
+    per_class, overall, averaged = matrix_metrics(cm, metrics, averages)
+
+    def value(name, i=None, average=None):
+        if name in overall:
+            v = overall[name]
+        elif average is not None:
+            v = averaged[average][name]
+        else:
+            v = per_class[name][i]
+        return round(float(v), 3)
 
     # Generate class names based on the number of classes found
-    class_names = get_class_names(len(c_columns), language)
+    default_names = get_class_names(num_classes, language)
+    class_names = default_names if class_names is None else list(class_names)
+    average_names = {
+        'macro': default_names[-1] if len(default_names) > num_classes else "Average",
+        'weighted': TRANSLATIONS[language]['weighted_average'],
+        'micro': TRANSLATIONS[language]['micro_average'],
+    }
     
     # Create results for each class
     results = []
-    for i in range(len(c_columns)):
-        if i < len(precision):
-            results.append([
-                class_names[i] if i < len(class_names) else f"Class {i+1}", 
-                round(precision[i], 3), 
-                round(recall[i], 3), 
-                round(f1[i], 3), 
-                accuracy, 
-                kappa
-            ])
+    for i in range(num_classes):
+        results.append([class_names[i] if i < len(class_names) else f"Class {i+1}"] +
+                       [value(name, i=i) for name in metrics])
     
-    # Add average row
-    results.append([
-        class_names[-1] if len(class_names) > len(c_columns) else "Average", 
-        avg_precision, 
-        avg_recall, 
-        avg_f1, 
-        accuracy, 
-        kappa
-    ])
+    # Add average rows
+    for average in averages:
+        results.append([average_names[average]] + [value(name, average=average) for name in metrics])
+
+    if bootstrap:
+        ci = bootstrap_intervals(cm, bootstrap, confidence, seed)
+        shared = [ci['accuracy'][0], ci['accuracy'][1], ci['kappa'][0], ci['kappa'][1]]
+        # Micro-averaged F1 equals overall accuracy
+        average_f1 = {'macro': ci['macro_f1'], 'weighted': ci['weighted_f1'], 'micro': ci['accuracy']}
+        for i, row in enumerate(results):
+            if i < num_classes:
+                f1_ci = [ci['f1'][0][i], ci['f1'][1][i]]
+            else:
+                f1_ci = list(average_f1[averages[i - num_classes]])
+            row.extend(round(float(v), 3) for v in f1_ci + shared)
     
     return results
 
-def export_to_excel(input_path, output_path, language='cs'):
-    """Export metrics to Excel file"""
-    try:
+def compute_metrics(df, language='cs', metric_options=None):
+    """Compute metrics from confusion matrix data"""
+    cm, _ = extract_confusion_matrix(df)
+    return metrics_from_matrix(cm, language, **(metric_options or {}))
+
+def load_matrix(input_path, include_data=True, sidecar=False, cancelled=None):
+    """Read a confusion matrix CSV, returning (cm, df).
+
+    The raw table is only read and returned when include_data is set; otherwise
+    the fast typed reader loads just the matrix and df is None, and with
+    sidecar the matrix comes from its memory-mapped binary sidecar. Label
+    tables and raster pairs (see labels.py) are counted into a matrix, and df
+    is then the counted matrix in ArcGIS layout; cancelled is polled while
+    they are counted.
+    """
+    import pandas as pd
+
+    if is_label_input(input_path):
+        cm, df = load_label_matrix(input_path, cancelled=cancelled)
+        return cm, df if include_data else None
+    if include_data:
         df = pd.read_csv(input_path, sep=';')
-        metrics = compute_metrics(df, language)
-        wb = Workbook()
-        sheetname = Path(input_path).stem
-
-        # Metrics sheet
-        ws1 = wb.active
-        ws1.title = f"{TRANSLATIONS[language]['excel_metrics_sheet']}_{sheetname}"
-        headers = TRANSLATIONS[language]['headers']
-        for col, header in enumerate(headers, start=1):
-            ws1.cell(row=1, column=col).value = header
-        for row_i, row_data in enumerate(metrics, start=2):
-            for col_i, value in enumerate(row_data, start=1):
-                ws1.cell(row=row_i, column=col_i).value = value
-
-        # Data sheet
-        ws2 = wb.create_sheet(f"{TRANSLATIONS[language]['excel_data_sheet']}_{sheetname}")
+        cm, _ = extract_confusion_matrix(df)
+    elif sidecar:
+        df = None
+        cm, _ = read_matrix_sidecar(input_path)
+    else:
+        df = None
+        cm, _ = read_confusion_matrix(input_path)
+    return cm, df
+
+def class_codes(c_columns):
+    """Class codes ('C_3') of C_* matrix columns such as 'C_3 - forest'"""
+    return [f"C_{col.split('_')[1].split()[0]}" for col in c_columns]
+
+def load_class_matrix(input_path, sidecar=False, nodata=None, cancelled=None):
+    """Read just the confusion matrix and its class codes, returning (cm, codes).
+
+    Label inputs are keyed by their labels (see labels.class_keys), so that
+    text labels line up between files that lack some of the classes.
+    """
+    if is_label_input(input_path):
+        cm, labels = count_labels(input_path, nodata=nodata, cancelled=cancelled)
+        return cm, class_keys(labels)
+    if sidecar:
+        cm, c_columns = read_matrix_sidecar(input_path)
+    else:
+        cm, c_columns = read_confusion_matrix(input_path)
+    return cm, class_codes(c_columns)
+
+# Export profiles, i.e. what is written next to the Metrics sheet: 'full'
+# copies the raw input table to the Data sheet, 'matrix' writes only the
+# confusion matrix as a compact ClassValue x C_* table (see
+# labels.matrix_table) and 'metrics' writes no Data sheet at all. The
+# lighter profiles never read the raw table.
+EXPORT_PROFILES = ('full', 'metrics', 'matrix')
+
+def load_export(input_path, export_profile='full', sidecar=False, nodata=None, cancelled=None):
+    """Read what an export profile writes, returning (cm, df, class_names)"""
+    if export_profile not in EXPORT_PROFILES:
+        raise ValueError(f"Unknown export profile {export_profile!r}; use one of {', '.join(EXPORT_PROFILES)}")
+    if is_label_input(input_path):
+        cm, table = load_label_matrix(input_path, nodata=nodata, cancelled=cancelled)
+        return cm, None if export_profile == 'metrics' else table, [str(col) for col in table.columns[1:-1]]
+    if export_profile == 'matrix':
+        cm, codes = load_class_matrix(input_path, sidecar, cancelled=cancelled)
+        return cm, matrix_table(cm, codes), None
+    cm, df = load_matrix(input_path, export_profile == 'full', sidecar, cancelled)
+    return cm, df, None
+
+def load_metrics(input_path, language='cs', include_data=True, metric_options=None, profile=None, sidecar=False,
+                 export_profile=None, nodata=None, cancelled=None):
+    """Read a confusion matrix CSV and compute its metrics, returning (metrics, df)"""
+    with stage(profile, 'read'):
+        cm, df, class_names = load_export(input_path, export_profile or ('full' if include_data else 'metrics'),
+                                          sidecar, nodata, cancelled)
+    if profile is not None:
+        profile.read(input_path)
+    with stage(profile, 'compute'):
+        metrics = metrics_from_matrix(cm, language, class_names=class_names, **(metric_options or {}))
+    return metrics, df
+
+def new_workbook(streaming=True, fmt='xlsx', small=False):
+    """Create an empty workbook, or a writers.SheetBook for the fmt output format"""
+    book = new_book(fmt, small or not streaming)
+    if book is not None:
+        return book
+
+    from openpyxl import Workbook
+
+    if streaming:
+        return Workbook(write_only=True)
+    wb = Workbook()
+    wb.remove(wb.active)
+    return wb
+
+def _create_sheet(wb, title, kind):
+    # SheetBooks with one file per sheet place a sheet by its kind
+    if isinstance(wb, SheetBook):
+        return wb.create_sheet(title, kind)
+    return wb.create_sheet(title)
+
+def _write_sheets(wb, input_path, metrics, df, language='cs', metric_options=None, sheetname=None):
+    """Write the metrics and data sheets of one input file into a workbook"""
+    # Both sheets share the name, cut so the longer prefix still fits Excel's 31 characters
+    prefix = max(len(TRANSLATIONS[language][key]) for key in ('excel_metrics_sheet', 'excel_data_sheet'))
+    sheetname = sheet_title(sheetname or Path(input_path).stem, 31 - prefix - 1)
+
+    # Metrics sheet
+    ws1 = _create_sheet(wb, f"{TRANSLATIONS[language]['excel_metrics_sheet']}_{sheetname}", 'metrics')
+    ws1.append(metric_headers(language, **(metric_options or {})))
+    for row_data in metrics:
+        ws1.append(list(row_data))
+
+    # Finished write-only sheets are flushed now instead of holding an open
+    # temporary file each until the workbook is saved
+    if wb.write_only:
+        ws1.close()
+
+    # Data sheet, only when the export profile kept a table
+    if df is not None:
+        ws2 = _create_sheet(wb, f"{TRANSLATIONS[language]['excel_data_sheet']}_{sheetname}", 'data')
         ws2.append(list(df.columns))
-        for r in df.itertuples(index=False):
-            ws2.append(list(r))
+        # One conversion to Python values instead of a namedtuple per row
+        for r in df.to_numpy(dtype=object).tolist():
+            ws2.append(r)
+        if wb.write_only:
+            ws2.close()
 
+def discard_workbook(wb):
+    """Drop an unsaved workbook, removing the temporary files of write-only sheets"""
+    if isinstance(wb, SheetBook):
+        wb.discard()
+        return
+    if not wb.write_only:
+        return
+    for ws in wb.worksheets:
+        writer = getattr(ws, '_writer', None)
+        if writer is not None and os.path.exists(writer.out):
+            writer.close()
+            writer.cleanup()
+
+def save_workbook_atomic(wb, output_path):
+    """Save a workbook so that output_path is either fully written or untouched.
+
+    The workbook is written to a temporary file next to the target and moved
+    into place, so an interrupted or failed save never leaves a truncated file.
+    """
+    if isinstance(wb, SheetBook):
         wb.save(output_path)
+        return
+    with AtomicFile(output_path, ".xlsx") as tmp_path:
+        wb.save(tmp_path)
+
+def save_workbook(output_path, input_path, metrics, df, language='cs', streaming=True, metric_options=None,
+                  profile=None, cancelled=None):
+    """Write already computed metrics (and the raw table, if any) to their own workbook.
+
+    The format follows the extension of output_path (see writers.writer_format).
+    cancelled is polled once more before the workbook is saved.
+    """
+    if os.path.abspath(output_path) == os.path.abspath(input_path):
+        raise ValueError("The output file would overwrite the input file")
+    with stage(profile, 'build'):
+        wb = new_workbook(streaming, writer_format(output_path), small=True)
+        _write_sheets(wb, input_path, metrics, df, language, metric_options)
+    if cancelled is not None and cancelled():
+        discard_workbook(wb)
+        raise Cancelled()
+    with stage(profile, 'save'):
+        save_workbook_atomic(wb, output_path)
+    if profile is not None:
+        profile.wrote(output_path)
+
+def export_to_excel(input_path, output_path, language='cs', streaming=True, include_data=True, metric_options=None,
+                    profile=None, export_profile=None):
+    """Export metrics to Excel file"""
+    try:
+        metrics, df = load_metrics(input_path, language, include_data, metric_options, profile,
+                                   export_profile=export_profile)
+        save_workbook(output_path, input_path, metrics, df, language, streaming, metric_options, profile)
         return True, None, (metrics, df)
     except Exception as e:
         return False, str(e), None
 
-def add_to_workbook(wb, input_path, metrics, df, language='cs'):
+def add_to_workbook(wb, input_path, metrics, df, language='cs', metric_options=None, profile=None, sheetname=None):
     """Add data to existing workbook"""
     try:
-        sheetname = Path(input_path).stem
-        
-        # Metrics sheet
-        ws1 = wb.create_sheet(f"{TRANSLATIONS[language]['excel_metrics_sheet']}_{sheetname}")
-        headers = TRANSLATIONS[language]['headers']
-        for col, header in enumerate(headers, start=1):
-            ws1.cell(row=1, column=col).value = header
-        for row_i, row_data in enumerate(metrics, start=2):
-            for col_i, value in enumerate(row_data, start=1):
-                ws1.cell(row=row_i, column=col_i).value = value
-
-        # Data sheet
-        ws2 = wb.create_sheet(f"{TRANSLATIONS[language]['excel_data_sheet']}_{sheetname}")
-        ws2.append(list(df.columns))
-        for r in df.itertuples(index=False):
-            ws2.append(list(r))
-        
+        with stage(profile, 'build'):
+            _write_sheets(wb, input_path, metrics, df, language, metric_options, sheetname)
         return True, None
     except Exception as e:
-        return False, str(e) 
\ No newline at end of file
+        return False, str(e) 
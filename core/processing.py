@@ -1,16 +1,28 @@
 import os
-from pathlib import Path
-from openpyxl import Workbook
 from PySide6.QtCore import QThread, Signal
-from .metrics import export_to_excel, add_to_workbook
+from .batch import run_batch, run_single
+from .discovery import iter_csv_files, discover_ahead
+from .instrument import StatsLog, format_summary
+from .progress import ProgressThrottle
 from .translations import TRANSLATIONS
 
 class ProcessingThread(QThread):
-    """Thread for processing files to avoid UI freezing"""
+    """Thread running run_single (batch_mode 0) or run_batch without freezing the UI.
+
+    finished is always emitted, also after requestInterruption() or an error.
+    With csv_files None the input folder is scanned while the batch runs.
+    """
+    PROGRESS_RATE = 10.0
     progress_updated = Signal(int, str)
-    finished = Signal(bool, str, int, list)
+    total_updated = Signal(int)
+    file_stats = Signal(dict)
+    stats_summary = Signal(str)
+    finished = Signal(bool, str, int, list, int)
     
-    def __init__(self, input_dir, output_dir, single_file, batch_mode, csv_files, language='cs'):
+    def __init__(self, input_dir, output_dir, single_file, batch_mode, csv_files, language='cs', workers=1,
+                 cache_dir=None, incremental=False, metric_options=None, recursive=False, include=None,
+                 exclude=None, stats_log=None, sidecar=False, group_pattern=None, output_format='xlsx',
+                 export_profile='full', executor=None, nodata=None):
         super().__init__()
         self.input_dir = input_dir
         self.output_dir = output_dir
@@ -18,48 +30,86 @@ class ProcessingThread(QThread):
         self.batch_mode = batch_mode
         self.csv_files = csv_files
         self.language = language
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.incremental = incremental
+        self.metric_options = metric_options
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude
+        self.stats_log = stats_log
+        self.sidecar = sidecar
+        self.group_pattern = group_pattern
+        self.output_format = output_format
+        self.export_profile = export_profile
+        self.executor = executor
+        self.nodata = nodata
     
     def run(self):
-        success_count = 0
-        error_files = []
-        
-        # For single file mode, create one workbook
-        if self.batch_mode == 2:
-            wb = Workbook()
-            wb.remove(wb.active)
-        
-        for i, csv_file in enumerate(self.csv_files):
-            input_path = os.path.join(self.input_dir, csv_file)
-            
-            self.progress_updated.emit(i, TRANSLATIONS[self.language]['processing_file'].format(csv_file))
-            
-            if self.batch_mode == 1:  # Separate files
-                output_path = os.path.join(self.output_dir, Path(csv_file).stem + ".xlsx")
-                success, error, _ = export_to_excel(input_path, output_path, self.language)
-                if success:
-                    success_count += 1
-                else:
-                    error_files.append((csv_file, error))
-            else:  # Single file
-                try:
-                    success, error, data = export_to_excel(input_path, "temp.xlsx", self.language)
-                    if success and data:
-                        metrics, df = data
-                        add_success, add_error = add_to_workbook(wb, input_path, metrics, df, self.language)
-                        if add_success:
-                            success_count += 1
-                        else:
-                            error_files.append((csv_file, add_error))
-                    else:
-                        error_files.append((csv_file, error))
-                except Exception as e:
-                    error_files.append((csv_file, str(e)))
-        
-        # Save single file
-        if self.batch_mode == 2:
+        records = []
+        log = None
+        log_error = None
+        if self.stats_log:
             try:
-                wb.save(self.single_file)
-            except Exception as e:
-                error_files.append((TRANSLATIONS[self.language]['save_error'], str(e)))
-        
-        self.finished.emit(True, "", success_count, error_files) 
\ No newline at end of file
+                log = StatsLog(self.stats_log)
+            except OSError as e:
+                log_error = (TRANSLATIONS[self.language]['save_error'], str(e))
+
+        def on_stats(record):
+            records.append(record)
+            if log is not None:
+                log.write(record)
+            self.file_stats.emit(record)
+
+        try:
+            success_count, error_files, skipped_files = self._process(on_stats)
+        except Exception as e:
+            # finished must always be emitted, or the progress dialog never closes
+            success_count, error_files, skipped_files = 0, [(TRANSLATIONS[self.language]['error'], str(e))], []
+        finally:
+            if log is not None:
+                log.close()
+        if log_error:
+            error_files.append(log_error)
+        self.stats_summary.emit(format_summary(records, language=self.language))
+        if self.isInterruptionRequested():
+            self.finished.emit(False, TRANSLATIONS[self.language]['batch_cancelled'], success_count, error_files,
+                               len(skipped_files))
+        else:
+            self.finished.emit(True, "", success_count, error_files, len(skipped_files))
+    
+    def _process(self, on_stats):
+        if self.batch_mode == 0:
+            return run_single(
+                os.path.join(self.input_dir, self.csv_files[0]), self.single_file, self.language,
+                progress=self.progress_updated.emit, cancelled=self.isInterruptionRequested,
+                metric_options=self.metric_options, on_stats=on_stats, export_profile=self.export_profile,
+                sidecar=self.sidecar, nodata=self.nodata
+            )
+        throttle = ProgressThrottle(self.progress_updated.emit, self.PROGRESS_RATE, language=self.language)
+        csv_files = self.csv_files
+        if csv_files is None:
+            def on_found(count):
+                throttle.set_total(count)
+                self.total_updated.emit(count)
+
+            csv_files = discover_ahead(
+                iter_csv_files(self.input_dir, self.include, self.exclude, self.recursive,
+                               [self.output_dir, self.single_file]),
+                on_found=on_found
+            )
+        else:
+            throttle.set_total(len(csv_files))
+        handled = []
+        result = run_batch(
+            self.input_dir, self.output_dir, self.single_file, self.batch_mode, csv_files,
+            self.language, workers=self.workers, cache_dir=self.cache_dir, incremental=self.incremental,
+            progress=throttle, cancelled=self.isInterruptionRequested,
+            on_result=lambda csv_file, success, error: handled.append(csv_file),
+            metric_options=self.metric_options, on_stats=on_stats, sidecar=self.sidecar,
+            group_pattern=self.group_pattern, output_format=self.output_format,
+            export_profile=self.export_profile, executor=self.executor, nodata=self.nodata
+        )
+        # Whatever was coalesced away, the last update is the exact count
+        throttle.flush(len(handled) + len(result[2]), TRANSLATIONS[self.language]['done'])
+        return result
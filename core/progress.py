@@ -0,0 +1,60 @@
+import time
+from .translations import TRANSLATIONS
+
+def _format_eta(seconds):
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+class ProgressThrottle:
+    """Coalesce progress(value, text) calls into at most max_rate updates per second.
+
+    Calls in between only remember the latest value and text, so a batch of
+    tens of thousands of small files does not flood the receiver (e.g. a
+    cross-thread Qt signal and a repaint per file). Each forwarded update gets
+    the throughput and, once the total is known, the remaining time appended
+    to its text. flush() forwards the latest or given state unconditionally,
+    so the final count is always exact.
+    """
+    def __init__(self, callback, max_rate=10.0, total=None, language='cs', clock=time.monotonic):
+        self.callback = callback
+        self.interval = 1.0 / max_rate if max_rate else 0.0
+        self.total = total
+        self.language = language
+        self.clock = clock
+        self._start = clock()
+        self._last_emit = None
+        self._latest = None
+
+    def set_total(self, total):
+        self.total = total
+
+    def __call__(self, value, text):
+        self._latest = (value, text)
+        now = self.clock()
+        if self._last_emit is None or now - self._last_emit >= self.interval:
+            self._emit(now)
+
+    def flush(self, value=None, text=None):
+        """Forward the latest update now, or the given one if value is set"""
+        if value is not None:
+            self._latest = (value, text if text is not None else (self._latest or (None, ""))[1])
+        if self._latest is not None:
+            self._emit(self.clock())
+
+    def _emit(self, now):
+        value, text = self._latest
+        self._latest = None
+        self._last_emit = now
+        self.callback(value, self._with_rate(value, text, now))
+
+    def _with_rate(self, value, text, now):
+        elapsed = now - self._start
+        if value <= 0 or elapsed <= 0:
+            return text
+        rate = value / elapsed
+        if self.total and value < self.total:
+            eta = _format_eta((self.total - value) / rate)
+            return f"{text}\n{TRANSLATIONS[self.language]['progress_rate_eta'].format(rate, eta)}"
+        return f"{text}\n{TRANSLATIONS[self.language]['progress_rate'].format(rate)}"
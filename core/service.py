@@ -0,0 +1,415 @@
+import argparse
+import hmac
+import json
+import math
+import os
+import secrets
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from functools import partial
+from pathlib import Path
+from . import __version__
+from .batch import WorkerPool, run_batch, compute_file, iter_results, default_worker_count
+from .cache import default_cache_dir
+from .cli import resolve_inputs, build_metric_options, build_summary
+from .aggregate import compile_group_pattern
+from .discovery import parse_patterns
+from .labels import parse_nodata
+from .metrics import EXPORT_PROFILES, metric_headers, warm_up
+from .writers import WRITER_FORMATS
+from .translations import TRANSLATIONS
+from .atomic import atomic_write
+
+# Long-lived service for repeated jobs: one process with a warm worker pool
+# (see batch.WorkerPool) that takes JSON jobs over a local TCP socket, one
+# job per line with one result line back, or as *.json files dropped into a
+# spool folder, with the result written to <spool>/results/<name>.json.
+# Jobs write files as the service's user, so socket jobs must carry the
+# token the service writes to a file only that user can read (see
+# default_token_path); spool jobs are trusted by the folder's permissions.
+#
+# A job mirrors the command line:
+#
+#   {"inputs": ["/data/tiles"], "output": "/data/out", "mode": "separate",
+#    "language": "en", "format": "json", "profile": "metrics"}
+#
+# plus the token for socket jobs, the optional keys recursive, include, exclude, group_pattern,
+# metrics, averages, bootstrap, confidence, seed, incremental, sidecar,
+# nodata and cache, and an id that is echoed back. mode 'metrics' writes nothing and
+# returns the metrics of every file instead. The result is the run summary
+# of the command line (see cli.build_summary), or {"error": ...} for a job
+# that could not be started.
+
+DEFAULT_PORT = 47730
+
+def default_token_path(port=DEFAULT_PORT):
+    """Per-user file holding the token of the service listening on port"""
+    return str(Path(default_cache_dir()).parent / f"service-{port}.token")
+
+def _write_token(path, token):
+    # Atomic files are created readable by this user only
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with atomic_write(path, encoding='utf-8') as f:
+        f.write(token)
+
+def read_token(path):
+    """Token of a running service from its token file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip()
+JOB_MODES = {'separate': 1, 'single': 2, 'summary': 3, 'aggregate': 4, 'metrics': 0}
+
+def _names(value):
+    # Metric and average lists may be given as a list or a comma-separated string
+    if value is None or isinstance(value, list):
+        return value
+    return [name.strip() for name in str(value).split(',') if name.strip()]
+
+def _json_value(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+def parse_job(job):
+    """Validate a job dict and fill in defaults; raises ValueError"""
+    if not isinstance(job, dict):
+        raise ValueError("A job must be a JSON object")
+    inputs = job.get('inputs')
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    if not inputs:
+        raise ValueError("The job has no inputs")
+    mode = job.get('mode', 'separate')
+    if mode not in JOB_MODES:
+        raise ValueError(f"Unknown mode {mode!r}; use one of {', '.join(JOB_MODES)}")
+    if mode != 'metrics' and not job.get('output'):
+        raise ValueError(f"Mode {mode!r} needs an output")
+    if mode not in ('metrics', 'separate'):
+        # An unknown extension would otherwise be written as XLSX under any name
+        extension = os.path.splitext(str(job['output']))[1].lower().lstrip('.')
+        if extension not in WRITER_FORMATS:
+            raise ValueError(f"Mode {mode!r} writes a file ending in one of {', '.join(WRITER_FORMATS)}")
+    language = job.get('language', 'cs')
+    if language not in TRANSLATIONS:
+        raise ValueError(f"Unknown language {language!r}")
+    output_format = job.get('format', 'xlsx')
+    if output_format not in WRITER_FORMATS:
+        raise ValueError(f"Unknown format {output_format!r}; use one of {', '.join(WRITER_FORMATS)}")
+    export_profile = job.get('profile', 'full')
+    if export_profile not in EXPORT_PROFILES:
+        raise ValueError(f"Unknown export profile {export_profile!r}; use one of {', '.join(EXPORT_PROFILES)}")
+    group_pattern = job.get('group_pattern')
+    if group_pattern:
+        compile_group_pattern(group_pattern)
+    metric_options = build_metric_options(_names(job.get('metrics')), _names(job.get('averages')),
+                                          int(job.get('bootstrap', 0)), float(job.get('confidence', 0.95)),
+                                          job.get('seed'))
+    return {
+        'inputs': [str(item) for item in inputs],
+        'output': str(job['output']) if job.get('output') else None,
+        'mode': mode,
+        'language': language,
+        'format': output_format,
+        'profile': export_profile,
+        'group_pattern': group_pattern or None,
+        'recursive': bool(job.get('recursive', False)),
+        'include': parse_patterns(job['include']) if job.get('include') else None,
+        'exclude': parse_patterns(job['exclude']) if job.get('exclude') else None,
+        'incremental': bool(job.get('incremental', False)),
+        'sidecar': bool(job.get('sidecar', False)),
+        'cache': bool(job.get('cache', True)),
+        'nodata': job['nodata'] if isinstance(job.get('nodata'), (int, float)) else parse_nodata(job.get('nodata')),
+        'metric_options': metric_options,
+    }
+
+class MetricService:
+    """Runs jobs on a worker pool that stays warm between them.
+
+    run_job can be called from several threads at once (one per socket
+    connection and the spool watcher); their files share the pool. close()
+    cancels running jobs cooperatively, like Ctrl+C on the command line, and
+    stops the workers.
+    """
+    def __init__(self, workers=None, cache_dir=None):
+        self.pool = WorkerPool(workers or default_worker_count())
+        self.cache_dir = cache_dir
+        self.stopped = threading.Event()
+        self._server = None
+        self.token = None
+        self.token_path = None
+
+    def start(self):
+        """Warm up this process and start the worker pool"""
+        warm_up()
+        self.pool.executor()
+
+    def run_job(self, job):
+        """Run one job dict and return its result dict"""
+        try:
+            request = parse_job(job)
+        except (ValueError, TypeError) as e:
+            return self._result(job, {'error': str(e)})
+        try:
+            input_dir, csv_files = resolve_inputs(request['inputs'], request['include'], request['exclude'],
+                                                  request['recursive'], [request['output']])
+        except OSError as e:
+            return self._result(job, {'error': str(e)})
+        if not csv_files:
+            return self._result(job, {'error': TRANSLATIONS[request['language']]['no_csv_files_in_folder']})
+        cache_dir = self.cache_dir if request['cache'] else None
+        if request['mode'] == 'metrics':
+            return self._result(job, self._metrics(request, input_dir, csv_files, cache_dir))
+
+        batch_mode = JOB_MODES[request['mode']]
+        output = request['output']
+        completed_files = []
+
+        def on_result(csv_file, success, error):
+            if success:
+                completed_files.append(csv_file)
+
+        try:
+            if batch_mode == 1:
+                os.makedirs(output, exist_ok=True)
+            success_count, error_files, skipped_files = run_batch(
+                input_dir, output if batch_mode == 1 else None, output if batch_mode != 1 else None,
+                batch_mode, csv_files, request['language'], workers=self.pool.workers, cache_dir=cache_dir,
+                incremental=request['incremental'],
+                cancelled=self.stopped.is_set,
+                on_result=on_result,
+                metric_options=request['metric_options'], sidecar=request['sidecar'],
+                group_pattern=request['group_pattern'], output_format=request['format'],
+                export_profile=request['profile'], executor=self.pool, nodata=request['nodata']
+            )
+        except Exception as e:
+            return self._result(job, {'error': str(e)})
+        cancelled = self.stopped.is_set()
+        if cancelled and batch_mode != 1:
+            completed_files = []
+        return self._result(job, build_summary(csv_files, success_count, error_files, skipped_files,
+                                               completed_files, cancelled))
+
+    def _metrics(self, request, input_dir, csv_files, cache_dir):
+        # Computed in the pool like a summary table, but returned instead of written
+        func = partial(compute_file, language=request['language'], cache_dir=cache_dir,
+                       metric_options=request['metric_options'], include_data=False, sidecar=request['sidecar'],
+                       nodata=request['nodata'])
+        tasks = [(os.path.join(input_dir, csv_file),) for csv_file in csv_files]
+        results = []
+        error_files = []
+        completed_files = []
+        outcomes = iter_results(func, tasks, self.pool.workers, self.pool)
+        try:
+            for csv_file, (success, error, data, _) in zip(csv_files, outcomes):
+                if self.stopped.is_set():
+                    break
+                if success:
+                    metrics, _ = data
+                    completed_files.append(csv_file)
+                    results.append({'file': csv_file,
+                                    'rows': [[_json_value(value) for value in row] for row in metrics]})
+                else:
+                    error_files.append((csv_file, error))
+        finally:
+            outcomes.close()
+        summary = build_summary(csv_files, len(completed_files), error_files, [], completed_files,
+                                self.stopped.is_set())
+        summary['headers'] = metric_headers(request['language'], **request['metric_options'])
+        summary['results'] = results
+        return summary
+
+    def _result(self, job, result):
+        if isinstance(job, dict) and 'id' in job:
+            result = dict(result, id=job['id'])
+        return result
+
+    def serve_socket(self, host='127.0.0.1', port=DEFAULT_PORT, token_path=None):
+        """Accept jobs on a TCP socket in a background thread; returns the bound (host, port).
+
+        A new token is written to token_path (default: default_token_path of
+        the bound port) and jobs without it are refused.
+        """
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        job = json.loads(line)
+                    except ValueError as e:
+                        result = {'error': f"Invalid JSON: {e}"}
+                    else:
+                        if service.authorized(job):
+                            result = service.run_job(job)
+                        else:
+                            result = {'error': "Missing or wrong service token"}
+                    self.wfile.write(json.dumps(result, ensure_ascii=False).encode('utf-8') + b"\n")
+                    self.wfile.flush()
+
+        self._server = _Server((host, port), Handler)
+        self.token = secrets.token_urlsafe(32)
+        self.token_path = token_path or default_token_path(self._server.server_address[1])
+        try:
+            _write_token(self.token_path, self.token)
+        except BaseException:
+            self._server.server_close()
+            raise
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_address
+
+    def authorized(self, job):
+        """True if a socket job carries this service's token"""
+        token = job.get('token') if isinstance(job, dict) else None
+        return isinstance(token, str) and hmac.compare_digest(token.encode('utf-8'), self.token.encode('utf-8'))
+
+    def watch_spool(self, spool_dir, interval=0.5):
+        """Run *.json job files dropped into spool_dir until close() is called.
+
+        A job is claimed by moving it into spool_dir/running, so several
+        services can share one folder, and its result is written atomically
+        to spool_dir/results under the same name. Write job files under a
+        name starting with '.' and rename them when complete. Jobs left in
+        running by a service that stopped are queued again on start.
+        """
+        running_dir = os.path.join(spool_dir, 'running')
+        results_dir = os.path.join(spool_dir, 'results')
+        os.makedirs(running_dir, exist_ok=True)
+        os.makedirs(results_dir, exist_ok=True)
+        for name in os.listdir(running_dir):
+            try:
+                os.replace(os.path.join(running_dir, name), os.path.join(spool_dir, name))
+            except OSError:
+                pass
+        while not self.stopped.is_set():
+            with os.scandir(spool_dir) as it:
+                names = sorted(entry.name for entry in it if entry.is_file() and entry.name.endswith('.json')
+                               and not entry.name.startswith('.'))
+            for name in names:
+                if self.stopped.is_set():
+                    break
+                claimed = os.path.join(running_dir, name)
+                try:
+                    os.replace(os.path.join(spool_dir, name), claimed)
+                except OSError:
+                    continue  # taken by another service
+                try:
+                    with open(claimed, 'r', encoding='utf-8') as f:
+                        job = json.load(f)
+                except (OSError, ValueError) as e:
+                    result = {'error': f"Invalid job file: {e}"}
+                else:
+                    result = self.run_job(job)
+                if self.stopped.is_set() and result.get('cancelled'):
+                    # Queued again on the next start
+                    break
+                _write_json_atomic(os.path.join(results_dir, name), result)
+                os.remove(claimed)
+            self.stopped.wait(interval)
+
+    def close(self):
+        """Cancel running jobs, stop accepting new ones and stop the workers"""
+        self.stopped.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            try:
+                os.remove(self.token_path)
+            except OSError:
+                pass
+        self.pool.shutdown()
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+def _write_json_atomic(path, data):
+    with atomic_write(path, encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+def submit(job, host='127.0.0.1', port=DEFAULT_PORT, timeout=None, token=None):
+    """Send one job to a running service and return its result dict.
+
+    token defaults to the one in the service's default_token_path.
+    """
+    job = dict(job, token=token or read_token(default_token_path(port)))
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall(json.dumps(job).encode('utf-8') + b"\n")
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("The service closed the connection without a result")
+    return json.loads(line)
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="metricalc-service",
+        description="Run MetriCalc jobs on a warm worker pool, taken from a local socket or a spool folder."
+    )
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="address to listen on (default: 127.0.0.1; jobs can write wherever this user can, "
+                             "so keep it local)")
+    parser.add_argument('--port', type=int, default=None,
+                        help=f"TCP port for JSON-lines jobs (default: {DEFAULT_PORT} unless only --spool is given)")
+    parser.add_argument('--token-file', default=None,
+                        help="file the socket's token is written to, or read from with --submit "
+                             f"(default: {default_token_path('<port>')})")
+    parser.add_argument('--spool', default=None, help="folder watched for *.json job files")
+    parser.add_argument('--interval', type=float, default=0.5, help="spool polling interval in seconds")
+    parser.add_argument('-w', '--workers', type=int, default=default_worker_count(),
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument('--no-cache', action='store_true', help="do not use the result cache")
+    parser.add_argument('--cache-dir', default=None, help="result cache directory")
+    parser.add_argument('--submit', default=None, metavar='JOB',
+                        help="send a job file ('-' for stdin) to a running service and print the result")
+    parser.add_argument('--version', action='version', version=f"%(prog)s {__version__}")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.submit:
+        try:
+            if args.submit == '-':
+                job = json.load(sys.stdin)
+            else:
+                with open(args.submit, 'r', encoding='utf-8') as f:
+                    job = json.load(f)
+            port = args.port or DEFAULT_PORT
+            result = submit(job, args.host, port, token=read_token(args.token_file or default_token_path(port)))
+        except (OSError, ValueError) as e:
+            print(str(e), file=sys.stderr)
+            return 1
+        json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+        return 1 if result.get('error') or result.get('failed') else 0
+
+    port = args.port if args.port is not None or args.spool else DEFAULT_PORT
+    cache_dir = None if args.no_cache else (args.cache_dir or default_cache_dir())
+    service = MetricService(max(1, args.workers), cache_dir)
+    service.start()
+    # Ctrl+C and SIGTERM cancel running jobs cooperatively and shut down
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: service.stopped.set())
+    try:
+        if port is not None:
+            host, bound_port = service.serve_socket(args.host, port, args.token_file)
+            print(f"Listening on {host}:{bound_port}, token in {service.token_path}", file=sys.stderr)
+        if args.spool:
+            print(f"Watching {os.path.abspath(args.spool)}", file=sys.stderr)
+            service.watch_spool(args.spool, args.interval)
+        else:
+            while not service.stopped.wait(0.5):
+                pass
+    finally:
+        service.close()
+    return 0
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
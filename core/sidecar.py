@@ -0,0 +1,77 @@
+import json
+import os
+import struct
+import numpy as np
+from .atomic import atomic_write
+
+# Binary matrix sidecar written next to a CSV as <name>.csv.mcm:
+#
+#   magic            16 bytes
+#   header length     8 bytes, little-endian unsigned
+#   header            UTF-8 JSON (source size and mtime, shape, C_* columns,
+#                     class labels, the CSV's column header)
+#   padding           up to a 64-byte boundary
+#   matrix            K x K little-endian int64, C order
+#
+# The matrix is opened with np.memmap, so loading it neither parses nor copies.
+
+SIDECAR_SUFFIX = '.mcm'
+MAGIC = b'METRICALC-MCM\x00\x00\x01'
+_ALIGN = 64
+_DTYPE = np.dtype('<i8')
+
+def sidecar_path(input_path):
+    """Path of the binary sidecar for a CSV"""
+    return str(input_path) + SIDECAR_SUFFIX
+
+def _source_stamp(input_path):
+    stat = os.stat(input_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def write_sidecar(input_path, cm, c_columns, labels, columns):
+    """Write the sidecar for input_path atomically and return its path"""
+    path = sidecar_path(input_path)
+    cm = np.ascontiguousarray(cm, dtype=_DTYPE)
+    header = json.dumps({
+        'source': _source_stamp(input_path),
+        'shape': list(cm.shape),
+        'c_columns': list(c_columns),
+        'labels': [str(label) for label in labels],
+        'columns': [str(col) for col in columns],
+    }).encode('utf-8')
+    offset = len(MAGIC) + 8 + len(header)
+    padding = -offset % _ALIGN
+
+    with atomic_write(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        f.write(b'\x00' * padding)
+        f.write(cm.tobytes())
+    return path
+
+def open_sidecar(input_path):
+    """Memory-map the sidecar of input_path.
+
+    Returns (cm, header) with cm a read-only int64 memmap, or None when there
+    is no sidecar, it is unreadable, or the CSV has changed since it was
+    written (different size or mtime).
+    """
+    path = sidecar_path(input_path)
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            (length,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(length).decode('utf-8'))
+        if header['source'] != _source_stamp(input_path):
+            return None
+        shape = tuple(header['shape'])
+        offset = len(MAGIC) + 8 + length
+        offset += -offset % _ALIGN
+        if os.path.getsize(path) != offset + _DTYPE.itemsize * int(np.prod(shape)):
+            return None
+        cm = np.memmap(path, dtype=_DTYPE, mode='r', offset=offset, shape=shape)
+        return cm, header
+    except (OSError, ValueError, KeyError, TypeError, struct.error):
+        return None
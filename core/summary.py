@@ -0,0 +1,84 @@
+import csv
+from pathlib import Path
+from .atomic import AtomicFile
+
+SUMMARY_FORMATS = ('csv', 'parquet')
+
+def summary_format(output_path):
+    """Pick the summary table format from the output file extension"""
+    return 'parquet' if Path(output_path).suffix.lower() == '.parquet' else 'csv'
+
+class SummaryWriter:
+    """Stream tidy metric rows (one per file x class) into a single CSV or Parquet table.
+
+    The first two columns (file and class) are text, the remaining metric
+    columns are numbers. Rows go to a temporary file next to the output as
+    they arrive; Parquet rows are flushed in row groups of row_group_size.
+    close() moves the table into place and discard() drops it, so a failed or
+    cancelled run never leaves a partial table behind. Parquet needs pyarrow.
+    """
+    def __init__(self, output_path, header, fmt=None, row_group_size=10000):
+        self.output_path = output_path
+        self.header = list(header)
+        self.fmt = fmt or summary_format(output_path)
+        if self.fmt not in SUMMARY_FORMATS:
+            raise ValueError(f"Unsupported summary format: {self.fmt}")
+        self.row_group_size = row_group_size
+        self._rows = []
+        if self.fmt == 'parquet':
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Parquet output requires pyarrow (pip install pyarrow)") from None
+            self._pa = pa
+            self._schema = pa.schema([(name, pa.string()) for name in self.header[:2]] +
+                                     [(name, pa.float64()) for name in self.header[2:]])
+        self._target = AtomicFile(output_path, ".tmp")
+        if self.fmt == 'parquet':
+            self._writer = pq.ParquetWriter(self._target.tmp_path, self._schema)
+        else:
+            self._file = open(self._target.tmp_path, 'w', encoding='utf-8', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.header)
+
+    def add(self, file_name, rows):
+        """Append the metrics rows of one file, each prefixed with the file name"""
+        if self.fmt == 'csv':
+            self._writer.writerows([file_name] + list(row) for row in rows)
+            return
+        self._rows.extend([file_name] + list(row) for row in rows)
+        if len(self._rows) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        columns = [self._pa.array(column, type=field.type) for column, field in zip(zip(*self._rows), self._schema)]
+        self._writer.write_table(self._pa.Table.from_arrays(columns, schema=self._schema))
+        self._rows = []
+
+    def _close_file(self):
+        if self.fmt == 'parquet':
+            self._writer.close()
+        else:
+            self._file.close()
+
+    def close(self):
+        """Finish the table and atomically move it to output_path"""
+        try:
+            if self.fmt == 'parquet':
+                self._flush()
+            self._close_file()
+            self._target.commit()
+        except Exception:
+            self.discard()
+            raise
+
+    def discard(self):
+        """Drop the table without writing output_path"""
+        try:
+            self._close_file()
+        except Exception:
+            pass
+        self._target.discard()
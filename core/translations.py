@@ -12,6 +12,30 @@ TRANSLATIONS = {
         'output_mode': 'Způsob uložení',
         'separate_files': 'Samostatné soubory pro každý CSV',
         'single_file': 'Jeden Excel soubor se všemi výsledky',
+        'workers': 'Počet paralelních procesů:',
+        'bootstrap': 'Bootstrap 95% IS (počet replikací, 0 = vypnuto):',
+        'use_cache': 'Přeskočit nezměněné soubory (cache výsledků)',
+        'clear_cache': 'Vymazat cache',
+        'cache_cleared': 'Cache výsledků byla vymazána.',
+        'incremental': 'Zpracovat jen nové a změněné soubory',
+        'matrix_sidecar': 'Ukládat binární matice vedle CSV (.mcm)',
+        'recursive': 'Včetně podsložek',
+        'timing_log': 'Uložit časový protokol (JSON lines)',
+        'progress_rate': '{:.1f} souborů/s',
+        'progress_rate_eta': '{:.1f} souborů/s, zbývá {}',
+        'stats_slowest': 'Nejpomalejší soubory ({} z {})',
+        'stats_by_stage': 'Čas podle fází',
+        'stats_peak_not_reset': '* Špička paměti od startu procesu; na této platformě ji nelze vynulovat pro každý soubor',
+        'include_patterns': 'Zahrnout:',
+        'exclude_patterns': 'Vynechat:',
+        'skipping_unchanged': 'Přeskočeno {} nezměněných souborů',
+        'skipped_files': '\n\nPřeskočeno {} nezměněných souborů.',
+        'cancelled': 'Zrušeno',
+        'stage_reading': 'Načítání: {}',
+        'stage_computing': 'Výpočet metrik: {}',
+        'stage_writing': 'Zápis výsledků: {}',
+        'batch_cancelled': 'Zpracování bylo zrušeno.',
+        'cancelled_summary': '{}\n\nDokončeno {} souborů.',
         'select_location': 'Výběr umístění',
         'select_output_folder': 'Vyber složku pro uložení výsledků',
         'select_single_file': 'Vyber kam uložit jednotný soubor',
@@ -55,9 +79,49 @@ TRANSLATIONS = {
         'step_4_batch': '4️⃣ Spustit dávkové zpracování',
         'language': 'Language / Jazyk',
         'headers': ["Třída", "Precision (uživ.)", "Recall (producent.)", "F1-skóre", "Celková přesnost", "Kappa index"],
+        'metric_headers': {
+            'precision': "Precision (uživ.)",
+            'recall': "Recall (producent.)",
+            'f1': "F1-skóre",
+            'iou': "IoU (Jaccard)",
+            'commission_error': "Chyba z nadbytku (commission)",
+            'omission_error': "Chyba z opomenutí (omission)",
+            'accuracy': "Celková přesnost",
+            'kappa': "Kappa index",
+            'mcc': "MCC",
+            'balanced_accuracy': "Vyvážená přesnost",
+            'quantity_disagreement': "Kvantitativní nesoulad",
+            'allocation_disagreement': "Alokační nesoulad",
+        },
+        'metrics': 'Metriky',
+        'macro_average': 'Průměr (makro)',
+        'weighted_average': 'Vážený průměr',
+        'micro_average': 'Mikro průměr',
+        'ci_headers': ["F1-skóre {}% IS dolní", "F1-skóre {}% IS horní",
+                       "Celková přesnost {}% IS dolní", "Celková přesnost {}% IS horní",
+                       "Kappa index {}% IS dolní", "Kappa index {}% IS horní"],
         'class_names': ["C_1", "C_2", "Průměr"],
         'excel_metrics_sheet': 'Metriky',
-        'excel_data_sheet': 'Data'
+        'excel_data_sheet': 'Data',
+        'summary_file_column': 'Soubor',
+        'summary_table': 'Jedna souhrnná tabulka (CSV/Parquet)',
+        'summary_file_filter': 'Tabulky (*.parquet *.csv)',
+        'combined_format_error': 'Spojený výstup lze uložit jen jako {}',
+        'output_format': 'Formát výstupu:',
+        'export_profile': 'Obsah výstupu:',
+        'nodata': 'NoData:',
+        'nodata_tooltip': 'Hodnota, která se v tabulkách štítků a rastrech nezapočítává (např. 0)',
+        'profile_full': 'Metriky + vstupní data',
+        'profile_metrics': 'Jen metriky',
+        'profile_matrix': 'Metriky + matice záměn',
+        'export_file_filter': 'Excel (*.xlsx);;JSON (*.json);;CSV (*.csv);;Parquet (*.parquet)',
+        'combined_file_filter': 'Excel (*.xlsx);;JSON (*.json)',
+        'aggregate_mode': 'Sečíst matice do jednoho výsledku (Excel)',
+        'group_pattern': 'Skupiny (regex):',
+        'aggregate_total': 'Celkem',
+        'group_no_match': 'Název souboru neodpovídá vzoru skupin',
+        'invalid_group_pattern': 'Neplatný vzor skupin',
+        'raster_file_filter': 'Referenční rastry NumPy (*_ref.npy)',
     },
     'en': {
         'app_title': 'MetriCalc',
@@ -71,6 +135,30 @@ TRANSLATIONS = {
         'output_mode': 'Output Mode',
         'separate_files': 'Separate files for each CSV',
         'single_file': 'One Excel file with all results',
+        'workers': 'Parallel workers:',
+        'bootstrap': 'Bootstrap 95% CI (replicates, 0 = off):',
+        'use_cache': 'Skip unchanged files (result cache)',
+        'clear_cache': 'Clear cache',
+        'cache_cleared': 'The result cache has been cleared.',
+        'incremental': 'Only process new and modified files',
+        'matrix_sidecar': 'Keep binary matrices next to the CSVs (.mcm)',
+        'recursive': 'Include subfolders',
+        'timing_log': 'Save timing log (JSON lines)',
+        'progress_rate': '{:.1f} files/s',
+        'progress_rate_eta': '{:.1f} files/s, {} remaining',
+        'stats_slowest': 'Slowest files ({} of {})',
+        'stats_by_stage': 'Time by stage',
+        'stats_peak_not_reset': '* Peak memory since the process started; this platform cannot reset it per file',
+        'include_patterns': 'Include:',
+        'exclude_patterns': 'Exclude:',
+        'skipping_unchanged': 'Skipped {} unchanged files',
+        'skipped_files': '\n\nSkipped {} unchanged files.',
+        'cancelled': 'Cancelled',
+        'stage_reading': 'Reading: {}',
+        'stage_computing': 'Computing metrics: {}',
+        'stage_writing': 'Writing results: {}',
+        'batch_cancelled': 'Processing was cancelled.',
+        'cancelled_summary': '{}\n\nCompleted {} files.',
         'select_location': 'Select Location',
         'select_output_folder': 'Select folder for saving results',
         'select_single_file': 'Select where to save single file',
@@ -114,9 +202,49 @@ TRANSLATIONS = {
         'step_4_batch': '4️⃣ Start Batch Processing',
         'language': 'Language / Jazyk',
         'headers': ["Class", "Precision (user)", "Recall (producer)", "F1-score", "Overall Accuracy", "Kappa Index"],
+        'metric_headers': {
+            'precision': "Precision (user)",
+            'recall': "Recall (producer)",
+            'f1': "F1-score",
+            'iou': "IoU (Jaccard)",
+            'commission_error': "Commission Error",
+            'omission_error': "Omission Error",
+            'accuracy': "Overall Accuracy",
+            'kappa': "Kappa Index",
+            'mcc': "MCC",
+            'balanced_accuracy': "Balanced Accuracy",
+            'quantity_disagreement': "Quantity Disagreement",
+            'allocation_disagreement': "Allocation Disagreement",
+        },
+        'metrics': 'Metrics',
+        'macro_average': 'Macro average',
+        'weighted_average': 'Weighted average',
+        'micro_average': 'Micro average',
+        'ci_headers': ["F1-score {}% CI low", "F1-score {}% CI high",
+                       "Overall Accuracy {}% CI low", "Overall Accuracy {}% CI high",
+                       "Kappa Index {}% CI low", "Kappa Index {}% CI high"],
         'class_names': ["C_1", "C_2", "Average"],
         'excel_metrics_sheet': 'Metrics',
-        'excel_data_sheet': 'Data'
+        'excel_data_sheet': 'Data',
+        'summary_file_column': 'File',
+        'summary_table': 'One summary table (CSV/Parquet)',
+        'summary_file_filter': 'Tables (*.parquet *.csv)',
+        'combined_format_error': 'A combined output can only be saved as {}',
+        'output_format': 'Output format:',
+        'export_profile': 'Output contents:',
+        'nodata': 'NoData:',
+        'nodata_tooltip': 'Label that is not counted in label tables and rasters (e.g. 0)',
+        'profile_full': 'Metrics + input data',
+        'profile_metrics': 'Metrics only',
+        'profile_matrix': 'Metrics + confusion matrix',
+        'export_file_filter': 'Excel (*.xlsx);;JSON (*.json);;CSV (*.csv);;Parquet (*.parquet)',
+        'combined_file_filter': 'Excel (*.xlsx);;JSON (*.json)',
+        'aggregate_mode': 'Sum matrices into one result (Excel)',
+        'group_pattern': 'Groups (regex):',
+        'aggregate_total': 'Total',
+        'group_no_match': 'File name does not match the group pattern',
+        'invalid_group_pattern': 'Invalid group pattern',
+        'raster_file_filter': 'NumPy reference rasters (*_ref.npy)',
     }
 }
 
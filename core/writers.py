@@ -0,0 +1,253 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack
+from .atomic import AtomicFile, atomic_write
+
+# Output formats for the Metrics/Data sheets, picked by file extension.
+# XLSX goes through XlsxWriter when it is installed and openpyxl otherwise;
+# the other formats only need the standard library (Parquet needs pyarrow).
+WRITER_FORMATS = ('xlsx', 'json', 'csv', 'parquet')
+# Formats that hold any number of sheets, e.g. a combined workbook
+MULTI_SHEET_FORMATS = ('xlsx', 'json')
+
+# 'auto', 'xlsxwriter' or 'openpyxl'; read per call so worker processes
+# follow the parent
+XLSX_BACKEND_VARIABLE = 'METRICALC_XLSX_BACKEND'
+
+def writer_format(output_path):
+    """Output format for a path: its extension if it is one of WRITER_FORMATS, else xlsx"""
+    ext = os.path.splitext(str(output_path))[1].lower().lstrip('.')
+    return ext if ext in WRITER_FORMATS else 'xlsx'
+
+def xlsx_backend():
+    """Name of the library used for XLSX output"""
+    backend = os.environ.get(XLSX_BACKEND_VARIABLE, 'auto')
+    if backend != 'auto':
+        return backend
+    try:
+        import xlsxwriter  # noqa: F401
+    except ImportError:
+        return 'openpyxl'
+    return 'xlsxwriter'
+
+def _cell(value):
+    # NaN becomes an empty cell, as openpyxl writes it
+    if isinstance(value, float) and value != value:
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+class SheetBook:
+    """A set of named sheets of rows, written to one output on save().
+
+    Mirrors the part of an openpyxl write-only workbook the export uses:
+    create_sheet(title) returns a sheet with append(row) and close(). save()
+    writes atomically and discard() drops an unsaved book. kind ('metrics' or
+    'data') tells formats with one file per sheet where a sheet goes.
+    Subclasses implement create_sheet() and save().
+    """
+    write_only = True
+
+    def discard(self):
+        pass
+
+class _RowSheet:
+    def __init__(self, title, kind=None):
+        self.title = title
+        self.kind = kind
+        self.rows = []
+
+    def append(self, row):
+        self.rows.append([_cell(value) for value in row])
+
+    def close(self):
+        pass
+
+class JsonBook(SheetBook):
+    """Sheets as {"sheets": [{"title", "columns", "rows"}]}, the first row of each being its columns.
+
+    Rows are encoded as they are appended into one temporary file, which
+    save() copies into place, so a combined book never holds its rows in
+    memory. Sheets are filled one after the other, as _write_sheets does.
+    """
+    def __init__(self):
+        self._file = tempfile.TemporaryFile('w+', encoding='utf-8')
+        self._sheet = None
+        self._count = 0
+
+    def create_sheet(self, title, kind=None):
+        if self._sheet is not None:
+            self._sheet.close()
+        self._sheet = _JsonSheet(self, title)
+        return self._sheet
+
+    def _write(self, text):
+        self._file.write(text)
+
+    def save(self, output_path):
+        if self._sheet is not None:
+            self._sheet.close()
+        try:
+            with atomic_write(output_path, encoding='utf-8') as f:
+                f.write('{"sheets": [')
+                self._file.seek(0)
+                shutil.copyfileobj(self._file, f)
+                f.write(']}')
+        finally:
+            self._file.close()
+
+    def discard(self):
+        self._file.close()
+
+class _JsonSheet:
+    def __init__(self, book, title):
+        self._book = book
+        self.title = title
+        self._rows = None
+        self._closed = False
+
+    def _begin(self, columns):
+        prefix = ', ' if self._book._count else ''
+        self._book._count += 1
+        self._book._write(f'{prefix}{{"title": {_json(self.title)}, "columns": {_json(columns)}, "rows": [')
+        self._rows = 0
+
+    def append(self, row):
+        row = [_cell(value) for value in row]
+        if self._rows is None:
+            self._begin(row)
+            return
+        self._book._write((', ' if self._rows else '') + _json(row))
+        self._rows += 1
+
+    def close(self):
+        if self._closed:
+            return
+        if self._rows is None:
+            self._begin([])
+        self._book._write(']}')
+        self._closed = True
+
+def _json(value):
+    return json.dumps(value, ensure_ascii=False)
+
+class TableBook(SheetBook):
+    """One CSV or Parquet file per sheet.
+
+    The metrics sheet is written to the output path and the data sheet next
+    to it as <name>_data.<ext>, so a book holds the sheets of one input only.
+    """
+    def __init__(self, fmt):
+        self.fmt = fmt
+        self.sheets = []
+
+    def create_sheet(self, title, kind=None):
+        kind = kind or 'metrics'
+        if any(sheet.kind == kind for sheet in self.sheets):
+            raise ValueError(f"{self.fmt.upper()} output holds the sheets of one input file; "
+                             f"use {' or '.join(MULTI_SHEET_FORMATS)} to combine files")
+        sheet = _RowSheet(title, kind)
+        self.sheets.append(sheet)
+        return sheet
+
+    def _sheet_path(self, output_path, kind):
+        if kind == 'metrics':
+            return output_path
+        stem, ext = os.path.splitext(str(output_path))
+        return f"{stem}_{kind}{ext}"
+
+    def save(self, output_path):
+        # Every sheet is written before any of them replaces its target
+        with ExitStack() as stack:
+            for sheet in self.sheets:
+                tmp_path = stack.enter_context(AtomicFile(self._sheet_path(output_path, sheet.kind)))
+                self._write_sheet(sheet, tmp_path)
+
+    def discard(self):
+        self.sheets = []
+
+    def _write_sheet(self, sheet, path):
+        if self.fmt == 'csv':
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                csv.writer(f).writerows(sheet.rows)
+            return
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)") from None
+        header, rows = (sheet.rows[0], sheet.rows[1:]) if sheet.rows else ([], [])
+        columns = []
+        for i in range(len(header)):
+            values = [row[i] if i < len(row) else None for row in rows]
+            try:
+                columns.append(pa.array(values))
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # Mixed text and numbers, e.g. a label column with a Total row
+                columns.append(pa.array([None if v is None else str(v) for v in values]))
+        pq.write_table(pa.Table.from_arrays(columns, names=[str(name) for name in header]), path)
+
+class XlsxWriterBook(SheetBook):
+    """XLSX through XlsxWriter, several times faster than openpyxl for small workbooks.
+
+    A small book (one input's sheets) is built in memory; otherwise rows are
+    streamed to temporary files like openpyxl's write-only mode. Titles are
+    cut to Excel's 31 characters and made unique the way openpyxl does.
+    """
+    def __init__(self, small=False):
+        import xlsxwriter
+
+        options = {'in_memory': True} if small else {'constant_memory': True}
+        self._wb = xlsxwriter.Workbook(None, options)
+        self._titles = set()
+
+    def _title(self, title):
+        title = title[:31]
+        candidate, n = title, 0
+        while candidate.lower() in self._titles:
+            n += 1
+            candidate = f"{title[:31 - len(str(n))]}{n}"
+        self._titles.add(candidate.lower())
+        return candidate
+
+    def create_sheet(self, title, kind=None):
+        return _XlsxWriterSheet(self._wb.add_worksheet(self._title(title)))
+
+    def save(self, output_path):
+        with AtomicFile(output_path) as tmp_path:
+            self._wb.filename = tmp_path
+            self._wb.close()
+
+    def discard(self):
+        # Never closed, so nothing was written; drop the temporary row files
+        for ws in self._wb.worksheets():
+            row_data = getattr(ws, 'row_data_fh', None)
+            if row_data is not None and not row_data.closed:
+                row_data.close()
+            filename = getattr(ws, 'row_data_filename', None)
+            if filename and os.path.exists(filename):
+                os.remove(filename)
+
+class _XlsxWriterSheet:
+    def __init__(self, ws):
+        self._ws = ws
+        self._row = 0
+
+    def append(self, row):
+        self._ws.write_row(self._row, 0, [_cell(value) for value in row])
+        self._row += 1
+
+    def close(self):
+        pass
+
+def new_book(fmt='xlsx', small=False):
+    """A SheetBook for fmt, or None when XLSX output goes through openpyxl"""
+    if fmt == 'json':
+        return JsonBook()
+    if fmt in ('csv', 'parquet'):
+        return TableBook(fmt)
+    if fmt == 'xlsx' and xlsx_backend() == 'xlsxwriter':
+        return XlsxWriterBook(small)
+    return None
@@ -1,21 +1,32 @@
+import time
+START_TIME = time.perf_counter()
+
 import sys
 import os
-from PySide6.QtWidgets import QApplication
-from PySide6.QtGui import QFont
-
-# Suppress Qt threading warnings on macOS
-os.environ['QT_MAC_WANTS_LAYER'] = '1'
-os.environ['QT_LOGGING_RULES'] = 'qt.qpa.*=false'
-
-# Import local modules
-from utils.resources import get_app_icon, load_custom_fonts
-from ui.main_window import MetriCalcApp
+import threading
+import multiprocessing
 
 if __name__ == "__main__":
+    # Required for the batch process pool in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+
     # Add the project root to the Python path to allow for absolute imports
     project_root = os.path.dirname(os.path.abspath(__file__))
     sys.path.insert(0, project_root)
 
+    # Suppress Qt threading warnings on macOS
+    os.environ['QT_MAC_WANTS_LAYER'] = '1'
+    os.environ['QT_LOGGING_RULES'] = 'qt.qpa.*=false'
+
+    # Imported here: spawned batch workers run this file as __mp_main__
+    # and must not load Qt or the window
+    from PySide6.QtWidgets import QApplication
+    from PySide6.QtGui import QFont
+    from PySide6.QtCore import QTimer
+    from utils.resources import get_app_icon, load_custom_fonts
+    from ui.main_window import MetriCalcApp
+    from core.metrics import warm_up
+
     app = QApplication(sys.argv)
     app.setApplicationName("MetriCalc")
     app.setApplicationVersion("1.0")
@@ -31,5 +42,17 @@ if __name__ == "__main__":
     
     window = MetriCalcApp(app_icon=app_icon)
     window.show()
+
+    # Once the window is up, load pandas/openpyxl in the background so the
+    # first job does not pay for them
+    QTimer.singleShot(0, lambda: threading.Thread(target=warm_up, daemon=True).start())
+
+    # Used by benchmarks/startup.py: report the time to the first event loop
+    # pass after show() and quit
+    if os.environ.get('METRICALC_STARTUP_BENCHMARK'):
+        def report_startup():
+            print(f"first_paint_seconds={time.perf_counter() - START_TIME:.4f}", flush=True)
+            app.quit()
+        QTimer.singleShot(0, report_startup)
     
-    sys.exit(app.exec())
\ No newline at end of file
+    sys.exit(app.exec())
@@ -0,0 +1,35 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import synthetic_matrix, write_arcgis_csv
+
+# Class 3 never occurs; class 4 is predicted but absent from the reference
+ABSENT_CLASSES = np.array([
+    [50, 3, 0, 2],
+    [4, 40, 0, 6],
+    [0, 0, 0, 0],
+    [0, 0, 0, 0],
+], dtype=np.int64)
+
+@pytest.fixture
+def matrices():
+    """Three 4-class matrices, one with absent classes"""
+    return [synthetic_matrix(4, 1000, seed=1), synthetic_matrix(4, 500, seed=2), ABSENT_CLASSES]
+
+@pytest.fixture
+def csv_dir(tmp_path, matrices):
+    """Folder with one ArcGIS CSV per matrix, named m0.csv, m1.csv, ..."""
+    directory = tmp_path / "in"
+    directory.mkdir()
+    for i, cm in enumerate(matrices):
+        write_arcgis_csv(directory / f"m{i}.csv", cm, decimal_comma=i % 2 == 0)
+    return directory
+
+@pytest.fixture
+def csv_files(csv_dir):
+    return sorted(f for f in os.listdir(csv_dir) if f.endswith('.csv'))
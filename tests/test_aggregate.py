@@ -0,0 +1,54 @@
+import json
+import numpy as np
+import pytest
+from core.aggregate import MatrixSum
+from core.batch import run_batch
+from core.labels import class_keys
+from core.metrics import metrics_from_matrix
+
+def _sheets(path):
+    with open(path, encoding='utf-8') as f:
+        return {sheet['title']: sheet for sheet in json.load(f)['sheets']}
+
+def test_matrix_sum_aligns_by_code():
+    total = MatrixSum()
+    total.add(np.array([[5, 1], [2, 7]]), ['C_1', 'C_3'])
+    total.add(np.array([[4, 0], [1, 3]]), ['C_2', 'C_3'])
+    total.add(np.array([[1]]), ['C_10'])
+    cm, codes = total.result()
+    assert codes == ['C_1', 'C_2', 'C_3', 'C_10']
+    np.testing.assert_array_equal(cm, [
+        [5, 0, 1, 0],
+        [0, 4, 0, 0],
+        [2, 1, 10, 0],
+        [0, 0, 0, 1],
+    ])
+    assert total.files == 3
+
+def test_matrix_sum_text_labels():
+    total = MatrixSum()
+    total.add(np.array([[3, 1], [0, 2]]), class_keys(['forest', 'water']))
+    total.add(np.array([[1, 1], [1, 1]]), class_keys(['urban', 'water']))
+    cm, codes = total.result()
+    assert codes == ['forest', 'urban', 'water']
+    np.testing.assert_array_equal(cm, [[3, 0, 1], [0, 1, 1], [0, 1, 3]])
+
+def test_matrix_sum_rejects_duplicate_codes():
+    with pytest.raises(ValueError):
+        MatrixSum().add(np.eye(2), ['C_1', 'C_1'])
+
+def test_aggregate(tmp_path, csv_dir, csv_files, matrices):
+    single = tmp_path / "total.json"
+    assert run_batch(str(csv_dir), None, str(single), 4, csv_files, 'en') == (3, [], [])
+    sheets = _sheets(single)
+    total = np.sum(matrices, axis=0)
+    assert sheets['Metrics_Total']['rows'] == metrics_from_matrix(total, 'en', class_names=['C_1', 'C_2', 'C_3',
+                                                                                            'C_4'])
+
+def test_aggregate_groups(tmp_path, csv_dir, csv_files, matrices):
+    single = tmp_path / "groups.json"
+    result = run_batch(str(csv_dir), None, str(single), 4, csv_files, 'en', group_pattern=r'm[01]')
+    # m2 matches no group and is reported as such
+    assert result[0] == 2 and [name for name, _ in result[1]] == ['m2.csv']
+    sheets = _sheets(single)
+    assert sheets['Metrics_m0']['rows'] == metrics_from_matrix(matrices[0], 'en')
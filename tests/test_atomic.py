@@ -0,0 +1,22 @@
+import os
+import pytest
+from core.atomic import AtomicFile, atomic_write
+
+def test_atomic_write_replaces_target(tmp_path):
+    path = tmp_path / "out.json"
+    path.write_text("old", encoding='utf-8')
+    with atomic_write(path, encoding='utf-8') as f:
+        f.write("new")
+        assert path.read_text(encoding='utf-8') == "old"
+    assert path.read_text(encoding='utf-8') == "new"
+    assert os.listdir(tmp_path) == ["out.json"]
+
+def test_failed_write_keeps_target_and_leaves_nothing(tmp_path):
+    path = tmp_path / "out.xlsx"
+    path.write_text("old", encoding='utf-8')
+    with pytest.raises(RuntimeError):
+        with AtomicFile(path) as temp:
+            assert temp.endswith(".xlsx")
+            raise RuntimeError()
+    assert path.read_text(encoding='utf-8') == "old"
+    assert os.listdir(tmp_path) == ["out.xlsx"]
@@ -0,0 +1,89 @@
+import csv
+import json
+import os
+import pytest
+from openpyxl import load_workbook
+from core.batch import run_batch, run_single
+from core.manifest import MANIFEST_NAME
+from core.metrics import metrics_from_matrix
+
+def _sheets(path):
+    with open(path, encoding='utf-8') as f:
+        return {sheet['title']: sheet for sheet in json.load(f)['sheets']}
+
+def _manifest(output_dir):
+    with open(os.path.join(output_dir, MANIFEST_NAME), encoding='utf-8') as f:
+        return json.load(f)
+
+def test_separate_xlsx(tmp_path, csv_dir, csv_files, matrices):
+    out = tmp_path / "out"
+    assert run_batch(str(csv_dir), str(out), None, 1, csv_files, 'en') == (3, [], [])
+    for name, cm in zip(csv_files, matrices):
+        wb = load_workbook(out / name.replace('.csv', '.xlsx'), read_only=True)
+        assert wb.sheetnames == [f"Metrics_{name[:-4]}", f"Data_{name[:-4]}"]
+        rows = [list(row) for row in wb.worksheets[0].iter_rows(min_row=2, values_only=True)]
+        assert rows == metrics_from_matrix(cm, 'en')
+    assert sorted(_manifest(out)) == csv_files
+
+def test_combined_workbook(tmp_path, csv_dir, csv_files, matrices):
+    single = tmp_path / "all.json"
+    assert run_batch(str(csv_dir), None, str(single), 2, csv_files, 'en') == (3, [], [])
+    sheets = _sheets(single)
+    assert list(sheets) == [f"{kind}_m{i}" for i in range(3) for kind in ('Metrics', 'Data')]
+    for i, cm in enumerate(matrices):
+        assert sheets[f"Metrics_m{i}"]['rows'] == metrics_from_matrix(cm, 'en')
+
+def test_run_single(tmp_path, csv_dir, matrices):
+    output = tmp_path / "single.json"
+    stages = []
+    result = run_single(str(csv_dir / "m1.csv"), str(output), 'en', progress=lambda i, text: stages.append(i))
+    assert result == (1, [], [])
+    assert stages == [0, 1, 2, 3]
+    assert _sheets(output)['Metrics_m1']['rows'] == metrics_from_matrix(matrices[1], 'en')
+
+def test_summary_table(tmp_path, csv_dir, csv_files, matrices):
+    single = tmp_path / "summary.csv"
+    assert run_batch(str(csv_dir), None, str(single), 3, csv_files, 'en') == (3, [], [])
+    with open(single, encoding='utf-8', newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0][:2] == ['File', 'Class']
+    expected = [[name[:-4]] + [str(v) for v in row]
+                for name, cm in zip(csv_files, matrices) for row in metrics_from_matrix(cm, 'en')]
+    assert rows[1:] == expected
+
+def test_combined_sheets_named_by_relative_path(tmp_path, csv_dir):
+    for i, sub in enumerate(('a', 'b')):
+        os.makedirs(csv_dir / sub)
+        os.replace(csv_dir / f"m{i}.csv", csv_dir / sub / "x.csv")
+    single = tmp_path / "all.json"
+    assert run_batch(str(csv_dir), None, str(single), 2, ['a/x.csv', 'b/x.csv'], 'en')[0] == 2
+    assert list(_sheets(single)) == ['Metrics_a_x', 'Data_a_x', 'Metrics_b_x', 'Data_b_x']
+
+@pytest.mark.filterwarnings('error')
+def test_long_combined_sheet_names_fit_and_stay_apart(tmp_path, csv_dir):
+    folders = ['site_north_2024/plots_reference', 'site_north_2024/plots_classified']
+    for i, sub in enumerate(folders):
+        os.makedirs(csv_dir / sub)
+        os.replace(csv_dir / f"m{i}.csv", csv_dir / sub / "accuracy_assessment.csv")
+    single = tmp_path / "all.xlsx"
+    files = [f"{sub}/accuracy_assessment.csv" for sub in folders]
+    assert run_batch(str(csv_dir), None, str(single), 2, files, 'en') == (2, [], [])
+    titles = load_workbook(single, read_only=True).sheetnames
+    assert len(set(titles)) == 4 and all(len(title) <= 31 for title in titles)
+    metrics = [title[len('Metrics_'):] for title in titles if title.startswith('Metrics_')]
+    assert [f"Data_{name}" for name in metrics] == [title for title in titles if title.startswith('Data_')]
+    assert all(name.startswith('accuracy_assessm') for name in metrics)
+
+@pytest.mark.parametrize('profile, data_sheet', [('full', True), ('metrics', False), ('matrix', True)])
+def test_separate_json_profiles(tmp_path, csv_dir, csv_files, matrices, profile, data_sheet):
+    out = tmp_path / "out"
+    result = run_batch(str(csv_dir), str(out), None, 1, csv_files, 'en', output_format='json',
+                       export_profile=profile)
+    assert result == (3, [], [])
+    sheets = _sheets(out / "m2.json")
+    assert sheets['Metrics_m2']['rows'] == metrics_from_matrix(matrices[2], 'en')
+    assert ('Data_m2' in sheets) == data_sheet
+    if profile == 'matrix':
+        data = sheets['Data_m2']
+        assert data['columns'] == ['ClassValue', 'C_1', 'C_2', 'C_3', 'C_4', 'Total']
+        assert [row[1:-1] for row in data['rows'][:-1]] == matrices[2].tolist()
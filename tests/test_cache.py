@@ -0,0 +1,75 @@
+import json
+import os
+import time
+import pandas as pd
+import pytest
+from benchmarks.synthetic import synthetic_matrix, write_arcgis_csv
+from core import cache as cache_module
+from core.batch import run_batch
+from core.cache import ResultCache, cached_load_metrics
+from core.metrics import load_metrics
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "m.csv"
+    write_arcgis_csv(path, synthetic_matrix(4, 1000, seed=1))
+    return str(path)
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def _no_reads(monkeypatch):
+    def load_export(*args, **kwargs):
+        raise AssertionError("input was read despite a cache hit")
+    monkeypatch.setattr(cache_module, 'load_export', load_export)
+
+def test_cache_hit_skips_reading(tmp_path, csv_path, monkeypatch):
+    cache = ResultCache(tmp_path / "cache")
+    metrics, df = cached_load_metrics(cache, csv_path, 'en')
+    _no_reads(monkeypatch)
+    cached, cached_df = cached_load_metrics(cache, csv_path, 'en')
+    assert cached == metrics
+    pd.testing.assert_frame_equal(cached_df, df, check_dtype=False)
+    assert cached_load_metrics(cache, csv_path, 'en', export_profile='metrics')[0] == metrics
+
+def test_cache_matches_uncached(tmp_path, csv_path):
+    cache = ResultCache(tmp_path / "cache")
+    for profile in ('full', 'metrics', 'matrix'):
+        assert cached_load_metrics(cache, csv_path, 'en', export_profile=profile)[0] == \
+            load_metrics(csv_path, 'en', export_profile=profile)[0]
+
+def test_cache_key_invalidation(tmp_path, csv_path):
+    cache = ResultCache(tmp_path / "cache")
+    key = cache.key(csv_path, 'en')
+    assert cache.key(csv_path, 'en') == key
+    assert cache.key(csv_path, 'cs') != key
+    assert cache.key(csv_path, 'en', {'averages': ['micro']}) != key
+    assert cache.key(csv_path, 'en', nodata=0) != key
+    write_arcgis_csv(csv_path, synthetic_matrix(4, 1000, seed=2))
+    assert cache.key(csv_path, 'en') != key
+
+def test_cache_eviction_drops_least_recently_used(tmp_path):
+    cache = ResultCache(tmp_path / "cache", max_bytes=1)
+    for i, key in enumerate(('old', 'used', 'new')):
+        cache.put(key, {'metrics': [[i] * 50]})
+        # Distinct mtimes on filesystems with coarse timestamps
+        os.utime(cache._entry_path(key), (time.time() + i, time.time() + i))
+    entry_size = os.path.getsize(cache._entry_path('new'))
+    # Writes alone never evict
+    assert cache.size() == 3 * entry_size
+    cache.max_bytes = 2 * entry_size
+    os.utime(cache._entry_path('used'), (time.time() + 10, time.time() + 10))
+    cache.evict()
+    assert cache.get('old') is None
+    assert cache.get('used') is not None and cache.get('new') is not None
+    cache.clear()
+    assert cache.size() == 0
+
+def test_batch_served_from_cache(tmp_path, csv_dir, csv_files):
+    cache_dir = tmp_path / "cache"
+    first, second = tmp_path / "first.json", tmp_path / "second.json"
+    assert run_batch(str(csv_dir), None, str(first), 2, csv_files, 'en', cache_dir=str(cache_dir))[0] == 3
+    assert len(os.listdir(cache_dir)) == 3
+    assert run_batch(str(csv_dir), None, str(second), 2, csv_files, 'en', cache_dir=str(cache_dir))[0] == 3
+    assert _read(first) == _read(second)
@@ -0,0 +1,96 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pytest
+from core.batch import run_batch, run_single
+from core.cancel import Cancelled, SharedFlag
+from core.labels import count_labels
+from core.manifest import MANIFEST_NAME
+from core.metrics import load_metrics, save_workbook
+
+def _manifest(output_dir):
+    with open(os.path.join(output_dir, MANIFEST_NAME), encoding='utf-8') as f:
+        return json.load(f)
+
+def _outputs(output_dir, ext):
+    return sorted(f for f in os.listdir(output_dir) if f.endswith(ext))
+
+def test_cancel_in_process(tmp_path, csv_dir, csv_files):
+    out = tmp_path / "out"
+    done = []
+    result = run_batch(str(csv_dir), str(out), None, 1, csv_files, 'en', cancelled=lambda: len(done) >= 1,
+                       on_result=lambda csv_file, success, error: done.append(csv_file))
+    assert result == (1, [], [])
+    assert _outputs(out, '.xlsx') == ['m0.xlsx']
+    assert list(_manifest(out)) == ['m0.csv']
+
+@pytest.mark.parametrize('batch_mode, single', [(2, 'all.xlsx'), (3, 'summary.csv'), (4, 'total.xlsx')])
+def test_cancelled_combined_output_is_discarded(tmp_path, csv_dir, csv_files, batch_mode, single):
+    done = []
+    result = run_batch(str(csv_dir), None, str(tmp_path / single), batch_mode, csv_files, 'en',
+                       cancelled=lambda: len(done) >= 1,
+                       on_result=lambda csv_file, success, error: done.append(csv_file))
+    assert result[0] == 0
+    assert os.listdir(tmp_path) == ['in']
+
+def test_cancel_with_pool_counts_files_in_flight(tmp_path, csv_dir):
+    for i in range(3, 12):
+        (csv_dir / f"m{i}.csv").write_bytes((csv_dir / "m0.csv").read_bytes())
+    files = sorted(f for f in os.listdir(csv_dir) if f.endswith('.csv'))
+    out = tmp_path / "out"
+    done = []
+    success_count, error_files, _ = run_batch(
+        str(csv_dir), str(out), None, 1, files, 'en', workers=2,
+        cancelled=lambda: len(done) >= 2, on_result=lambda csv_file, success, error: done.append(csv_file)
+    )
+    # Every written output is counted and recorded, however many were in flight
+    assert error_files == []
+    assert 2 <= success_count < len(files)
+    assert len(_outputs(out, '.xlsx')) == success_count == len(_manifest(out))
+
+def test_run_single_cancelled_leaves_no_output(tmp_path, csv_dir):
+    output = tmp_path / "single.xlsx"
+    assert run_single(str(csv_dir / "m1.csv"), str(output), 'en', cancelled=lambda: True) == (0, [], [])
+    assert not output.exists()
+
+def test_single_file_with_workers_runs_in_process(tmp_path, csv_dir):
+    # A lambda cannot be sent to a worker, so this fails if a pool is started
+    out = tmp_path / "out"
+    assert run_batch(str(csv_dir), str(out), None, 1, ['m1.csv'], 'en', workers=4, cancelled=lambda: False) == \
+        (1, [], [])
+    assert _outputs(out, '.xlsx') == ['m1.xlsx']
+
+def _after(polls):
+    calls = []
+    def cancelled():
+        calls.append(None)
+        return len(calls) > polls
+    return cancelled
+
+def test_label_counting_stops_between_chunks(tmp_path):
+    np.save(tmp_path / "tile_ref.npy", np.arange(100, dtype=np.uint8) % 4)
+    np.save(tmp_path / "tile_pred.npy", np.arange(100, dtype=np.uint8) % 4)
+    assert count_labels(tmp_path / "tile_ref.npy", chunk_size=10, cancelled=_after(10))[0].sum() == 100
+    with pytest.raises(Cancelled):
+        count_labels(tmp_path / "tile_ref.npy", chunk_size=10, cancelled=_after(3))
+
+def test_cancel_before_save_leaves_no_output(tmp_path, csv_dir):
+    metrics, df = load_metrics(str(csv_dir / "m1.csv"), 'en')
+    for name in ("out.xlsx", "out.json"):
+        with pytest.raises(Cancelled):
+            save_workbook(str(tmp_path / name), str(csv_dir / "m1.csv"), metrics, df, 'en', cancelled=lambda: True)
+    assert os.listdir(tmp_path) == ['in']
+
+def test_shared_flag_reaches_worker_processes():
+    flag = SharedFlag()
+    try:
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            assert pool.submit(flag).result() is False
+            flag.set()
+            assert pool.submit(flag).result() is True
+    finally:
+        flag.close()
+    # A flag whose batch is over reads as set
+    assert flag() is True
@@ -0,0 +1,17 @@
+import os
+from core.batch import run_batch
+from core.cli import resolve_inputs
+
+def test_glob_inputs_keep_their_subfolders(tmp_path, csv_dir):
+    for i, sub in enumerate(('a', 'b')):
+        os.makedirs(csv_dir / sub)
+        os.replace(csv_dir / f"m{i}.csv", csv_dir / sub / "x.csv")
+    input_dir, csv_files = resolve_inputs([str(csv_dir / "**" / "*.csv")])
+    assert input_dir == str(csv_dir)
+    assert csv_files == ['a/x.csv', 'b/x.csv', 'm2.csv']
+    out = tmp_path / "out"
+    assert run_batch(input_dir, str(out), None, 1, csv_files, 'en') == (3, [], [])
+    assert (out / "a" / "x.xlsx").exists() and (out / "b" / "x.xlsx").exists()
+
+def test_single_file_input(csv_dir):
+    assert resolve_inputs([str(csv_dir / "m1.csv")]) == (str(csv_dir), ['m1.csv'])
@@ -0,0 +1,15 @@
+from core.batch import run_batch
+from core.cli import resolve_inputs
+from core.discovery import iter_csv_files
+
+def test_outputs_inside_the_input_tree_are_skipped(csv_dir, csv_files):
+    out = csv_dir / "out"
+    for _ in range(2):
+        input_dir, files = resolve_inputs([str(csv_dir)], recursive=True, skip=[str(out)])
+        assert files == csv_files
+        result = run_batch(input_dir, str(out), None, 1, files, 'en', output_format='csv')
+        assert result == (3, [], [])
+    assert not (out / "out").exists()
+    summary = csv_dir / "summary.csv"
+    summary.write_text("", encoding='utf-8')
+    assert list(iter_csv_files(str(csv_dir), recursive=True, skip=[str(out), str(summary)])) == csv_files
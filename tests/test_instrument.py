@@ -0,0 +1,23 @@
+from core import instrument
+from core.instrument import FileProfile, format_summary
+
+def test_peak_without_reset_is_the_lifetime_peak(monkeypatch):
+    monkeypatch.setattr(instrument, 'reset_peak_rss', lambda: False)
+    profile = FileProfile("m.csv")
+    with profile.stage('read'):
+        pass
+    record = profile.as_dict()
+    assert record['peak_rss_reset'] is False
+    assert 0 < record['peak_rss_mb'] <= instrument.peak_rss_mb()
+    summary = format_summary([record], language='en').splitlines()
+    assert summary[2].endswith("*")
+    assert summary[3].startswith("* Peak memory since the process started")
+
+def test_peak_after_reset_is_not_flagged(monkeypatch):
+    monkeypatch.setattr(instrument, 'reset_peak_rss', lambda: True)
+    profile = FileProfile("m.csv")
+    with profile.stage('read'):
+        pass
+    record = FileProfile.from_dict(profile.as_dict()).as_dict()
+    assert record['peak_rss_reset'] is True
+    assert "*" not in format_summary([record], language='en')
@@ -0,0 +1,61 @@
+import numpy as np
+from core.labels import LabelCounter, class_keys, confusion_from_pairs, count_labels, parse_nodata
+
+def _expected(reference, predicted, labels):
+    index = {label: i for i, label in enumerate(labels)}
+    cm = np.zeros((len(labels), len(labels)), dtype=np.int64)
+    for r, p in zip(reference, predicted):
+        cm[index[r], index[p]] += 1
+    return cm
+
+def test_label_counter_dense_codes_in_chunks():
+    rng = np.random.default_rng(0)
+    reference = rng.integers(1, 6, 10000)
+    predicted = np.where(rng.random(10000) < 0.8, reference, rng.integers(1, 6, 10000))
+    counter = LabelCounter()
+    for start in range(0, 10000, 1234):
+        counter.add(reference[start:start + 1234], predicted[start:start + 1234])
+    cm, labels = counter.result()
+    assert labels == [1, 2, 3, 4, 5]
+    np.testing.assert_array_equal(cm, _expected(reference, predicted, labels))
+
+def test_label_counter_skips_missing_and_nodata():
+    reference = np.array([1, 1, 2, 0, np.nan, 2, -1, 3])
+    predicted = np.array([1, 2, 2, 1, 1, 0, 2, 3])
+    cm, labels = confusion_from_pairs([(reference, predicted)], nodata=0)
+    # Pairs with NaN, a negative code or the nodata label in either column are dropped
+    assert labels == [1, 2, 3]
+    np.testing.assert_array_equal(cm, [[1, 1, 0], [0, 1, 0], [0, 0, 1]])
+
+def test_label_counter_text_labels_and_switch_from_codes():
+    counter = LabelCounter()
+    counter.add([1, 2, 2], [1, 2, 1])
+    counter.add(np.array(['water', 'forest'], dtype=object), np.array(['water', 'water'], dtype=object))
+    cm, labels = counter.result()
+    assert sorted(map(str, labels)) == ['1', '2', 'forest', 'water']
+    reference = [1, 2, 2, 'water', 'forest']
+    predicted = [1, 2, 1, 'water', 'water']
+    np.testing.assert_array_equal(cm, _expected(reference, predicted, labels))
+
+def test_label_table_input(tmp_path):
+    path = tmp_path / "points.csv"
+    path.write_text("id;GrndTruth;Classified\n1;1;1\n2;5;5\n3;9;5\n4;0;9\n5;9;9\n", encoding='utf-8')
+    cm, labels = count_labels(path, chunk_size=2, nodata=parse_nodata("0"))
+    assert labels == [1, 5, 9]
+    assert class_keys(labels) == ['C_1', 'C_5', 'C_9']
+    np.testing.assert_array_equal(cm, [[1, 0, 0], [0, 1, 0], [0, 1, 1]])
+
+def test_label_raster_input(tmp_path):
+    reference = np.array([[1, 1, 2], [2, 0, 3]], dtype=np.uint8)
+    predicted = np.array([[1, 2, 2], [2, 3, 3]], dtype=np.uint8)
+    np.save(tmp_path / "tile_ref.npy", reference)
+    np.save(tmp_path / "tile_pred.npy", predicted)
+    cm, labels = count_labels(tmp_path / "tile_ref.npy", chunk_size=4, nodata=0)
+    assert labels == [1, 2, 3]
+    np.testing.assert_array_equal(cm, [[1, 1, 0], [0, 2, 0], [0, 0, 1]])
+
+def test_parse_nodata():
+    assert parse_nodata("") is None
+    assert parse_nodata(" 255 ") == 255
+    assert parse_nodata("-9999.5") == -9999.5
+    assert parse_nodata("none") == "none"
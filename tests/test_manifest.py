@@ -0,0 +1,42 @@
+import os
+import pytest
+from benchmarks.synthetic import synthetic_matrix, write_arcgis_csv
+from core.batch import run_batch
+from core.manifest import Manifest
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "m.csv"
+    write_arcgis_csv(path, synthetic_matrix(4, 1000, seed=1))
+    return str(path)
+
+def test_manifest_invalidation(tmp_path, csv_path):
+    output = tmp_path / "m.xlsx"
+    output.write_bytes(b"x")
+    manifest = Manifest(tmp_path)
+    assert not manifest.is_current(csv_path, output, 'en')
+    manifest.record(csv_path, 'en')
+    manifest.save()
+
+    manifest = Manifest(tmp_path)
+    assert manifest.is_current(csv_path, output, 'en')
+    assert not manifest.is_current(csv_path, output, 'cs')
+    assert not manifest.is_current(csv_path, output, 'en', {'export_profile': 'metrics'})
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert not manifest.is_current(csv_path, output, 'en')
+    manifest.record(csv_path, 'en')
+    output.unlink()
+    assert not manifest.is_current(csv_path, output, 'en')
+
+def test_incremental_skips_unchanged(tmp_path, csv_dir, csv_files):
+    out = tmp_path / "out"
+    assert run_batch(str(csv_dir), str(out), None, 1, csv_files, 'en', incremental=True)[0] == 3
+    assert run_batch(str(csv_dir), str(out), None, 1, csv_files, 'en', incremental=True) == (0, [], csv_files)
+    stat = os.stat(csv_dir / "m1.csv")
+    os.utime(csv_dir / "m1.csv", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert run_batch(str(csv_dir), str(out), None, 1, csv_files, 'en', incremental=True) == \
+        (1, [], ['m0.csv', 'm2.csv'])
+    # Another export profile makes every output stale
+    assert run_batch(str(csv_dir), str(out), None, 1, csv_files, 'en', incremental=True,
+                     export_profile='metrics')[0] == 3
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from conftest import ABSENT_CLASSES
+from benchmarks.synthetic import synthetic_matrix
+from core.metrics import AVERAGES, matrix_metrics, metric_headers, metrics_from_matrix
+
+def _labels(cm):
+    """Per-sample reference and predicted label lists of a confusion matrix"""
+    k = cm.shape[0]
+    reference = np.repeat(np.repeat(np.arange(k), k), cm.ravel())
+    predicted = np.repeat(np.tile(np.arange(k), k), cm.ravel())
+    return reference, predicted
+
+# balanced_accuracy_score warns about classes that are only predicted
+@pytest.mark.filterwarnings('ignore:y_pred contains classes not in y_true')
+@pytest.mark.parametrize('cm', [synthetic_matrix(6, 5000, seed=3), synthetic_matrix(2, 300, seed=4), ABSENT_CLASSES],
+                         ids=['six', 'two', 'absent'])
+def test_sklearn_parity(cm):
+    sklearn_metrics = pytest.importorskip('sklearn.metrics')
+    reference, predicted = _labels(cm)
+    present = sorted(set(reference) | set(predicted))
+    per_class, overall, averaged = matrix_metrics(cm, metrics=['precision', 'recall', 'f1', 'iou', 'accuracy',
+                                                               'kappa', 'mcc', 'balanced_accuracy'],
+                                                  averages=AVERAGES)
+
+    scores = {
+        'precision': sklearn_metrics.precision_score,
+        'recall': sklearn_metrics.recall_score,
+        'f1': sklearn_metrics.f1_score,
+        'iou': sklearn_metrics.jaccard_score,
+    }
+    for name, score in scores.items():
+        expected = score(reference, predicted, average=None, labels=present, zero_division=0)
+        np.testing.assert_allclose(per_class[name][present], expected, err_msg=name)
+        for average in AVERAGES:
+            expected = score(reference, predicted, average=average, zero_division=0)
+            np.testing.assert_allclose(averaged[average][name], expected, err_msg=f"{average} {name}")
+
+    np.testing.assert_allclose(overall['accuracy'], sklearn_metrics.accuracy_score(reference, predicted))
+    np.testing.assert_allclose(overall['kappa'], sklearn_metrics.cohen_kappa_score(reference, predicted))
+    np.testing.assert_allclose(overall['mcc'], sklearn_metrics.matthews_corrcoef(reference, predicted))
+    np.testing.assert_allclose(overall['balanced_accuracy'],
+                               sklearn_metrics.balanced_accuracy_score(reference, predicted))
+
+def test_absent_classes_get_zero_scores():
+    per_class, _, _ = matrix_metrics(ABSENT_CLASSES)
+    assert per_class['precision'][2] == 0 and per_class['recall'][2] == 0
+    # Predicted but never in the reference
+    assert per_class['recall'][3] == 0 and per_class['precision'][3] == 0
+
+def test_metrics_rows_and_headers():
+    cm = synthetic_matrix(3, 900, seed=5)
+    options = {'metrics': ['f1', 'kappa'], 'averages': ['macro', 'weighted', 'micro']}
+    rows = metrics_from_matrix(cm, 'en', class_names=['C_1', 'C_5', 'C_9'], **options)
+    assert [row[0] for row in rows][:3] == ['C_1', 'C_5', 'C_9']
+    assert len(rows) == 3 + 3
+    assert all(len(row) == len(metric_headers('en', **options)) for row in rows)
+    # Kappa repeats on every row; micro F1 equals accuracy
+    assert len({row[2] for row in rows}) == 1
+    assert rows[-1][1] == round(np.trace(cm) / cm.sum(), 3)
+
+def test_metrics_reject_empty_matrix():
+    with pytest.raises(ValueError):
+        metrics_from_matrix(np.zeros((3, 3), dtype=np.int64))
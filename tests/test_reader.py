@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from benchmarks.synthetic import synthetic_matrix, write_arcgis_csv
+from core.metrics import load_matrix, read_confusion_matrix
+
+@pytest.mark.parametrize('decimal_comma', [True, False], ids=['comma', 'dot'])
+def test_typed_reader_matches_full_read(tmp_path, decimal_comma):
+    cm = synthetic_matrix(12, 10000, seed=6)
+    path = tmp_path / "m.csv"
+    write_arcgis_csv(path, cm, decimal_comma)
+    typed, c_columns = read_confusion_matrix(path)
+    np.testing.assert_array_equal(typed, cm)
+    np.testing.assert_array_equal(load_matrix(path)[0], cm)
+    assert c_columns == [f"C_{i + 1}" for i in range(12)]
+
+def test_typed_reader_rejects_empty_cells(tmp_path):
+    path = tmp_path / "m.csv"
+    write_arcgis_csv(path, synthetic_matrix(3, 100, seed=7))
+    lines = path.read_text(encoding='utf-8').splitlines()
+    cells = lines[2].split(';')
+    cells[3] = ''
+    lines[2] = ';'.join(cells)
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    with pytest.raises(ValueError, match="empty or non-numeric"):
+        read_confusion_matrix(path)
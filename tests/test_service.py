@@ -0,0 +1,50 @@
+import json
+import os
+import socket
+from functools import partial
+import pytest
+from core.batch import WorkerPool, iter_results
+from core.service import MetricService, parse_job, read_token, submit
+
+def _crash_on(victim, name):
+    if name == victim:
+        os._exit(1)
+    return True, None, name, None
+
+def test_combined_outputs_need_a_known_extension():
+    for output in ("all.txt", "all"):
+        with pytest.raises(ValueError):
+            parse_job({'inputs': ["in"], 'output': output, 'mode': 'single'})
+    assert parse_job({'inputs': ["in"], 'output': "all.JSON", 'mode': 'summary'})['output'] == "all.JSON"
+    assert parse_job({'inputs': ["in"], 'output': "out", 'mode': 'separate'})['output'] == "out"
+
+def test_socket_jobs_need_the_token(tmp_path, csv_dir):
+    service = MetricService(workers=1, cache_dir=None)
+    token_path = tmp_path / "service.token"
+    try:
+        host, port = service.serve_socket('127.0.0.1', 0, str(token_path))
+        if os.name == 'posix':
+            assert token_path.stat().st_mode & 0o077 == 0
+        job = {'inputs': [str(csv_dir / "m1.csv")], 'mode': 'metrics', 'language': 'en'}
+        with socket.create_connection((host, port)) as sock, sock.makefile('rb') as f:
+            for token in (None, "wrong"):
+                sock.sendall(json.dumps(dict(job, token=token)).encode('utf-8') + b"\n")
+                assert 'token' in json.loads(f.readline())['error']
+        result = submit(job, host, port, token=read_token(token_path))
+        assert result['processed'] == 1 and len(result['results']) == 1
+    finally:
+        service.close()
+    assert not token_path.exists()
+
+def test_dead_worker_fails_only_its_own_task():
+    pool = WorkerPool(2, initializer=None)
+    try:
+        names = [f"f{i}" for i in range(8)]
+        results = list(iter_results(partial(_crash_on, "f2"), [(name,) for name in names], 2, pool))
+        assert [result[0] for result in results] == [name != "f2" for name in names]
+        assert [result[2] for result in results if result[0]] == [name for name in names if name != "f2"]
+        # The pool is usable again afterwards
+        assert [result[2] for result in iter_results(partial(_crash_on, None), [("a",), ("b",)], 2, pool)] == \
+            ["a", "b"]
+    finally:
+        pool.shutdown()
@@ -23,6 +23,12 @@ class CustomDropdown(QPushButton):
         if not self._current_text:
             self.setCurrentText(text)
 
+    def clear(self):
+        """Removes all items."""
+        self._items = []
+        self._current_text = ""
+        self.setText("")
+
     def setCurrentText(self, text):
         """Sets the current text displayed on the button."""
         if text != self._current_text:
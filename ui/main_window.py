@@ -3,14 +3,21 @@ from pathlib import Path
 from PySide6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QTabWidget, 
     QFileDialog, QMessageBox, QProgressDialog, QRadioButton, QButtonGroup, 
-    QGroupBox, QComboBox, QProxyStyle, QStyle
+    QGroupBox, QComboBox, QProxyStyle, QStyle, QSpinBox, QCheckBox, QPushButton, QMenu, QLineEdit
 )
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QFont
 
 from core.translations import TRANSLATIONS
 from core.processing import ProcessingThread
-from core.metrics import export_to_excel
+from core.batch import default_worker_count, SINGLE_STAGES, WorkerPool
+from core.cache import ResultCache, default_cache_dir
+from core.discovery import iter_csv_files, parse_patterns, DEFAULT_INCLUDE
+from core.metrics import METRIC_ORDER, AVERAGES, DEFAULT_METRICS, DEFAULT_AVERAGES, EXPORT_PROFILES
+from core.aggregate import compile_group_pattern
+from core.labels import parse_nodata
+from core.summary import SUMMARY_FORMATS
+from core.writers import WRITER_FORMATS, MULTI_SHEET_FORMATS
 from .widgets import ModernButton, FileLabel
 from .custom_dropdown import CustomDropdown
 
@@ -30,6 +37,8 @@ class MetriCalcApp(QMainWindow):
         self.batch_output_dir = None
         self.batch_single_file = None
         self.processing_thread = None
+        # Batch workers are started on the first batch and kept warm for the next ones
+        self.worker_pool = WorkerPool()
         self.language = 'cs'  # Default language
         
         self.init_ui(app_icon)
@@ -90,6 +99,45 @@ class MetriCalcApp(QMainWindow):
         language_layout.addWidget(language_label)
         language_layout.addWidget(self.language_combo)
         language_layout.addStretch()
+        self.btn_metrics = QPushButton(TRANSLATIONS[self.language]['metrics'])
+        self.btn_metrics.setFont(QFont("fccTYPO", 10))
+        self.metrics_menu = QMenu(self.btn_metrics)
+        self.metric_actions = {}
+        for name in METRIC_ORDER:
+            action = self.metrics_menu.addAction(name)
+            action.setCheckable(True)
+            action.setChecked(name in DEFAULT_METRICS)
+            self.metric_actions[name] = action
+        self.metrics_menu.addSeparator()
+        self.average_actions = {}
+        for name in AVERAGES:
+            action = self.metrics_menu.addAction(name)
+            action.setCheckable(True)
+            action.setChecked(name in DEFAULT_AVERAGES)
+            self.average_actions[name] = action
+        self.btn_metrics.setMenu(self.metrics_menu)
+        self._update_metric_labels()
+        language_layout.addWidget(self.btn_metrics)
+        self.label_bootstrap = QLabel(TRANSLATIONS[self.language]['bootstrap'])
+        self.label_bootstrap.setFont(QFont("fccTYPO", 10))
+        self.label_bootstrap.setStyleSheet("color: #495057;")
+        self.spin_bootstrap = QSpinBox()
+        self.spin_bootstrap.setFont(QFont("fccTYPO", 10))
+        self.spin_bootstrap.setRange(0, 100000)
+        self.spin_bootstrap.setSingleStep(500)
+        self.spin_bootstrap.setValue(0)
+        language_layout.addWidget(self.label_bootstrap)
+        language_layout.addWidget(self.spin_bootstrap)
+        self.label_nodata = QLabel(TRANSLATIONS[self.language]['nodata'])
+        self.label_nodata.setFont(QFont("fccTYPO", 10))
+        self.label_nodata.setStyleSheet("color: #495057;")
+        self.edit_nodata = QLineEdit()
+        self.edit_nodata.setFont(QFont("fccTYPO", 10))
+        self.edit_nodata.setPlaceholderText("0")
+        self.edit_nodata.setToolTip(TRANSLATIONS[self.language]['nodata_tooltip'])
+        self.edit_nodata.setMaximumWidth(80)
+        language_layout.addWidget(self.label_nodata)
+        language_layout.addWidget(self.edit_nodata)
         main_layout.addLayout(language_layout)
         
         self.tab_widget = QTabWidget()
@@ -157,6 +205,25 @@ class MetriCalcApp(QMainWindow):
         self.step1_batch_layout.addWidget(self.btn_select_input_folder)
         self.label_input_folder = FileLabel(TRANSLATIONS[self.language]['input_folder_none'])
         self.step1_batch_layout.addWidget(self.label_input_folder)
+        self.cb_recursive = QCheckBox(TRANSLATIONS[self.language]['recursive'])
+        self.cb_recursive.setFont(QFont("fccTYPO", 10))
+        self.step1_batch_layout.addWidget(self.cb_recursive)
+        patterns_layout = QHBoxLayout()
+        self.label_include = QLabel(TRANSLATIONS[self.language]['include_patterns'])
+        self.label_include.setFont(QFont("fccTYPO", 10))
+        self.label_include.setStyleSheet("color: #495057;")
+        self.edit_include = QLineEdit(", ".join(DEFAULT_INCLUDE))
+        self.edit_include.setFont(QFont("fccTYPO", 10))
+        self.label_exclude = QLabel(TRANSLATIONS[self.language]['exclude_patterns'])
+        self.label_exclude.setFont(QFont("fccTYPO", 10))
+        self.label_exclude.setStyleSheet("color: #495057;")
+        self.edit_exclude = QLineEdit()
+        self.edit_exclude.setFont(QFont("fccTYPO", 10))
+        patterns_layout.addWidget(self.label_include)
+        patterns_layout.addWidget(self.edit_include)
+        patterns_layout.addWidget(self.label_exclude)
+        patterns_layout.addWidget(self.edit_exclude)
+        self.step1_batch_layout.addLayout(patterns_layout)
         self.tab2_layout.addWidget(self.step1_batch_group)
         
         self.step2_batch_group = self._create_group_box(TRANSLATIONS[self.language]['step_2_batch'])
@@ -173,6 +240,84 @@ class MetriCalcApp(QMainWindow):
         self.rb_single.toggled.connect(self.on_batch_mode_changed)
         self.button_group.addButton(self.rb_single, 2)
         self.step2_batch_layout.addWidget(self.rb_single)
+        self.rb_summary = QRadioButton(TRANSLATIONS[self.language]['summary_table'])
+        self.rb_summary.setFont(QFont("fccTYPO", 10))
+        self.rb_summary.toggled.connect(self.on_batch_mode_changed)
+        self.button_group.addButton(self.rb_summary, 3)
+        self.step2_batch_layout.addWidget(self.rb_summary)
+        self.rb_aggregate = QRadioButton(TRANSLATIONS[self.language]['aggregate_mode'])
+        self.rb_aggregate.setFont(QFont("fccTYPO", 10))
+        self.rb_aggregate.toggled.connect(self.on_batch_mode_changed)
+        self.button_group.addButton(self.rb_aggregate, 4)
+        self.step2_batch_layout.addWidget(self.rb_aggregate)
+        group_layout = QHBoxLayout()
+        self.label_group_pattern = QLabel(TRANSLATIONS[self.language]['group_pattern'])
+        self.label_group_pattern.setFont(QFont("fccTYPO", 10))
+        self.label_group_pattern.setStyleSheet("color: #495057;")
+        self.edit_group_pattern = QLineEdit()
+        self.edit_group_pattern.setFont(QFont("fccTYPO", 10))
+        self.edit_group_pattern.setPlaceholderText("^(.+)_tile[0-9]+")
+        group_layout.addWidget(self.label_group_pattern)
+        group_layout.addWidget(self.edit_group_pattern)
+        self.step2_batch_layout.addLayout(group_layout)
+        self.label_group_pattern.setVisible(False)
+        self.edit_group_pattern.setVisible(False)
+        format_layout = QHBoxLayout()
+        self.label_output_format = QLabel(TRANSLATIONS[self.language]['output_format'])
+        self.label_output_format.setFont(QFont("fccTYPO", 10))
+        self.label_output_format.setStyleSheet("color: #495057;")
+        self.format_combo = CustomDropdown()
+        for fmt in WRITER_FORMATS:
+            self.format_combo.addItem(fmt.upper(), fmt)
+        self.format_combo.setFont(QFont("fccTYPO", 10))
+        format_layout.addWidget(self.label_output_format)
+        format_layout.addWidget(self.format_combo)
+        format_layout.addStretch()
+        self.step2_batch_layout.addLayout(format_layout)
+        profile_layout = QHBoxLayout()
+        self.label_export_profile = QLabel(TRANSLATIONS[self.language]['export_profile'])
+        self.label_export_profile.setFont(QFont("fccTYPO", 10))
+        self.label_export_profile.setStyleSheet("color: #495057;")
+        self.profile_combo = CustomDropdown()
+        self.profile_combo.setFont(QFont("fccTYPO", 10))
+        self._fill_profile_combo()
+        profile_layout.addWidget(self.label_export_profile)
+        profile_layout.addWidget(self.profile_combo)
+        profile_layout.addStretch()
+        self.step2_batch_layout.addLayout(profile_layout)
+        workers_layout = QHBoxLayout()
+        self.label_workers = QLabel(TRANSLATIONS[self.language]['workers'])
+        self.label_workers.setFont(QFont("fccTYPO", 10))
+        self.label_workers.setStyleSheet("color: #495057;")
+        self.spin_workers = QSpinBox()
+        self.spin_workers.setFont(QFont("fccTYPO", 10))
+        self.spin_workers.setRange(1, default_worker_count() * 4)
+        self.spin_workers.setValue(default_worker_count())
+        workers_layout.addWidget(self.label_workers)
+        workers_layout.addWidget(self.spin_workers)
+        workers_layout.addStretch()
+        self.step2_batch_layout.addLayout(workers_layout)
+        cache_layout = QHBoxLayout()
+        self.cb_use_cache = QCheckBox(TRANSLATIONS[self.language]['use_cache'])
+        self.cb_use_cache.setFont(QFont("fccTYPO", 10))
+        self.cb_use_cache.setChecked(True)
+        self.btn_clear_cache = ModernButton(TRANSLATIONS[self.language]['clear_cache'], "🧹", "#6c757d")
+        self.btn_clear_cache.clicked.connect(self.clear_cache)
+        cache_layout.addWidget(self.cb_use_cache)
+        cache_layout.addStretch()
+        cache_layout.addWidget(self.btn_clear_cache)
+        self.step2_batch_layout.addLayout(cache_layout)
+        self.cb_incremental = QCheckBox(TRANSLATIONS[self.language]['incremental'])
+        self.cb_incremental.setFont(QFont("fccTYPO", 10))
+        self.step2_batch_layout.addWidget(self.cb_incremental)
+        self.cb_sidecar = QCheckBox(TRANSLATIONS[self.language]['matrix_sidecar'])
+        self.cb_sidecar.setFont(QFont("fccTYPO", 10))
+        self.cb_sidecar.setVisible(False)
+        self.step2_batch_layout.addWidget(self.cb_sidecar)
+        self.profile_combo.currentTextChanged.connect(self.on_batch_mode_changed)
+        self.cb_timing_log = QCheckBox(TRANSLATIONS[self.language]['timing_log'])
+        self.cb_timing_log.setFont(QFont("fccTYPO", 10))
+        self.step2_batch_layout.addWidget(self.cb_timing_log)
         self.tab2_layout.addWidget(self.step2_batch_group)
         
         self.step3_batch_group = self._create_group_box(TRANSLATIONS[self.language]['step_3_batch'])
@@ -201,10 +346,12 @@ class MetriCalcApp(QMainWindow):
         self.tab2_layout.addStretch()
         self.tab_widget.addTab(self.tab2, TRANSLATIONS[self.language]['batch_processing'])
     
-    def _create_styled_message_box(self, icon, title, text):
+    def _create_styled_message_box(self, icon, title, text, details=None):
         msg_box = QMessageBox(self)
         msg_box.setIcon(icon)
         msg_box.setText(text)
+        if details:
+            msg_box.setDetailedText(details)
         msg_box.setWindowTitle(title)
         msg_box.setFont(QFont("fccTYPO", 10))
         msg_box.setStyleSheet("""
@@ -217,6 +364,7 @@ class MetriCalcApp(QMainWindow):
             }
             QPushButton:hover { background-color: #1976D2; }
             QPushButton:pressed { background-color: #1565C0; }
+            QTextEdit { font-family: monospace; font-size: 10px; }
         """)
         msg_box.exec()
 
@@ -227,8 +375,11 @@ class MetriCalcApp(QMainWindow):
             new_lang = 'en'
         
         if new_lang != self.language:
+            # The profile names are translated, so keep the selection by key
+            export_profile = self._export_profile()
             self.language = new_lang
             self.update_ui_language()
+            self._fill_profile_combo(export_profile)
     
     def update_ui_language(self):
         self.setWindowTitle(TRANSLATIONS[self.language]['app_title'])
@@ -255,6 +406,25 @@ class MetriCalcApp(QMainWindow):
         
         self.rb_separate.setText(TRANSLATIONS[self.language]['separate_files'])
         self.rb_single.setText(TRANSLATIONS[self.language]['single_file'])
+        self.rb_summary.setText(TRANSLATIONS[self.language]['summary_table'])
+        self.rb_aggregate.setText(TRANSLATIONS[self.language]['aggregate_mode'])
+        self.label_group_pattern.setText(TRANSLATIONS[self.language]['group_pattern'])
+        self.label_output_format.setText(TRANSLATIONS[self.language]['output_format'])
+        self.label_export_profile.setText(TRANSLATIONS[self.language]['export_profile'])
+        self.label_workers.setText(TRANSLATIONS[self.language]['workers'])
+        self.label_bootstrap.setText(TRANSLATIONS[self.language]['bootstrap'])
+        self.label_nodata.setText(TRANSLATIONS[self.language]['nodata'])
+        self.edit_nodata.setToolTip(TRANSLATIONS[self.language]['nodata_tooltip'])
+        self.btn_metrics.setText(TRANSLATIONS[self.language]['metrics'])
+        self._update_metric_labels()
+        self.cb_use_cache.setText(TRANSLATIONS[self.language]['use_cache'])
+        self.cb_incremental.setText(TRANSLATIONS[self.language]['incremental'])
+        self.cb_sidecar.setText(TRANSLATIONS[self.language]['matrix_sidecar'])
+        self.cb_timing_log.setText(TRANSLATIONS[self.language]['timing_log'])
+        self.cb_recursive.setText(TRANSLATIONS[self.language]['recursive'])
+        self.label_include.setText(TRANSLATIONS[self.language]['include_patterns'])
+        self.label_exclude.setText(TRANSLATIONS[self.language]['exclude_patterns'])
+        self.btn_clear_cache.setText(f"🧹 {TRANSLATIONS[self.language]['clear_cache']}")
         
         if not self.selected_file: self.label_file.setText(TRANSLATIONS[self.language]['file_none'])
         if not self.save_path: self.label_output.setText(TRANSLATIONS[self.language]['output_none'])
@@ -285,13 +455,14 @@ class MetriCalcApp(QMainWindow):
         """)
     
     def select_file(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, TRANSLATIONS[self.language]['select_csv_file'], "", "CSV soubory (*.csv)")
+        file_path, _ = QFileDialog.getOpenFileName(self, TRANSLATIONS[self.language]['select_csv_file'], "",
+                                                   f"CSV soubory (*.csv);;{TRANSLATIONS[self.language]['raster_file_filter']}")
         if file_path:
             self.selected_file = file_path
             self.label_file.setText(TRANSLATIONS[self.language]['file_selected'].format(Path(file_path).name))
     
     def select_output(self):
-        file_path, _ = QFileDialog.getSaveFileName(self, TRANSLATIONS[self.language]['select_output'], "", "Excel soubory (*.xlsx)")
+        file_path, _ = QFileDialog.getSaveFileName(self, TRANSLATIONS[self.language]['select_output'], "", TRANSLATIONS[self.language]['export_file_filter'])
         if file_path:
             self.save_path = file_path
             self.label_output.setText(TRANSLATIONS[self.language]['output_selected'].format(Path(file_path).name))
@@ -309,7 +480,11 @@ class MetriCalcApp(QMainWindow):
             self.label_output_folder.setText(TRANSLATIONS[self.language]['output_folder_selected'].format(Path(folder_path).name))
     
     def select_single_file(self):
-        file_path, _ = QFileDialog.getSaveFileName(self, TRANSLATIONS[self.language]['select_single_file'], "", "Excel soubory (*.xlsx)")
+        if self.button_group.checkedId() == 3:
+            file_filter = TRANSLATIONS[self.language]['summary_file_filter']
+        else:
+            file_filter = TRANSLATIONS[self.language]['combined_file_filter']
+        file_path, _ = QFileDialog.getSaveFileName(self, TRANSLATIONS[self.language]['select_single_file'], "", file_filter)
         if file_path:
             self.batch_single_file = file_path
             self.label_single_file.setText(TRANSLATIONS[self.language]['single_file_selected'].format(Path(file_path).name))
@@ -321,17 +496,78 @@ class MetriCalcApp(QMainWindow):
         self.label_output_folder.setVisible(is_separate)
         self.btn_select_single_file.setVisible(not is_separate)
         self.label_single_file.setVisible(not is_separate)
+        self.cb_incremental.setVisible(is_separate)
+        # Separate outputs take their format from here, combined ones from the file name
+        self.label_output_format.setVisible(is_separate)
+        self.format_combo.setVisible(is_separate)
+        # The export profile picks the Data sheet of the workbook modes
+        self.label_export_profile.setVisible(mode in (1, 2))
+        self.profile_combo.setVisible(mode in (1, 2))
+        # Everything but the full profile reads the matrix alone, without the raw table
+        self.cb_sidecar.setVisible(mode in (3, 4) or self._export_profile() != 'full')
+        self.label_group_pattern.setVisible(mode == 4)
+        self.edit_group_pattern.setVisible(mode == 4)
+        # The workbook and the summary table need different file types
+        if self.batch_single_file and not is_separate:
+            suffix = Path(self.batch_single_file).suffix.lower().lstrip('.')
+            if suffix not in (SUMMARY_FORMATS if mode == 3 else MULTI_SHEET_FORMATS):
+                self.batch_single_file = None
+                self.label_single_file.setText(TRANSLATIONS[self.language]['single_file_none'])
+    
+    def _update_metric_labels(self):
+        headers = TRANSLATIONS[self.language]['metric_headers']
+        for name, action in self.metric_actions.items():
+            action.setText(headers[name])
+        for name, action in self.average_actions.items():
+            action.setText(TRANSLATIONS[self.language][f'{name}_average'])
+    
+    def _fill_profile_combo(self, export_profile='full'):
+        self.profile_combo.clear()
+        for name in EXPORT_PROFILES:
+            self.profile_combo.addItem(TRANSLATIONS[self.language][f'profile_{name}'], name)
+        self.profile_combo.setCurrentText(TRANSLATIONS[self.language][f'profile_{export_profile}'])
+    
+    def _export_profile(self):
+        text = self.profile_combo.currentText()
+        return next((name for name in EXPORT_PROFILES if TRANSLATIONS[self.language][f'profile_{name}'] == text),
+                    'full')
+    
+    def _metric_options(self):
+        options = {}
+        metrics = [name for name, action in self.metric_actions.items() if action.isChecked()]
+        averages = [name for name, action in self.average_actions.items() if action.isChecked()]
+        if metrics != DEFAULT_METRICS or averages != DEFAULT_AVERAGES:
+            options.update(metrics=metrics, averages=averages)
+        # A fixed seed keeps bootstrap intervals reproducible between runs
+        if self.spin_bootstrap.value():
+            options.update(bootstrap=self.spin_bootstrap.value(), confidence=0.95, seed=0)
+        return options or None
+    
+    def clear_cache(self):
+        ResultCache().clear()
+        self._create_styled_message_box(QMessageBox.Information, TRANSLATIONS[self.language]['done'], TRANSLATIONS[self.language]['cache_cleared'])
     
     def process_single(self):
         if not self.selected_file or not self.save_path:
             self._create_styled_message_box(QMessageBox.Warning, TRANSLATIONS[self.language]['missing_input'], TRANSLATIONS[self.language]['select_input_file_output'])
             return
         
-        success, error, _ = export_to_excel(self.selected_file, self.save_path, self.language)
-        if success:
+        self.processing_thread = ProcessingThread(
+            os.path.dirname(self.selected_file), None, self.save_path,
+            0, [os.path.basename(self.selected_file)], self.language,
+            metric_options=self._metric_options(), nodata=parse_nodata(self.edit_nodata.text())
+        )
+        self._start_processing(len(SINGLE_STAGES), self.on_single_finished)
+    
+    def on_single_finished(self, success, error, success_count, error_files, skipped_count=0):
+        self.progress_dialog.close()
+        
+        if not success:
+            self._create_styled_message_box(QMessageBox.Information, TRANSLATIONS[self.language]['cancelled'], error)
+        elif success_count:
             self._create_styled_message_box(QMessageBox.Information, TRANSLATIONS[self.language]['done'], TRANSLATIONS[self.language]['file_saved_as'].format(self.save_path))
         else:
-            self._create_styled_message_box(QMessageBox.Critical, TRANSLATIONS[self.language]['error'], TRANSLATIONS[self.language]['something_went_wrong'].format(error))
+            self._create_styled_message_box(QMessageBox.Critical, TRANSLATIONS[self.language]['error'], TRANSLATIONS[self.language]['something_went_wrong'].format(error_files[0][1]))
     
     def process_batch(self):
         if not self.batch_input_dir:
@@ -342,22 +578,57 @@ class MetriCalcApp(QMainWindow):
         if batch_mode == 1 and not self.batch_output_dir:
             self._create_styled_message_box(QMessageBox.Warning, TRANSLATIONS[self.language]['missing_output'], TRANSLATIONS[self.language]['select_output_folder_first'])
             return
-        elif batch_mode == 2 and not self.batch_single_file:
+        elif batch_mode in (2, 3, 4) and not self.batch_single_file:
             self._create_styled_message_box(QMessageBox.Warning, TRANSLATIONS[self.language]['missing_output'], TRANSLATIONS[self.language]['select_single_file_first'])
             return
         
-        csv_files = [f for f in os.listdir(self.batch_input_dir) if f.lower().endswith('.csv')]
-        if not csv_files:
+        group_pattern = self.edit_group_pattern.text().strip() or None
+        if batch_mode == 4 and group_pattern:
+            try:
+                compile_group_pattern(group_pattern)
+            except ValueError as e:
+                self._create_styled_message_box(QMessageBox.Warning, TRANSLATIONS[self.language]['invalid_group_pattern'], str(e))
+                return
+        
+        # The folder is scanned while the batch runs; only look for a first match here
+        include = parse_patterns(self.edit_include.text()) or None
+        exclude = parse_patterns(self.edit_exclude.text())
+        recursive = self.cb_recursive.isChecked()
+        outputs = [self.batch_output_dir if batch_mode == 1 else self.batch_single_file]
+        if next(iter_csv_files(self.batch_input_dir, include, exclude, recursive, outputs), None) is None:
             self._create_styled_message_box(QMessageBox.Information, TRANSLATIONS[self.language]['no_csv_files'], TRANSLATIONS[self.language]['no_csv_files_in_folder'])
             return
         
+        workers = self.spin_workers.value()
+        if workers > 1:
+            # Resized to the chosen worker count before the batch uses it
+            self.worker_pool.executor(workers)
         self.processing_thread = ProcessingThread(
             self.batch_input_dir, self.batch_output_dir, self.batch_single_file, 
-            batch_mode, csv_files, self.language
+            batch_mode, None, self.language,
+            workers=workers,
+            cache_dir=default_cache_dir() if self.cb_use_cache.isChecked() else None,
+            incremental=self.cb_incremental.isChecked(),
+            metric_options=self._metric_options(),
+            recursive=recursive, include=include, exclude=exclude,
+            stats_log=self._timing_log_path(batch_mode),
+            sidecar=self.cb_sidecar.isChecked() and (batch_mode in (3, 4) or self._export_profile() != 'full'),
+            group_pattern=group_pattern if batch_mode == 4 else None,
+            output_format=self.format_combo.currentText().lower(),
+            export_profile=self._export_profile(),
+            executor=self.worker_pool if workers > 1 else None,
+            nodata=parse_nodata(self.edit_nodata.text())
         )
-        
+        self.stats_summary = ""
+        self.processing_thread.stats_summary.connect(self.set_stats_summary)
+        self.processing_thread.total_updated.connect(self.update_total)
+        # The total is unknown until the scan finishes; start with a busy indicator
+        self._start_processing(0, self.on_batch_finished)
+    
+    def _start_processing(self, maximum, on_finished):
+        """Run self.processing_thread behind a cancellable progress dialog"""
         self.progress_dialog = QProgressDialog(TRANSLATIONS[self.language]['processing_files'], 
-                                             TRANSLATIONS[self.language]['cancel'], 0, len(csv_files), self)
+                                             TRANSLATIONS[self.language]['cancel'], 0, maximum, self)
         self.progress_dialog.setWindowTitle(TRANSLATIONS[self.language]['processing_files'])
         self.progress_dialog.setFont(QFont("fccTYPO", 10))
         self.progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
@@ -365,23 +636,44 @@ class MetriCalcApp(QMainWindow):
         self.progress_dialog.setAutoReset(False)
         
         self.processing_thread.progress_updated.connect(self.update_progress)
-        self.processing_thread.finished.connect(self.on_batch_finished)
-        self.progress_dialog.canceled.connect(self.processing_thread.terminate)
+        self.processing_thread.finished.connect(on_finished)
+        self.progress_dialog.canceled.connect(self.processing_thread.requestInterruption)
         
         self.processing_thread.start()
         self.progress_dialog.show()
     
+    def _timing_log_path(self, batch_mode):
+        if not self.cb_timing_log.isChecked():
+            return None
+        if batch_mode == 1:
+            return os.path.join(self.batch_output_dir, "metricalc_timing.jsonl")
+        return os.path.splitext(self.batch_single_file)[0] + "_timing.jsonl"
+    
+    def closeEvent(self, event):
+        self.worker_pool.shutdown(wait=False)
+        super().closeEvent(event)
+    
+    def set_stats_summary(self, summary):
+        self.stats_summary = summary
+    
+    def update_total(self, total):
+        self.progress_dialog.setMaximum(total)
+    
     def update_progress(self, value, text):
         self.progress_dialog.setValue(value)
         self.progress_dialog.setLabelText(text)
     
-    def on_batch_finished(self, success, error, success_count, error_files):
+    def on_batch_finished(self, success, error, success_count, error_files, skipped_count=0):
         self.progress_dialog.close()
+        skipped_msg = TRANSLATIONS[self.language]['skipped_files'].format(skipped_count) if skipped_count else ""
         
-        if error_files:
+        if not success:
+            self._create_styled_message_box(QMessageBox.Information, TRANSLATIONS[self.language]['cancelled'], 
+                                          TRANSLATIONS[self.language]['cancelled_summary'].format(error, success_count) + skipped_msg, self.stats_summary)
+        elif error_files:
             error_msg = "\n".join([f"{f}: {e}" for f, e in error_files])
             self._create_styled_message_box(QMessageBox.Warning, TRANSLATIONS[self.language]['done_with_errors'], 
-                                          TRANSLATIONS[self.language]['processed_files'].format(success_count, error_msg))
+                                          TRANSLATIONS[self.language]['processed_files'].format(success_count, error_msg) + skipped_msg, self.stats_summary)
         else:
             self._create_styled_message_box(QMessageBox.Information, TRANSLATIONS[self.language]['done'], 
-                                          TRANSLATIONS[self.language]['all_files_processed'].format(success_count)) 
\ No newline at end of file
+                                          TRANSLATIONS[self.language]['all_files_processed'].format(success_count) + skipped_msg, self.stats_summary) 
\ No newline at end of file